@@ -151,6 +151,95 @@ export class APIPlayground {
           }
         }
       },
+      {
+        method: 'POST',
+        path: '/api/archive/numbers',
+        description: 'Archive many phone numbers in one request',
+        requestBody: {
+          required: true,
+          content: {
+            'application/json': {
+              schema: {
+                type: 'object',
+                properties: {
+                  numbers: { type: 'array', items: { type: 'string' } },
+                  archivedBy: { type: 'string' },
+                  reason: { type: 'string' }
+                },
+                required: ['numbers']
+              },
+              example: {
+                numbers: ['+15551234567', '+15557654321'],
+                archivedBy: 'John Doe',
+                reason: 'Project closed'
+              }
+            }
+          }
+        }
+      },
+      {
+        method: 'POST',
+        path: '/api/dnc/bulk',
+        description: 'Add many phone numbers to the DNC list in one request',
+        requestBody: {
+          required: true,
+          content: {
+            'application/json': {
+              schema: {
+                type: 'object',
+                properties: {
+                  phoneNumbers: { type: 'array', items: { type: 'string' } },
+                  notes: { type: 'string' }
+                },
+                required: ['phoneNumbers']
+              },
+              example: {
+                phoneNumbers: ['+15551234567', '+15557654321'],
+                notes: 'Requested removal'
+              }
+            }
+          }
+        }
+      },
+      {
+        method: 'GET',
+        path: '/api/voicemails/search',
+        description: 'Search voicemail transcriptions; "quoted phrases" match in order',
+        parameters: [
+          { name: 'q', in: 'query', required: true, schema: { type: 'string' } },
+          { name: 'projectId', in: 'query', required: false, schema: { type: 'string' } },
+          { name: 'limit', in: 'query', required: false, schema: { type: 'integer' } },
+          { name: 'cursor', in: 'query', required: false, schema: { type: 'string' } }
+        ]
+      },
+      {
+        method: 'POST',
+        path: '/api/projects/{id}/dids/import',
+        description: 'Import DIDs from a CSV or NDJSON upload in the background; returns a job to poll',
+        parameters: [
+          { name: 'id', in: 'path', required: true, schema: { type: 'string' } },
+          { name: 'format', in: 'query', required: false, schema: { type: 'string', enum: ['csv', 'ndjson'] } },
+          { name: 'startDate', in: 'query', required: false, schema: { type: 'string' } },
+          { name: 'endDate', in: 'query', required: false, schema: { type: 'string' } }
+        ],
+        requestBody: {
+          required: true,
+          content: {
+            'text/csv': {
+              schema: { type: 'string' },
+              example: 'number,startDate,endDate\n+15551234567,2024-01-01,\n+15557654321,2024-01-01,2024-12-31'
+            }
+          }
+        }
+      },
+      {
+        method: 'GET',
+        path: '/api/dids/imports/{jobId}',
+        description: 'Get the progress of a DID import job',
+        parameters: [
+          { name: 'jobId', in: 'path', required: true, schema: { type: 'string' } }
+        ]
+      },
       {
         method: 'GET',
         path: '/api/numbers/{number}/meta',
@@ -0,0 +1,7 @@
+// Display helpers shared by the views; format_duration in python/project_store.py is the server-side twin
+export function formatDuration(seconds) {
+  // Durations are stored in seconds; older voicemails may still carry a "m:ss" string
+  if (typeof seconds !== 'number') return seconds || '';
+  const total = Math.round(seconds);
+  return `${Math.floor(total / 60)}:${String(total % 60).padStart(2, '0')}`;
+}
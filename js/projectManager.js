@@ -1,16 +1,29 @@
 export class ProjectManager {
   constructor() {
     this.projects = new Map();
+    this.projectsEtag = null;
     this.currentProject = null;
   }
 
   async init() {
     await this.loadProjects();
+
+    // Refresh on pushed changes; unchanged lists come back as a cheap 304
+    window.addEventListener('voicemail-event', (e) => {
+      if (['project-changed', 'did-archived', 'projects-reloaded'].includes(e.detail.type)) {
+        this.loadProjects();
+      }
+    });
   }
 
   async loadProjects() {
     try {
-      const response = await fetch('/api/projects');
+      const headers = {};
+      if (this.projectsEtag) headers['If-None-Match'] = this.projectsEtag;
+      const response = await fetch('/api/projects', { headers });
+      // Nothing changed since the last load; keep the projects we have
+      if (response.status === 304) return;
+      this.projectsEtag = response.headers.get('ETag');
       const projects = await response.json();
       
       projects.forEach(project => {
@@ -203,6 +216,28 @@ export class ProjectManager {
     }
   }
 
+  async archiveNumbers(numbers, reason = '', archivedBy = '') {
+    try {
+      const response = await fetch('/api/archive/numbers', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
+        body: JSON.stringify({ numbers, reason, archivedBy })
+      });
+
+      if (!response.ok) {
+        throw new Error('Failed to archive numbers');
+      }
+
+      return (await response.json()).results;
+    } catch (error) {
+      console.error('Error archiving numbers:', error);
+      throw error;
+    }
+  }
+
   async getNumberMetadata(number) {
     try {
       const response = await fetch(`/api/numbers/${number}/meta`);
@@ -260,7 +295,7 @@ export class ProjectManager {
             ${project.isCatchAll ? '<span class="badge bg-secondary ms-2">Catch-All</span>' : ''}
           </div>
           <div class="project-stats">
-            <span class="badge bg-primary">${project.voicemails?.length || 0}</span>
+            <span class="badge bg-primary">${project.totalMessages ?? project.voicemails?.length ?? 0}</span>
           </div>
         </div>
       `;
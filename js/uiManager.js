@@ -1,3 +1,5 @@
+import { formatDuration } from './format.js';
+
 export class UIManager {
   constructor(app) {
     this.app = app;
@@ -299,7 +301,7 @@ export class UIManager {
           <h6 class="mb-1">${vm.caller}</h6>
           <small>${this.formatDate(vm.timestamp)}</small>
         </div>
-        <small class="text-muted">Duration: ${vm.duration}</small>
+        <small class="text-muted">Duration: ${formatDuration(vm.duration)}</small>
       </div>
     `).join('') : '<div class="list-group-item text-muted">No voicemails available</div>';
   }
@@ -1,7 +1,15 @@
+import { formatDuration } from './format.js';
+
 export class VoicemailSystem {
   constructor() {
     this.voicemails = [];
+    this.nextCursor = null;
+    this.searchQuery = '';
+    this.loadingMore = false;
+    this.lastEventId = null;
+    this.reconnectDelay = 1000;
     this.selectedVoicemail = null;
+    this.selectedCallers = new Set(); // Callers ticked in the list for bulk DNC/archive
     this.notes = new Map(); // Store notes by voicemail ID
     
     // DNC confirmation handler
@@ -36,14 +44,29 @@ export class VoicemailSystem {
   async init() {
     await this.loadVoicemails();
     this.setupEventListeners();
-    this.startPolling();
+    this.startEventStream();
+  }
+
+  async fetchVoicemailPage(cursor = null) {
+    const params = new URLSearchParams();
+    if (cursor) params.set('cursor', cursor);
+    // Searches page through ranked server-side results instead of filtering loaded voicemails
+    if (this.searchQuery) params.set('q', this.searchQuery);
+    const path = this.searchQuery ? '/api/voicemails/search' : '/api/voicemails';
+    const response = await fetch(`${path}?${params.toString()}`, {
+      headers: {
+        'Authorization': `Bearer ${localStorage.getItem('token')}`
+      }
+    });
+    if (!response.ok) throw new Error('Failed to load voicemails');
+    return response.json();
   }
 
   async loadVoicemails() {
     try {
-      // Simulate API call - replace with actual API endpoint
-      const response = await fetch('/api/voicemails');
-      this.voicemails = await response.json();
+      const page = await this.fetchVoicemailPage();
+      this.voicemails = page.voicemails;
+      this.nextCursor = page.nextCursor;
       this.renderVoicemailList();
     } catch (error) {
       console.error('Error loading voicemails:', error);
@@ -52,13 +75,34 @@ export class VoicemailSystem {
     }
   }
 
+  async searchVoicemails(query) {
+    this.searchQuery = (query || '').trim();
+    this.nextCursor = null;
+    await this.loadVoicemails();
+  }
+
+  async loadMoreVoicemails() {
+    if (!this.nextCursor || this.loadingMore) return;
+    this.loadingMore = true;
+    try {
+      const page = await this.fetchVoicemailPage(this.nextCursor);
+      this.voicemails = this.voicemails.concat(page.voicemails);
+      this.nextCursor = page.nextCursor;
+      this.renderVoicemailList();
+    } catch (error) {
+      console.error('Error loading more voicemails:', error);
+    } finally {
+      this.loadingMore = false;
+    }
+  }
+
   loadSampleData() {
     this.voicemails = [
       {
         id: 1,
         caller: "+1 (555) 123-4567",
         timestamp: new Date().toISOString(),
-        duration: "0:45",
+        duration: 45,
         isNew: true,
         transcription: "Hi, this is John calling about the project deadline...",
         audioUrl: "sample.mp3"
@@ -76,7 +120,11 @@ export class VoicemailSystem {
       <div class="list-group-item voicemail-item ${vm.id === this.selectedVoicemail?.id ? 'active' : ''}" 
            data-id="${vm.id}">
         <div class="d-flex w-100 justify-content-between">
-          <h6 class="mb-1">${vm.caller}</h6>
+          <h6 class="mb-1">
+            <input class="form-check-input me-2 voicemail-select" type="checkbox" data-caller="${vm.caller}"
+                   ${this.selectedCallers.has(vm.caller) ? 'checked' : ''} aria-label="Select ${vm.caller}">
+            ${vm.caller}
+          </h6>
           ${vm.isNew ? '<span class="badge badge-new">New</span>' : ''}
         </div>
         <p class="mb-1 small">${this.formatDate(vm.timestamp)}</p>
@@ -99,15 +147,15 @@ export class VoicemailSystem {
 
     details.innerHTML = `
       <div class="voicemail-content">
-        <audio class="audio-player" controls>
-          <source src="${voicemail.audioUrl}" type="audio/mpeg">
+        <audio class="audio-player" controls preload="metadata">
+          <source src="/api/voicemails/${voicemail.id}/audio">
           Your browser does not support the audio element.
         </audio>
         
         <ul class="metadata-list">
           <li><strong>Caller:</strong> ${voicemail.caller}</li>
           <li><strong>Time:</strong> ${this.formatDate(voicemail.timestamp)}</li>
-          <li><strong>Duration:</strong> ${voicemail.duration}</li>
+          <li><strong>Duration:</strong> ${formatDuration(voicemail.duration)}</li>
         </ul>
 
         <div class="transcription-box">
@@ -204,6 +252,11 @@ export class VoicemailSystem {
 
   setupEventListeners() {
     document.querySelector('#voicemail-list')?.addEventListener('click', (e) => {
+      // Ticking a caller selects it for the bulk actions without opening the voicemail
+      if (e.target.matches('.voicemail-select')) {
+        this.toggleCaller(e.target.dataset.caller, e.target.checked);
+        return;
+      }
       const item = e.target.closest('.voicemail-item');
       if (item) {
         const id = parseInt(item.dataset.id);
@@ -211,6 +264,24 @@ export class VoicemailSystem {
       }
     });
 
+    // Fetch the next page when the list is scrolled near the bottom
+    document.querySelector('#voicemail-list')?.addEventListener('scroll', (e) => {
+      const list = e.target;
+      if (list.scrollTop + list.clientHeight >= list.scrollHeight - 100) {
+        this.loadMoreVoicemails();
+      }
+    });
+
+    document.querySelector('#bulk-dnc-btn')?.addEventListener('click', () => this.bulkAction('dnc'));
+    document.querySelector('#bulk-archive-btn')?.addEventListener('click', () => this.bulkAction('archive'));
+
+    // Search as the user types, once they pause; clearing the box goes back to the full list
+    let searchTimer = null;
+    document.querySelector('#voicemail-search')?.addEventListener('input', (e) => {
+      clearTimeout(searchTimer);
+      searchTimer = setTimeout(() => this.searchVoicemails(e.target.value), 300);
+    });
+
     // Share Modal Handler
     document.querySelector('#share-modal')?.addEventListener('shown.bs.modal', (e) => {
       document.querySelector('#share-recipients').value = '';
@@ -218,6 +289,42 @@ export class VoicemailSystem {
     });
   }
 
+  toggleCaller(caller, selected) {
+    if (selected) {
+      this.selectedCallers.add(caller);
+    } else {
+      this.selectedCallers.delete(caller);
+    }
+    this.updateBulkActions();
+  }
+
+  updateBulkActions() {
+    const none = this.selectedCallers.size === 0;
+    document.querySelectorAll('#voicemail-bulk-actions button').forEach(button => button.disabled = none);
+  }
+
+  async bulkAction(action) {
+    // One request for every selected caller instead of one per number
+    const numbers = Array.from(this.selectedCallers);
+    if (numbers.length === 0) return;
+    const label = action === 'dnc' ? 'add to the DNC list' : 'archive';
+    if (!confirm(`Are you sure you want to ${label} ${numbers.length} caller(s)?`)) return;
+    try {
+      const results = action === 'dnc'
+        ? await this.addManyToDNC(numbers)
+        : await window.app.projectManager.archiveNumbers(numbers);
+      const added = results.filter(r => r.status === 'added').length;
+      window.app.uiManager.showNotification(
+        `${added} of ${numbers.length} caller(s) ${action === 'dnc' ? 'added to the DNC list' : 'archived'}`, 'success'
+      );
+      this.selectedCallers.clear();
+      this.updateBulkActions();
+      this.renderVoicemailList();
+    } catch (error) {
+      window.app.uiManager.showNotification(`Failed to ${label} the selected callers`, 'error');
+    }
+  }
+
   selectVoicemail(id) {
     this.selectedVoicemail = this.voicemails.find(vm => vm.id === id);
     this.renderVoicemailList();
@@ -257,13 +364,14 @@ export class VoicemailSystem {
 
   async downloadAudio(id) {
     const voicemail = this.voicemails.find(vm => vm.id === id);
-    if (!voicemail?.audioUrl) return;
+    if (!voicemail) return;
 
     try {
-      // In a real implementation, generate a download URL from your server
+      // Download the stored format rather than whatever the browser would negotiate
+      const format = voicemail.audioFormat || 'wav';
       const link = document.createElement('a');
-      link.href = voicemail.audioUrl;
-      link.download = `voicemail_${id}.mp3`;
+      link.href = `/api/voicemails/${id}/audio?format=${format}`;
+      link.download = `voicemail_${id}.${format === 'opus' ? 'ogg' : format}`;
       document.body.appendChild(link);
       link.click();
       document.body.removeChild(link);
@@ -320,6 +428,26 @@ export class VoicemailSystem {
     }
   }
 
+  async addManyToDNC(phoneNumbers, notes = '') {
+    try {
+      // One request for the whole list; the response has a status per number
+      const response = await fetch('/api/dnc/bulk', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
+        body: JSON.stringify({ phoneNumbers, notes })
+      });
+
+      if (!response.ok) throw new Error('Failed to add numbers to DNC');
+      return (await response.json()).results;
+    } catch (error) {
+      console.error('Error adding numbers to DNC:', error);
+      throw error;
+    }
+  }
+
   async shareVoicemail(voicemailId, recipients) {
     try {
       const response = await fetch(`/api/voicemails/${voicemailId}/share`, {
@@ -342,9 +470,61 @@ export class VoicemailSystem {
     return new Date(timestamp).toLocaleString();
   }
 
-  startPolling() {
-    // Poll for new voicemails every 30 seconds
-    setInterval(() => this.loadVoicemails(), 30000);
+  async startEventStream() {
+    // Read /api/events with fetch so the Authorization header can be sent
+    const headers = { 'Authorization': `Bearer ${localStorage.getItem('token')}` };
+    if (this.lastEventId) headers['Last-Event-ID'] = this.lastEventId;
+
+    try {
+      const response = await fetch('/api/events', { headers });
+      if (!response.ok || !response.body) throw new Error('Event stream unavailable');
+      this.reconnectDelay = 1000;
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+        messages.forEach(message => this.handleStreamMessage(message));
+      }
+    } catch (error) {
+      console.error('Event stream error:', error);
+    }
+
+    // Reconnect with backoff; missed events are replayed from lastEventId
+    setTimeout(() => this.startEventStream(), this.reconnectDelay);
+    this.reconnectDelay = Math.min(this.reconnectDelay * 2, 30000);
+  }
+
+  handleStreamMessage(message) {
+    const event = { type: 'message', data: '' };
+    message.split('\n').forEach(line => {
+      if (line.startsWith(':')) return;
+      const separator = line.indexOf(':');
+      const field = separator === -1 ? line : line.slice(0, separator);
+      const value = separator === -1 ? '' : line.slice(separator + 1).trimStart();
+      if (field === 'id') this.lastEventId = value;
+      else if (field === 'event') event.type = value;
+      else if (field === 'data') event.data += value;
+    });
+    if (!event.data) return;
+
+    const data = JSON.parse(event.data);
+    if (event.type === 'voicemail-created') {
+      if (!this.voicemails.some(vm => vm.id === data.voicemail.id)) {
+        this.voicemails.unshift(data.voicemail);
+        this.renderVoicemailList();
+      }
+    } else if (event.type === 'projects-reloaded') {
+      this.loadVoicemails();
+    }
+
+    // Let other dashboard modules react to project and DID changes
+    window.dispatchEvent(new CustomEvent('voicemail-event', { detail: { type: event.type, data } }));
   }
 
   getVoicemailsForProject(projectId) {
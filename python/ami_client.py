@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import random
+import asyncio
+import itertools
+import threading
+from collections import deque
+
+AMI_HOST = os.environ.get('AMI_HOST', 'localhost')
+AMI_PORT = int(os.environ.get('AMI_PORT', '5038'))
+AMI_USERNAME = os.environ.get('AMI_USERNAME', 'admin')
+AMI_SECRET = os.environ.get('AMI_SECRET', 'password')
+AMI_ACTION_TIMEOUT = float(os.environ.get('AMI_ACTION_TIMEOUT', '10'))
+# Actions waiting to be written; send_action raises AMIBusy beyond this
+AMI_MAX_QUEUE = int(os.environ.get('AMI_MAX_QUEUE', '1000'))
+AMI_RECONNECT_MIN = float(os.environ.get('AMI_RECONNECT_MIN', '0.5'))
+AMI_RECONNECT_MAX = float(os.environ.get('AMI_RECONNECT_MAX', '30'))
+RTT_SAMPLES = 1000
+END_COMMAND = '--END COMMAND--'
+
+class AMIError(Exception):
+	def __init__(self, message, response=None):
+		super().__init__(message)
+		self.response = response
+
+class AMIBusy(AMIError):
+	pass
+
+def format_action(action, action_id, fields):
+	lines = [f"Action: {action}", f"ActionID: {action_id}"]
+	for key, value in fields.items():
+		# Repeated headers such as Variable are passed as lists
+		for item in value if isinstance(value, (list, tuple)) else [value]:
+			lines.append(f"{key}: {item}")
+	return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+async def read_message(reader):
+	# One AMI message as a dict; repeated headers are joined with newlines.
+	# Old-style "Response: Follows" command output is collected into Output.
+	message = {}
+	output = []
+	while True:
+		line = await reader.readline()
+		if not line:
+			raise ConnectionError("AMI connection closed")
+		line = line.decode(errors='replace').rstrip('\r\n')
+		if not line:
+			if message:
+				break
+			continue
+		if message.get('Response') == 'Follows' and not line.startswith(('Privilege:', 'ActionID:')):
+			if line.endswith(END_COMMAND):
+				line = line[:-len(END_COMMAND)]
+			if line:
+				output.append(line)
+			continue
+		key, sep, value = line.partition(':')
+		if not sep:
+			output.append(line)
+			continue
+		key, value = key.strip(), value.strip()
+		message[key] = f"{message[key]}\n{value}" if key in message else value
+	if output:
+		message['Output'] = '\n'.join(([message['Output']] if 'Output' in message else []) + output)
+	return message
+
+class AMIClient:
+	# One persistent manager connection. Actions are pipelined through a bounded send queue and matched to
+	# their responses by ActionID, events fan out to registered handlers, and a dropped connection is
+	# re-established with exponential backoff.
+	def __init__(self, host=AMI_HOST, port=AMI_PORT, username=AMI_USERNAME, secret=AMI_SECRET,
+			timeout=AMI_ACTION_TIMEOUT, max_queue=AMI_MAX_QUEUE, reconnect_min=AMI_RECONNECT_MIN,
+			reconnect_max=AMI_RECONNECT_MAX):
+		self.host = host
+		self.port = port
+		self.username = username
+		self.secret = secret
+		self.timeout = timeout
+		self.max_queue = max_queue
+		self.reconnect_min = reconnect_min
+		self.reconnect_max = reconnect_max
+		self.connected = False
+		self.last_error = None
+		self.stats = {'sent': 0, 'responses': 0, 'errors': 0, 'timeouts': 0, 'events': 0, 'handlerErrors': 0,
+			'connects': 0, 'reconnectAttempts': 0}
+		self._handlers = {}
+		# ActionID -> [future, time written, response while an event list is being collected]
+		self._pending = {}
+		self._ids = itertools.count(1)
+		self._rtts = deque(maxlen=RTT_SAMPLES)
+		self._queue = None
+		self._task = None
+
+	def register_event(self, name, handler):
+		# '*' receives every event; coroutine handlers run as tasks, plain ones on the default executor
+		self._handlers.setdefault(name, []).append(handler)
+
+	async def start(self):
+		# The queue is made here so it belongs to the loop the client runs on
+		self._queue = asyncio.Queue(self.max_queue)
+		self._task = asyncio.ensure_future(self._run())
+
+	async def close(self):
+		if self._task:
+			self._task.cancel()
+			try:
+				await self._task
+			except asyncio.CancelledError:
+				pass
+			self._task = None
+		error = ConnectionError("AMI client closed")
+		self._fail_pending(error)
+		while self._queue is not None and not self._queue.empty():
+			_, _, future = self._queue.get_nowait()
+			if not future.done():
+				future.set_exception(error)
+
+	async def send_action(self, action, timeout=None, **fields):
+		# Returns the response; list actions (EventList: start) return it with the listed events under 'events'
+		if self._queue is None:
+			raise AMIError("AMI client is not started")
+		action_id = f"{os.getpid()}-{next(self._ids)}"
+		future = asyncio.get_event_loop().create_future()
+		try:
+			self._queue.put_nowait((action_id, format_action(action, action_id, fields), future))
+		except asyncio.QueueFull:
+			raise AMIBusy(f"AMI send queue is full ({self.max_queue} actions)")
+		timeout = timeout or self.timeout
+		try:
+			response = await asyncio.wait_for(future, timeout)
+		except asyncio.TimeoutError:
+			self.stats['timeouts'] += 1
+			raise AMIError(f"No response to {action} within {timeout}s")
+		finally:
+			self._pending.pop(action_id, None)
+		if response.get('Response') == 'Error':
+			self.stats['errors'] += 1
+			raise AMIError(response.get('Message') or f"{action} failed", response)
+		return response
+
+	async def command(self, command, timeout=None):
+		return await self.send_action('Command', timeout=timeout, Command=command)
+
+	def metrics(self):
+		rtts = sorted(self._rtts)
+		rtt = None
+		if rtts:
+			rtt = {
+				'avg': round(sum(rtts) / len(rtts) * 1000, 2),
+				'p95': round(rtts[min(len(rtts) - 1, int(len(rtts) * 0.95))] * 1000, 2),
+				'max': round(rtts[-1] * 1000, 2)
+			}
+		return dict(self.stats, connected=self.connected, queueDepth=self._queue.qsize() if self._queue else 0,
+			inFlight=len(self._pending), rttMs=rtt, lastError=self.last_error)
+
+	async def _run(self):
+		attempt = 0
+		while True:
+			try:
+				reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+			except (OSError, asyncio.TimeoutError) as e:
+				self._disconnected(e, attempt)
+			else:
+				try:
+					await self._login(reader, writer)
+					attempt = 0
+					self.connected = True
+					self.stats['connects'] += 1
+					print(f"Connected to Asterisk Manager Interface at {self.host}:{self.port}")
+					await self._serve(reader, writer)
+				except (OSError, AMIError, asyncio.TimeoutError) as e:
+					self._disconnected(e, attempt)
+				finally:
+					self.connected = False
+					writer.close()
+					# Actions already written may or may not have run, so they fail rather than being resent
+					self._fail_pending(ConnectionError("AMI connection lost"))
+			attempt += 1
+			self.stats['reconnectAttempts'] += 1
+			delay = min(self.reconnect_max, self.reconnect_min * 2 ** min(attempt - 1, 16))
+			# Jitter keeps several servers from reconnecting in lockstep after an Asterisk restart
+			await asyncio.sleep(delay * random.uniform(0.5, 1))
+
+	def _disconnected(self, error, attempt):
+		self.last_error = str(error) or type(error).__name__
+		# Only the first failure of an outage is logged
+		if attempt == 0:
+			print(f"Asterisk Manager Interface unavailable, reconnecting: {self.last_error}")
+
+	async def _login(self, reader, writer):
+		await asyncio.wait_for(reader.readline(), self.timeout)
+		writer.write(format_action('Login', 'login', {'Username': self.username, 'Secret': self.secret}))
+		await writer.drain()
+		while True:
+			response = await asyncio.wait_for(read_message(reader), self.timeout)
+			if response.get('ActionID') == 'login':
+				break
+		if response.get('Response') != 'Success':
+			raise AMIError(f"AMI login failed: {response.get('Message', 'unknown error')}", response)
+
+	async def _serve(self, reader, writer):
+		receiver = asyncio.ensure_future(self._receive_loop(reader))
+		sender = asyncio.ensure_future(self._send_loop(writer))
+		try:
+			done, _ = await asyncio.wait([receiver, sender], return_when=asyncio.FIRST_COMPLETED)
+			for task in done:
+				task.result()
+		finally:
+			receiver.cancel()
+			sender.cancel()
+
+	async def _receive_loop(self, reader):
+		while True:
+			self._dispatch(await read_message(reader))
+
+	async def _send_loop(self, writer):
+		while True:
+			# Everything queued goes out in one write, without waiting for earlier responses
+			items = [await self._queue.get()]
+			while not self._queue.empty():
+				items.append(self._queue.get_nowait())
+			now = time.monotonic()
+			for action_id, payload, future in items:
+				if future.done():
+					# Timed out while waiting for a connection
+					continue
+				self._pending[action_id] = [future, now, None]
+				writer.write(payload)
+				self.stats['sent'] += 1
+			await writer.drain()
+
+	def _dispatch(self, message):
+		pending = self._pending.get(message.get('ActionID'))
+		if 'Response' in message:
+			if pending is None:
+				# Late reply to an action that already timed out
+				return
+			if message.get('EventList', '').lower() == 'start':
+				pending[2] = dict(message, events=[])
+			else:
+				self._resolve(message['ActionID'], message)
+			return
+		if 'Event' not in message:
+			return
+		if pending is not None and pending[2] is not None:
+			if message.get('EventList', '').lower() == 'complete':
+				self._resolve(message['ActionID'], pending[2])
+			else:
+				pending[2]['events'].append(message)
+			return
+		self.stats['events'] += 1
+		for handler in self._handlers.get(message['Event'], []) + self._handlers.get('*', []):
+			if asyncio.iscoroutinefunction(handler):
+				task = asyncio.ensure_future(handler(message))
+			else:
+				task = asyncio.get_event_loop().run_in_executor(None, handler, message)
+			task.add_done_callback(self._handler_done)
+
+	def _resolve(self, action_id, response):
+		future, sent_at, _ = self._pending.pop(action_id)
+		self.stats['responses'] += 1
+		self._rtts.append(time.monotonic() - sent_at)
+		if not future.done():
+			future.set_result(response)
+
+	def _handler_done(self, task):
+		if not task.cancelled() and task.exception() is not None:
+			self.stats['handlerErrors'] += 1
+			print(f"AMI event handler failed: {str(task.exception())}")
+
+	def _fail_pending(self, error):
+		pending, self._pending = self._pending, {}
+		for future, _, _ in pending.values():
+			if not future.done():
+				future.set_exception(error)
+
+class ThreadedAMIClient:
+	# Runs an AMIClient on its own event loop thread for the threaded Flask server. Actions return
+	# concurrent.futures.Future objects, so callers only block if they ask for the result.
+	def __init__(self, client=None):
+		self.client = client or AMIClient()
+		self.loop = asyncio.new_event_loop()
+		self._thread = threading.Thread(target=self.loop.run_forever, name='ami-client', daemon=True)
+
+	def register_event(self, name, handler):
+		self.client.register_event(name, handler)
+
+	def start(self):
+		self._thread.start()
+		asyncio.run_coroutine_threadsafe(self.client.start(), self.loop).result()
+
+	def send_action(self, action, **fields):
+		future = asyncio.run_coroutine_threadsafe(self.client.send_action(action, **fields), self.loop)
+		future.add_done_callback(lambda f: self._log_failure(action, f))
+		return future
+
+	def command(self, command):
+		return self.send_action('Command', Command=command)
+
+	def _log_failure(self, action, future):
+		if not future.cancelled() and future.exception() is not None:
+			print(f"AMI {action} failed: {str(future.exception())}")
+
+	def metrics(self):
+		# Read on the loop thread so the counters aren't sampled mid-update
+		async def collect():
+			return self.client.metrics()
+		return asyncio.run_coroutine_threadsafe(collect(), self.loop).result(timeout=5)
+
+	def close(self):
+		asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result(timeout=5)
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self._thread.join()
+
+if __name__ == '__main__':
+	# Usage: ami_client.py "<CLI command>"
+	async def main(command):
+		client = AMIClient()
+		await client.start()
+		try:
+			response = await client.command(command)
+			print(response.get('Output', response.get('Message', '')))
+		finally:
+			await client.close()
+	asyncio.run(main(' '.join(sys.argv[1:]) or 'core show version'))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import os
+import sys
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from project_store import open_store, duration_seconds
+
+BACKFILL_WORKERS = int(os.environ.get('DURATION_BACKFILL_WORKERS', '8'))
+BACKFILL_BATCH_SIZE = 200
+# The last Ogg page fits well within this tail of the file
+OGG_TAIL_BYTES = 65536
+
+class ProbeError(Exception):
+	pass
+
+def probe_duration(path):
+	# Duration in seconds from container headers only; samples are never decoded
+	with open(path, 'rb') as f:
+		head = f.read(12)
+		if head[:4] in (b'RIFF', b'RIFX') and head[8:12] == b'WAVE':
+			return _wav_duration(f, os.fstat(f.fileno()).st_size, '<' if head[:4] == b'RIFF' else '>')
+		if head[:4] == b'fLaC':
+			return _flac_duration(f)
+		if head[:4] == b'OggS':
+			return _ogg_duration(f, os.fstat(f.fileno()).st_size)
+	raise ProbeError(f"Unsupported audio container: {path}")
+
+def _wav_duration(f, file_size, endian):
+	byte_rate = None
+	f.seek(12)
+	while True:
+		header = f.read(8)
+		if len(header) < 8:
+			raise ProbeError("WAV file has no data chunk")
+		chunk_id, size = header[:4], struct.unpack(endian + 'I', header[4:])[0]
+		if chunk_id == b'fmt ':
+			fmt = f.read(size)
+			if len(fmt) < 16:
+				raise ProbeError("Truncated WAV fmt chunk")
+			byte_rate = struct.unpack(endian + 'I', fmt[8:12])[0]
+		elif chunk_id == b'data':
+			if not byte_rate:
+				raise ProbeError("WAV data chunk before fmt chunk")
+			# Recordings still being written, or streamed, carry a 0 or oversized data length
+			available = file_size - f.tell()
+			if size == 0 or size > available:
+				size = available
+			return size / byte_rate
+		else:
+			f.seek(size, os.SEEK_CUR)
+		if size % 2:
+			f.seek(1, os.SEEK_CUR)
+
+def _flac_duration(f):
+	# STREAMINFO is always the first metadata block: 20-bit sample rate, 36-bit total samples
+	f.seek(4)
+	header = f.read(4)
+	if len(header) < 4 or header[0] & 0x7f != 0:
+		raise ProbeError("FLAC file has no STREAMINFO block")
+	info = f.read(34)
+	if len(info) < 18:
+		raise ProbeError("Truncated FLAC STREAMINFO block")
+	packed = struct.unpack('>Q', info[10:18])[0]
+	sample_rate = packed >> 44
+	total_samples = packed & ((1 << 36) - 1)
+	if not sample_rate or not total_samples:
+		raise ProbeError("FLAC STREAMINFO has no sample count")
+	return total_samples / sample_rate
+
+def _ogg_duration(f, file_size):
+	# The codec header on the first page gives the granule rate; the last page's granule is the sample count
+	f.seek(0)
+	first = f.read(27)
+	if len(first) < 27:
+		raise ProbeError("Truncated Ogg page header")
+	segments = f.read(first[26])
+	if len(segments) < first[26]:
+		raise ProbeError("Truncated Ogg segment table")
+	packet = f.read(min(sum(segments), 64))
+	if packet.startswith(b'OpusHead'):
+		if len(packet) < 12:
+			raise ProbeError("Truncated Opus header")
+		rate, pre_skip = 48000, struct.unpack('<H', packet[10:12])[0]
+	elif packet.startswith(b'\x01vorbis'):
+		if len(packet) < 16:
+			raise ProbeError("Truncated Vorbis header")
+		rate, pre_skip = struct.unpack('<I', packet[12:16])[0], 0
+		if not rate:
+			raise ProbeError("Vorbis header has no sample rate")
+	else:
+		raise ProbeError("Unsupported Ogg codec")
+
+	f.seek(max(0, file_size - OGG_TAIL_BYTES))
+	tail = f.read()
+	position = tail.rfind(b'OggS')
+	while position >= 0:
+		if len(tail) >= position + 14:
+			granule = struct.unpack('<q', tail[position + 6:position + 14])[0]
+			# -1 marks a page on which no packet ends
+			if granule >= 0:
+				return max(0, granule - pre_skip) / rate
+		position = tail.rfind(b'OggS', 0, position)
+	raise ProbeError("Ogg file has no granule position")
+
+def audio_duration(path):
+	# Seconds rounded to milliseconds, or None when the file can't be probed
+	try:
+		return round(probe_duration(path), 3)
+	except (OSError, ProbeError, struct.error) as e:
+		print(f"Could not probe duration of {path}: {str(e)}")
+		return None
+
+def recording_path(voicemail_dir, voicemail_id):
+	# The original WAV if it is still around, otherwise whichever compressed copy exists
+	for ext in ('wav', 'ogg', 'flac'):
+		path = os.path.join(voicemail_dir, f"{voicemail_id}.{ext}")
+		if os.path.exists(path):
+			return path
+	return None
+
+def backfill_durations(store, voicemail_dir, workers=BACKFILL_WORKERS, batch_size=BACKFILL_BATCH_SIZE):
+	# Probe voicemails whose duration isn't a number yet; headers are read in parallel, writes go out in batches
+	pending = [
+		vm['id'] for project in store.load_projects() for vm in project.get('voicemails', [])
+		if duration_seconds(vm) is None
+	]
+
+	def probe(voicemail_id):
+		path = recording_path(voicemail_dir, voicemail_id)
+		return voicemail_id, audio_duration(path) if path else None
+
+	counts = {'updated': 0, 'missing': 0}
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		for start in range(0, len(pending), batch_size):
+			updates = {}
+			for voicemail_id, duration in executor.map(probe, pending[start:start + batch_size]):
+				if duration is None:
+					counts['missing'] += 1
+				else:
+					updates[voicemail_id] = {'duration': duration}
+			if updates:
+				store.update_voicemails(updates)
+				counts['updated'] += len(updates)
+	return counts
+
+if __name__ == '__main__':
+	command = sys.argv[1] if len(sys.argv) > 1 else ''
+	if command == 'backfill':
+		voicemail_dir = sys.argv[2] if len(sys.argv) > 2 else 'voicemails'
+		workers = int(sys.argv[3]) if len(sys.argv) > 3 else BACKFILL_WORKERS
+		store = open_store()
+		try:
+			counts = backfill_durations(store, voicemail_dir, workers)
+		finally:
+			store.close()
+		print(f"Backfilled {counts['updated']} durations, {counts['missing']} recordings missing or unreadable")
+	elif command and os.path.exists(command):
+		print(probe_duration(command))
+	else:
+		print("Usage: audio_probe.py <file> | backfill [voicemails_dir] [workers]")
+		sys.exit(1)
@@ -0,0 +1,166 @@
+import os
+import time
+import threading
+import subprocess
+from flask import send_file
+
+# Recordings never change once written, so clients may cache them for a year
+AUDIO_MAX_AGE = 31536000
+
+# 'wav' keeps recordings as recorded; 'opus' or 'flac' compresses them after transcription
+AUDIO_STORAGE = os.environ.get('AUDIO_STORAGE', 'wav')
+# Days the original WAV is kept next to the compressed copy
+ORIGINAL_GRACE_DAYS = float(os.environ.get('AUDIO_ORIGINAL_GRACE_DAYS', '7'))
+TRANSCODE_CACHE_DIR = 'transcoded'
+TRANSCODE_CACHE_MB = int(os.environ.get('TRANSCODE_CACHE_MB', '512'))
+TRANSCODE_TIMEOUT = int(os.environ.get('TRANSCODE_TIMEOUT', '120'))
+FFMPEG = os.environ.get('FFMPEG', 'ffmpeg')
+
+# format -> (file extension, mimetype, ffmpeg encoder arguments)
+FORMATS = {
+	'opus': ('ogg', 'audio/ogg', ['-c:a', 'libopus', '-b:a', '24k', '-application', 'voip']),
+	'flac': ('flac', 'audio/flac', ['-c:a', 'flac', '-compression_level', '8']),
+	'wav': ('wav', 'audio/wav', ['-c:a', 'pcm_s16le']),
+}
+
+class TranscodeError(Exception):
+	pass
+
+_transcode_locks = {}
+_transcode_locks_lock = threading.Lock()
+
+def audio_etag(stat):
+	# Strong validator from file identity; a replaced or rewritten file gets a new tag
+	return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+def send_audio(path, mimetype='audio/wav'):
+	# Conditional (If-None-Match / If-Modified-Since) and Range requests are answered by send_file.
+	# The file goes out through wsgi.file_wrapper (sendfile under gunicorn) or X-Sendfile when USE_X_SENDFILE is set.
+	# Flask resolves relative paths against the app package, not the working directory
+	path = os.path.abspath(path)
+	stat = os.stat(path)
+	response = send_file(
+		path,
+		mimetype=mimetype,
+		conditional=True,
+		etag=audio_etag(stat),
+		last_modified=stat.st_mtime,
+		max_age=AUDIO_MAX_AGE
+	)
+	response.headers['Cache-Control'] = f'private, max-age={AUDIO_MAX_AGE}, immutable'
+	return response
+
+def transcode(src, dest, fmt):
+	# Encode into a temp file and swap it in, so readers never see a partial file
+	tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+	command = [FFMPEG, '-nostdin', '-loglevel', 'error', '-y', '-i', src] + FORMATS[fmt][2] + ['-f', FORMATS[fmt][0], tmp]
+	try:
+		result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=TRANSCODE_TIMEOUT)
+		if result.returncode != 0:
+			raise TranscodeError(result.stderr.decode(errors='replace').strip() or f"ffmpeg exited with {result.returncode}")
+		os.replace(tmp, dest)
+	except (OSError, subprocess.TimeoutExpired) as e:
+		raise TranscodeError(str(e))
+	finally:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+	return dest
+
+def stored_audio(voicemail_dir, voicemail_id):
+	# Formats on disk for a recording, compressed copy first, as {format: path}
+	found = {}
+	for fmt in sorted(FORMATS, key=lambda f: (f == 'wav', f != AUDIO_STORAGE)):
+		path = os.path.join(voicemail_dir, f"{voicemail_id}.{FORMATS[fmt][0]}")
+		if os.path.exists(path):
+			found[fmt] = path
+	return found
+
+def compress_recording(voicemail_dir, voicemail_id, fmt=AUDIO_STORAGE):
+	# Called once transcription is done; the WAV stays until purge_originals removes it
+	if fmt == 'wav':
+		return None
+	src = os.path.join(voicemail_dir, f"{voicemail_id}.wav")
+	dest = os.path.join(voicemail_dir, f"{voicemail_id}.{FORMATS[fmt][0]}")
+	if not os.path.exists(dest):
+		transcode(src, dest, fmt)
+	return dest
+
+def purge_originals(voicemail_dir, grace_days=ORIGINAL_GRACE_DAYS):
+	# Delete WAVs that have a compressed copy and are past the grace period
+	cutoff = time.time() - grace_days * 86400
+	removed = 0
+	for name in os.listdir(voicemail_dir):
+		voicemail_id, ext = os.path.splitext(name)
+		if ext != '.wav':
+			continue
+		path = os.path.join(voicemail_dir, name)
+		if len(stored_audio(voicemail_dir, voicemail_id)) > 1 and os.path.getmtime(path) < cutoff:
+			os.remove(path)
+			removed += 1
+	return removed
+
+def negotiate_audio(voicemail_dir, voicemail_id, accept_mimetypes, requested=None):
+	# Returns (path, mimetype) for the best format the client accepts, transcoding into a cache if needed.
+	# Raises FileNotFoundError when the recording doesn't exist.
+	stored = stored_audio(voicemail_dir, voicemail_id)
+	if not stored:
+		raise FileNotFoundError(voicemail_id)
+
+	# Stored formats are preferred over ones that would need transcoding
+	offers = list(stored) + [fmt for fmt in FORMATS if fmt not in stored]
+	if requested in FORMATS:
+		fmt = requested
+	else:
+		best = accept_mimetypes.best_match([FORMATS[f][1] for f in offers])
+		fmt = next((f for f in offers if FORMATS[f][1] == best), offers[0])
+
+	if fmt in stored:
+		return stored[fmt], FORMATS[fmt][1]
+	return cached_transcode(voicemail_dir, voicemail_id, next(iter(stored.values())), fmt), FORMATS[fmt][1]
+
+def cached_transcode(voicemail_dir, voicemail_id, src, fmt):
+	cache_dir = os.path.join(voicemail_dir, TRANSCODE_CACHE_DIR)
+	dest = os.path.join(cache_dir, f"{voicemail_id}.{FORMATS[fmt][0]}")
+	try:
+		# Record the hit in atime only; mtime feeds the ETag and must not change
+		os.utime(dest, ns=(time.time_ns(), os.stat(dest).st_mtime_ns))
+		return dest
+	except FileNotFoundError:
+		pass
+
+	# One transcode per output; concurrent requests for it wait and reuse the result
+	with _transcode_locks_lock:
+		lock = _transcode_locks.setdefault(dest, threading.Lock())
+	try:
+		with lock:
+			if not os.path.exists(dest):
+				os.makedirs(cache_dir, exist_ok=True)
+				transcode(src, dest, fmt)
+				prune_transcode_cache(cache_dir, keep=dest)
+	finally:
+		# Also on a failed transcode, so a bad source doesn't leave its lock behind for good
+		with _transcode_locks_lock:
+			_transcode_locks.pop(dest, None)
+	return dest
+
+def prune_transcode_cache(cache_dir, max_mb=TRANSCODE_CACHE_MB, keep=None):
+	# Least recently served files go first; hits refresh the atime
+	entries = []
+	for name in os.listdir(cache_dir):
+		path = os.path.join(cache_dir, name)
+		if name.endswith('.tmp') or path == keep:
+			continue
+		try:
+			stat = os.stat(path)
+		except FileNotFoundError:
+			continue
+		entries.append((stat.st_atime, stat.st_size, path))
+	total = sum(size for _, size, _ in entries) + (os.path.getsize(keep) if keep else 0)
+	for _, size, path in sorted(entries):
+		if total <= max_mb * 1024 * 1024:
+			break
+		try:
+			os.remove(path)
+		except FileNotFoundError:
+			pass
+		total -= size
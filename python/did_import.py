@@ -0,0 +1,258 @@
+import os
+import re
+import csv
+import json
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from did_schedule import parse_date
+
+DID_IMPORT_BATCH_SIZE = int(os.environ.get('DID_IMPORT_BATCH_SIZE', '1000'))
+DID_PROVISION_WORKERS = int(os.environ.get('DID_PROVISION_WORKERS', '8'))
+# Finished jobs stay visible to the progress endpoint this long
+DID_IMPORT_JOB_TTL = int(os.environ.get('DID_IMPORT_JOB_TTL', '3600'))
+DID_IMPORT_MAX_ERRORS = 100
+DID_IMPORT_FORMATS = ('csv', 'ndjson')
+DID_NUMBER_PATTERN = re.compile(r'^\+?\d{3,20}$')
+# CSV without a header row is read as number[,startDate[,endDate]]
+CSV_COLUMNS = ('number', 'startDate', 'endDate')
+SPOOL_CHUNK = 64 * 1024
+
+def import_format(content_type, filename=None, requested=None):
+	# Explicit ?format= wins, then the file extension, then the content type; CSV otherwise
+	if requested:
+		if requested not in DID_IMPORT_FORMATS:
+			raise ValueError(f"Unsupported import format: {requested}")
+		return requested
+	if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+		return 'ndjson'
+	if content_type and ('ndjson' in content_type or 'jsonl' in content_type):
+		return 'ndjson'
+	return 'csv'
+
+def read_records(lines, fmt):
+	# Yields (line number, record, error) for every row; a row has either a record or an error
+	if fmt == 'ndjson':
+		for line_no, line in enumerate(lines, 1):
+			if not line.strip():
+				continue
+			try:
+				record = json.loads(line)
+			except ValueError:
+				yield line_no, None, "Invalid JSON"
+				continue
+			if isinstance(record, str):
+				record = {'number': record}
+			if not isinstance(record, dict):
+				yield line_no, None, "Expected an object or a number"
+				continue
+			yield line_no, record, None
+		return
+
+	reader = csv.reader(lines)
+	columns = None
+	for row in reader:
+		if not any(cell.strip() for cell in row):
+			continue
+		if columns is None:
+			names = {c.lower(): c for c in CSV_COLUMNS}
+			header = [names.get(cell.strip().lower()) for cell in row]
+			columns = CSV_COLUMNS
+			if 'number' in header:
+				columns = header
+				continue
+		record = {name: cell.strip() for name, cell in zip(columns, row) if name and cell.strip()}
+		yield reader.line_num, record, None
+
+def normalize_did(record, defaults=None):
+	# Returns (did, error); dates fall back to the job defaults and must parse
+	values = dict(defaults or {})
+	values.update({k: v for k, v in record.items() if v not in (None, '')})
+	number = re.sub(r'[\s\-().]', '', str(values.get('number') or ''))
+	if not DID_NUMBER_PATTERN.match(number):
+		return None, "Invalid number"
+	start = str(values.get('startDate') or datetime.now().isoformat())
+	end = str(values['endDate']) if values.get('endDate') else None
+	start_date = parse_date(start)
+	if start_date is None:
+		return None, "Invalid startDate"
+	did = {'number': number, 'startDate': start}
+	if end:
+		end_date = parse_date(end)
+		if end_date is None:
+			return None, "Invalid endDate"
+		if end_date <= start_date:
+			return None, "endDate is before startDate"
+		did['endDate'] = end
+	did['added'] = datetime.now().isoformat()
+	return did, None
+
+def spool_upload(stream, directory=None):
+	# Copies the upload to disk in chunks so the request thread never holds the whole file
+	fd, path = tempfile.mkstemp(prefix='did-import-', suffix='.upload', dir=directory)
+	try:
+		with os.fdopen(fd, 'wb') as f:
+			shutil.copyfileobj(stream, f, SPOOL_CHUNK)
+	except Exception:
+		os.remove(path)
+		raise
+	return path
+
+class DidImportJob:
+	def __init__(self, project_id, fmt, defaults=None):
+		self.id = uuid.uuid4().hex
+		self.project_id = project_id
+		self.format = fmt
+		self.defaults = defaults or {}
+		self.status = 'queued'
+		self.error = None
+		self.counts = {'rows': 0, 'added': 0, 'duplicate': 0, 'invalid': 0, 'provisioned': 0, 'provisionFailed': 0}
+		# First DID_IMPORT_MAX_ERRORS problems, so a bad file doesn't grow the job without bound
+		self.errors = []
+		self.created = time.time()
+		self.finished = None
+		self._futures = set()
+		self._lock = threading.Condition()
+
+	def count(self, key, n=1):
+		with self._lock:
+			self.counts[key] += n
+
+	def record_error(self, line, number, error):
+		with self._lock:
+			if len(self.errors) < DID_IMPORT_MAX_ERRORS:
+				self.errors.append({'line': line, 'number': number, 'error': error})
+
+	def wait_provisioned(self):
+		with self._lock:
+			self._lock.wait_for(lambda: not self._futures)
+
+	def to_dict(self):
+		with self._lock:
+			return {
+				'id': self.id,
+				'projectId': self.project_id,
+				'format': self.format,
+				'status': self.status,
+				'error': self.error,
+				'counts': dict(self.counts),
+				'pendingProvisioning': len(self._futures),
+				'errors': list(self.errors),
+				'created': self.created,
+				'finished': self.finished
+			}
+
+class DidImporter:
+	# Runs uploaded DID files one at a time off the request thread. Each batch is added through add_batch,
+	# which checks the global DID index and returns the DIDs it actually added; those are provisioned
+	# through a bounded worker pool while the next batch is parsed.
+	def __init__(self, add_batch, provision, workers=DID_PROVISION_WORKERS, batch_size=DID_IMPORT_BATCH_SIZE,
+			spool_dir=None):
+		self.add_batch = add_batch
+		self.provision = provision
+		self.batch_size = batch_size
+		self.spool_dir = spool_dir
+		self.jobs = {}
+		self._lock = threading.Lock()
+		self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix='did-import')
+		self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='did-provision')
+		# Caps provisioning work queued ahead of the workers, which keeps parsing from racing ahead
+		self._slots = threading.BoundedSemaphore(workers * 4)
+
+	def start(self, project_id, stream, fmt, defaults=None):
+		path = spool_upload(stream, self.spool_dir)
+		job = DidImportJob(project_id, fmt, defaults)
+		with self._lock:
+			self._prune()
+			self.jobs[job.id] = job
+		self._runner.submit(self._run, job, path)
+		return job
+
+	def get(self, job_id):
+		with self._lock:
+			return self.jobs.get(job_id)
+
+	def _prune(self):
+		cutoff = time.time() - DID_IMPORT_JOB_TTL
+		for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished < cutoff]:
+			del self.jobs[job_id]
+
+	def _run(self, job, path):
+		job.status = 'running'
+		seen = set()
+		batch = []
+		try:
+			with open(path, newline='', encoding='utf-8-sig') as f:
+				for line, record, error in read_records(f, job.format):
+					job.count('rows')
+					did = None
+					if error is None:
+						did, error = normalize_did(record, job.defaults)
+					if error:
+						job.count('invalid')
+						job.record_error(line, (record or {}).get('number'), error)
+						continue
+					if did['number'] in seen:
+						job.count('duplicate')
+						continue
+					seen.add(did['number'])
+					batch.append(did)
+					if len(batch) >= self.batch_size:
+						self._commit(job, batch)
+						batch = []
+			if batch:
+				self._commit(job, batch)
+			job.wait_provisioned()
+			job.status = 'done'
+		except Exception as e:
+			job.status = 'failed'
+			job.error = str(e)
+			print(f"DID import {job.id} failed: {str(e)}")
+		finally:
+			job.finished = time.time()
+			os.remove(path)
+
+	def _commit(self, job, batch):
+		added = self.add_batch(job.project_id, batch)
+		job.count('added', len(added))
+		# Numbers already routed to a project are skipped, not errors
+		job.count('duplicate', len(batch) - len(added))
+		self.provision_all(job.project_id, [did['number'] for did in added], job)
+
+	def provision_all(self, project_id, numbers, job=None):
+		# Queues Asterisk setup for each number, blocking only while the pool's queue is full
+		for number in numbers:
+			self._slots.acquire()
+			try:
+				future = self._pool.submit(self.provision, project_id, number)
+			except Exception:
+				self._slots.release()
+				raise
+			if job is not None:
+				with job._lock:
+					job._futures.add(future)
+			future.add_done_callback(lambda f, number=number: self._provisioned(f, project_id, number, job))
+
+	def _provisioned(self, future, project_id, number, job):
+		self._slots.release()
+		error = future.exception()
+		if error is not None:
+			print(f"Asterisk setup for DID {number} in project {project_id} failed: {str(error)}")
+		if job is None:
+			return
+		with job._lock:
+			if error is None:
+				job.counts['provisioned'] += 1
+			else:
+				job.counts['provisionFailed'] += 1
+				job.record_error(None, number, f"Provisioning failed: {str(error)}")
+			job._futures.discard(future)
+			job._lock.notify_all()
+
+	def shutdown(self):
+		self._runner.shutdown(wait=True)
+		self._pool.shutdown(wait=True)
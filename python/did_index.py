@@ -0,0 +1,117 @@
+import os
+import json
+import sqlite3
+import tempfile
+from project_store import did_number
+
+DID_INDEX_FILE = "did_index.db"
+
+class DidIndex:
+	# In-memory DID -> project id map, persisted as a read-only SQLite file for call routing
+	def __init__(self, projects=()):
+		self.routes = {}
+		self.rebuild(projects)
+
+	def rebuild(self, projects):
+		routes = {}
+		for project in projects:
+			# A project that hasn't been given an id yet has nothing to route to
+			if not project.get('id'):
+				continue
+			for did in project.get('dids', []):
+				routes[did_number(did)] = project['id']
+		self.routes = routes
+
+	def get(self, did):
+		return self.routes.get(did)
+
+	def __contains__(self, did):
+		return did in self.routes
+
+	def __len__(self):
+		return len(self.routes)
+
+	def apply(self, project_id, added=(), removed=(), path=DID_INDEX_FILE, catch_all_enabled=False):
+		# Applies one project's DID changes to memory and to the saved file in place, instead of a full rewrite
+		removed = [number for number in removed if self.routes.get(number) == project_id]
+		for number in removed:
+			del self.routes[number]
+		for number in added:
+			self.routes[number] = project_id
+		if not os.path.exists(path):
+			self.save(path, catch_all_enabled)
+			return
+		conn = sqlite3.connect(path)
+		try:
+			with conn:
+				conn.executemany("DELETE FROM routes WHERE did = ?", [(number,) for number in removed])
+				conn.executemany("INSERT OR REPLACE INTO routes VALUES (?, ?)", [(number, project_id) for number in added])
+		finally:
+			conn.close()
+
+	def save(self, path=DID_INDEX_FILE, catch_all_enabled=False):
+		# Build next to the live file and swap it in so readers never see a partial index
+		# A unique temp file per call, since request threads can save concurrently
+		fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+		os.close(fd)
+		try:
+			conn = sqlite3.connect(tmp_path)
+			try:
+				conn.execute("CREATE TABLE routes (did TEXT PRIMARY KEY, project_id TEXT NOT NULL) WITHOUT ROWID")
+				conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+				conn.executemany("INSERT OR REPLACE INTO routes VALUES (?, ?)", list(self.routes.items()))
+				conn.execute("INSERT INTO meta VALUES ('catchAllEnabled', ?)", ('1' if catch_all_enabled else '0',))
+				conn.commit()
+			finally:
+				conn.close()
+			os.replace(tmp_path, path)
+		except BaseException:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			raise
+
+def lookup_did(path, did):
+	# Returns (project_id, catch_all_enabled), or None when no index has been written yet
+	if not os.path.exists(path):
+		return None
+	conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+	try:
+		row = conn.execute("SELECT project_id FROM routes WHERE did = ?", (did,)).fetchone()
+		meta = conn.execute("SELECT value FROM meta WHERE key = 'catchAllEnabled'").fetchone()
+	finally:
+		conn.close()
+	return (row[0] if row else None, bool(meta and meta[0] == '1'))
+
+def load_did_index(path):
+	# Returns (routes, catch_all_enabled) with every route loaded into memory
+	conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+	try:
+		routes = dict(conn.execute("SELECT did, project_id FROM routes"))
+		meta = conn.execute("SELECT value FROM meta WHERE key = 'catchAllEnabled'").fetchone()
+	finally:
+		conn.close()
+	return routes, bool(meta and meta[0] == '1')
+
+def scan_projects(base_dir, did):
+	# Slow path used before the server has written an index
+	projects_file = os.path.join(base_dir, 'projects.json')
+	settings_file = os.path.join(base_dir, 'settings.json')
+
+	# Load projects file
+	try:
+		with open(projects_file, 'r') as f:
+			projects = json.load(f)
+	except FileNotFoundError:
+		projects = []
+
+	# Load settings to check catch-all status
+	try:
+		with open(settings_file, 'r') as f:
+			settings = json.load(f)
+			catch_all_enabled = settings.get('catchAllEnabled', False)
+	except FileNotFoundError:
+		catch_all_enabled = False
+
+	# Check if DID exists in any project
+	did_exists = any(did == did_number(d) for project in projects for d in project.get('dids', []))
+	return did_exists, catch_all_enabled
@@ -0,0 +1,175 @@
+import os
+import json
+import heapq
+import threading
+from datetime import timedelta
+from dateutil.parser import parse
+from project_store import did_number
+
+DID_SCHEDULE_FILE = "did_alerts.json"
+DID_ALERT_DAYS = 90
+# Failed alerts and archives are retried after 5 minutes, doubling up to 6 hours
+DID_RETRY_MIN = timedelta(minutes=5)
+DID_RETRY_MAX = timedelta(hours=6)
+
+def parse_date(value):
+	# Naive local time, so dates with and without an offset compare with datetime.now()
+	if not value:
+		return None
+	try:
+		date = parse(value)
+	except (ValueError, OverflowError):
+		print(f"Ignoring unparseable DID date: {value}")
+		return None
+	if date.tzinfo is not None:
+		date = date.astimezone().replace(tzinfo=None)
+	return date
+
+class DidSchedule:
+	# Min-heap of DID lifecycle events (the 90-day alert and the end-date archive) keyed by due time.
+	# Superseded heap entries are skipped lazily; dates are only parsed when a DID's dates change.
+	def __init__(self, path=DID_SCHEDULE_FILE, alert_days=DID_ALERT_DAYS):
+		self.path = path
+		self.alert_days = alert_days
+		self._lock = threading.Lock()
+		self._heap = []
+		self._seq = 0
+		self._current = {}
+		self._dates = {}
+		self._attempts = {}
+		self._sent = self._load_sent()
+
+	def _load_sent(self):
+		# Alerts already sent, as (project id, number) -> startDates, so a restart doesn't repeat them
+		sent = {}
+		try:
+			with open(self.path) as f:
+				for project_id, number, start in json.load(f):
+					sent.setdefault((project_id, number), set()).add(start)
+		except (OSError, ValueError):
+			pass
+		return sent
+
+	def _save_sent(self):
+		tmp_path = f"{self.path}.{os.getpid()}.tmp"
+		with open(tmp_path, 'w') as f:
+			json.dump(sorted(did_key + (start,) for did_key, starts in self._sent.items() for start in starts), f)
+		os.replace(tmp_path, self.path)
+
+	def _push(self, key, due):
+		self._seq += 1
+		self._current[key] = (due, self._seq)
+		heapq.heappush(self._heap, (due, self._seq, key))
+
+	def sync(self, projects):
+		# Full pass over every project, for startup and reloads; only DIDs whose dates changed are re-parsed
+		with self._lock:
+			seen = set()
+			for project in projects:
+				if not project.get('id'):
+					continue
+				for did in project.get('dids', []):
+					if isinstance(did, dict):
+						did_key = (project['id'], did_number(did))
+						seen.add(did_key)
+						self._set_dates(did_key, did)
+			dropped = [did_key for did_key in set(self._dates) | set(self._sent) if did_key not in seen]
+			self._finish(dropped)
+
+	def update(self, project_id, dids=(), removed=()):
+		# One project's DIDs changed: dids are the added or edited DIDs, removed the numbers that are gone.
+		# Costs O(changed DIDs) rather than a pass over every project.
+		with self._lock:
+			kept = set()
+			dropped = []
+			for did in dids:
+				did_key = (project_id, did_number(did))
+				if isinstance(did, dict):
+					kept.add(did_key)
+					self._set_dates(did_key, did)
+				else:
+					dropped.append(did_key)
+			dropped += [(project_id, number) for number in removed if (project_id, number) not in kept]
+			self._finish(dropped)
+
+	def _set_dates(self, did_key, did):
+		dates = (did.get('startDate'), did.get('endDate'))
+		if self._dates.get(did_key) != dates:
+			self._dates[did_key] = dates
+			self._schedule(did_key, dates)
+
+	def _finish(self, dropped):
+		sent_changed = False
+		for did_key in dropped:
+			self._dates.pop(did_key, None)
+			self._clear(did_key)
+			sent_changed = self._sent.pop(did_key, None) is not None or sent_changed
+		if sent_changed:
+			self._save_sent()
+		# Drop superseded entries once they make up most of the heap
+		if len(self._heap) > 2 * len(self._current) + 64:
+			self._heap = [(due, seq, key) for key, (due, seq) in self._current.items()]
+			heapq.heapify(self._heap)
+
+	def _clear(self, did_key):
+		for kind in ('archive', 'alert'):
+			self._current.pop(did_key + (kind,), None)
+			self._attempts.pop(did_key + (kind,), None)
+
+	def _schedule(self, did_key, dates):
+		start, end = parse_date(dates[0]), parse_date(dates[1])
+		self._clear(did_key)
+		if end is not None:
+			self._push(did_key + ('archive',), end)
+		if start is not None and dates[0] not in self._sent.get(did_key, ()):
+			alert_at = start + timedelta(days=self.alert_days)
+			# No point warning about a DID that is archived first
+			if end is None or alert_at < end:
+				self._push(did_key + ('alert',), alert_at)
+
+	def _live(self, entry):
+		due, seq, key = entry
+		return self._current.get(key) == (due, seq)
+
+	def next_due(self):
+		with self._lock:
+			while self._heap and not self._live(self._heap[0]):
+				heapq.heappop(self._heap)
+			return self._heap[0][0] if self._heap else None
+
+	def pop_due(self, now):
+		# Returns the events due by now, earliest first; each event is returned once
+		events = []
+		with self._lock:
+			while self._heap and self._heap[0][0] <= now:
+				entry = heapq.heappop(self._heap)
+				if not self._live(entry):
+					continue
+				due, _, (project_id, number, kind) = entry
+				del self._current[(project_id, number, kind)]
+				events.append({'kind': kind, 'projectId': project_id, 'number': number, 'due': due})
+		return events
+
+	def retry(self, event, now):
+		# Re-queues a failed event with exponential backoff unless its DID changed or went away meanwhile.
+		# Returns the delay, or None when the event was dropped.
+		key = (event['projectId'], event['number'], event['kind'])
+		with self._lock:
+			if key[:2] not in self._dates or key in self._current:
+				return None
+			attempts = self._attempts.get(key, 0)
+			delay = min(DID_RETRY_MIN * 2 ** attempts, DID_RETRY_MAX)
+			self._attempts[key] = attempts + 1
+			self._push(key, now + delay)
+			return delay
+
+	def mark_alert_sent(self, project_id, number):
+		with self._lock:
+			did_key = (project_id, number)
+			start = self._dates.get(did_key, (None, None))[0]
+			self._sent.setdefault(did_key, set()).add(start)
+			self._attempts.pop(did_key + ('alert',), None)
+			self._save_sent()
+
+	def __len__(self):
+		return len(self._current)
@@ -0,0 +1,177 @@
+import os
+import math
+import time
+import bisect
+import threading
+from array import array
+
+DNC_SYNC_INTERVAL = int(os.environ.get('DNC_SYNC_INTERVAL', '60'))
+# Incremental syncs only see new rows; a periodic full reload picks up deletions
+DNC_FULL_SYNC_INTERVAL = int(os.environ.get('DNC_FULL_SYNC_INTERVAL', '3600'))
+DNC_FALSE_POSITIVE_RATE = 0.001
+FETCH_SIZE = 10000
+MERGE_THRESHOLD = 4096
+
+MASK64 = (1 << 64) - 1
+
+def normalize_number(number):
+	# Numbers are compared by their digits, so "+1 (555) 010-0000" and "15550100000" match
+	digits = ''.join(c for c in str(number or '') if c.isdigit())
+	return int(digits) if digits and len(digits) <= 19 else None
+
+def mix64(x):
+	# splitmix64 finalizer
+	x = (x + 0x9E3779B97F4A7C15) & MASK64
+	x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+	x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+	return x ^ (x >> 31)
+
+class BloomFilter:
+	def __init__(self, capacity, error_rate=DNC_FALSE_POSITIVE_RATE):
+		capacity = max(capacity, 1024)
+		self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2)
+		self.hashes = max(1, round(self.size / capacity * math.log(2)))
+		self.bits = bytearray((self.size + 7) // 8)
+
+	def _positions(self, key):
+		# Double hashing: k positions from two 64-bit hashes
+		h1 = mix64(key)
+		h2 = mix64(h1) | 1
+		return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+	def add(self, key):
+		for pos in self._positions(key):
+			self.bits[pos >> 3] |= 1 << (pos & 7)
+
+	def __contains__(self, key):
+		return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+class DncSet:
+	# Bloom filter in front of a sorted array of numbers; the array makes answers exact
+	def __init__(self, numbers=()):
+		self._lock = threading.Lock()
+		self.rebuild(numbers)
+
+	def rebuild(self, numbers):
+		keys = sorted({n for n in map(normalize_number, numbers) if n is not None})
+		bloom = BloomFilter(len(keys) * 2)
+		for key in keys:
+			bloom.add(key)
+		sorted_keys = array('Q', keys)
+		with self._lock:
+			self._sorted = sorted_keys
+			self._recent = set()
+			self._bloom = bloom
+
+	def add(self, number):
+		key = normalize_number(number)
+		if key is None:
+			return
+		with self._lock:
+			self._bloom.add(key)
+			self._recent.add(key)
+			if len(self._recent) >= MERGE_THRESHOLD:
+				merged = sorted(set(self._sorted).union(self._recent))
+				self._sorted = array('Q', merged)
+				self._recent = set()
+
+	def __contains__(self, number):
+		key = normalize_number(number)
+		if key is None:
+			return False
+		with self._lock:
+			if key not in self._bloom:
+				return False
+			if key in self._recent:
+				return True
+			i = bisect.bisect_left(self._sorted, key)
+			return i < len(self._sorted) and self._sorted[i] == key
+
+	def __len__(self):
+		with self._lock:
+			return len(self._sorted) + len(self._recent)
+
+class DncFilter:
+	# Local copy of DNCSoftphone kept in sync with the database
+	def __init__(self, pool, full_sync_interval=DNC_FULL_SYNC_INTERVAL):
+		self.pool = pool
+		self.full_sync_interval = full_sync_interval
+		self.numbers = DncSet()
+		self.loaded = False
+		self.watermark = None
+		self.last_full_sync = 0
+		self.last_sync = None
+		self._sync_lock = threading.Lock()
+		# Guards _added_during_rebuild and the swap to the rebuilt set, so no add() falls between them
+		self._rebuild_lock = threading.Lock()
+		self._added_during_rebuild = None
+
+	def __contains__(self, number):
+		return number in self.numbers
+
+	def add(self, number):
+		# Called right after a DNC insert so the next check sees it without waiting for a sync
+		with self._rebuild_lock:
+			self.numbers.add(number)
+			if self._added_during_rebuild is not None:
+				self._added_during_rebuild.append(number)
+
+	def sync(self):
+		with self._sync_lock:
+			if not self.loaded or time.monotonic() - self.last_full_sync >= self.full_sync_interval:
+				self._full_sync()
+			else:
+				self._incremental_sync()
+			self.last_sync = time.time()
+
+	def _full_sync(self):
+		numbers = []
+		watermark = None
+		with self._rebuild_lock:
+			self._added_during_rebuild = []
+		try:
+			with self.pool.connection() as conn:
+				cursor = conn.cursor()
+				cursor.execute("SELECT PhoneNumber, DateAdded FROM DNCSoftphone")
+				while True:
+					rows = cursor.fetchmany(FETCH_SIZE)
+					if not rows:
+						break
+					for number, added in rows:
+						numbers.append(number)
+						if added is not None and (watermark is None or added > watermark):
+							watermark = added
+		except BaseException:
+			with self._rebuild_lock:
+				self._added_during_rebuild = None
+			raise
+		# Keep numbers added while the snapshot was being read
+		with self._rebuild_lock:
+			added, self._added_during_rebuild = self._added_during_rebuild, None
+			self.numbers.rebuild(numbers + added)
+		self.watermark = watermark
+		self.loaded = True
+		self.last_full_sync = time.monotonic()
+
+	def _incremental_sync(self):
+		with self.pool.connection() as conn:
+			cursor = conn.cursor()
+			if self.watermark is None:
+				cursor.execute("SELECT PhoneNumber, DateAdded FROM DNCSoftphone WHERE DateAdded IS NOT NULL")
+			else:
+				# >= so rows sharing the watermark timestamp but committed later aren't missed
+				cursor.execute(
+					"SELECT PhoneNumber, DateAdded FROM DNCSoftphone WHERE DateAdded >= %s",
+					(self.watermark,)
+				)
+			for number, added in cursor.fetchall():
+				self.numbers.add(number)
+				if added is not None and (self.watermark is None or added > self.watermark):
+					self.watermark = added
+
+	def stats(self):
+		return {
+			'loaded': self.loaded,
+			'size': len(self.numbers),
+			'lastSync': self.last_sync
+		}
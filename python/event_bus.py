@@ -0,0 +1,64 @@
+import json
+import queue
+import threading
+from collections import deque
+
+EVENT_HISTORY = 1000
+SUBSCRIBER_QUEUE_SIZE = 256
+
+class EventBus:
+	# In-process fan-out of change events to Server-Sent Events subscribers
+	def __init__(self, history=EVENT_HISTORY, queue_size=SUBSCRIBER_QUEUE_SIZE):
+		self._lock = threading.Lock()
+		self._subscribers = set()
+		self._history = deque(maxlen=history)
+		self._queue_size = queue_size
+		self._seq = 0
+
+	def publish(self, event_type, data):
+		with self._lock:
+			self._seq += 1
+			event = {'id': self._seq, 'type': event_type, 'data': data}
+			self._history.append(event)
+			for subscriber in list(self._subscribers):
+				try:
+					subscriber.put_nowait(event)
+				except queue.Full:
+					# Too far behind; end its stream so the client reconnects and reloads
+					self._drop(subscriber)
+		return event
+
+	def subscribe(self, last_event_id=None):
+		subscriber = queue.Queue(maxsize=self._queue_size)
+		with self._lock:
+			if last_event_id is not None:
+				missed = [e for e in self._history if e['id'] > last_event_id]
+				history_start = self._history[0]['id'] if self._history else self._seq + 1
+				lost = history_start > last_event_id + 1 or last_event_id > self._seq
+				if lost or len(missed) > self._queue_size:
+					# Events fell out of the history or the server restarted; tell the client to reload
+					missed = [{'id': self._seq, 'type': 'projects-reloaded', 'data': {}}]
+				for event in missed:
+					subscriber.put_nowait(event)
+			self._subscribers.add(subscriber)
+		return subscriber
+
+	def unsubscribe(self, subscriber):
+		with self._lock:
+			self._subscribers.discard(subscriber)
+
+	def _drop(self, subscriber):
+		self._subscribers.discard(subscriber)
+		while True:
+			try:
+				subscriber.get_nowait()
+			except queue.Empty:
+				break
+		subscriber.put_nowait(None)
+
+	def subscriber_count(self):
+		with self._lock:
+			return len(self._subscribers)
+
+def format_sse(event):
+	return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
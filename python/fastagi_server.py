@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import os
+import asyncio
+from urllib.parse import urlparse
+from did_index import DID_INDEX_FILE, load_did_index, scan_projects
+from voicemail_queue import VoicemailQueue, QUEUE_DB
+
+FASTAGI_HOST = os.environ.get('FASTAGI_HOST', '127.0.0.1')
+FASTAGI_PORT = int(os.environ.get('FASTAGI_PORT', '4573'))
+
+class AGISession:
+	def __init__(self, reader, writer, env):
+		self.reader = reader
+		self.writer = writer
+		self.env = env
+
+	@property
+	def args(self):
+		args = []
+		while f'agi_arg_{len(args) + 1}' in self.env:
+			args.append(self.env[f'agi_arg_{len(args) + 1}'])
+		return args
+
+	async def command(self, line):
+		self.writer.write(f"{line}\n".encode())
+		await self.writer.drain()
+		response = await self.reader.readline()
+		if not response:
+			raise ConnectionError("Asterisk closed the AGI channel")
+		return response.decode().strip()
+
+	async def set_variable(self, name, value):
+		return await self.command(f'SET VARIABLE {name} "{value}"')
+
+class HotDidIndex:
+	# Keeps did_index.db in memory and reloads it whenever the server replaces or updates the file
+	def __init__(self, base_dir):
+		self.base_dir = base_dir
+		self.path = os.path.join(base_dir, DID_INDEX_FILE)
+		self.routes = None
+		self.catch_all_enabled = False
+		self.identity = None
+
+	def refresh(self):
+		try:
+			stat = os.stat(self.path)
+		except FileNotFoundError:
+			self.routes = None
+			self.identity = None
+			return
+		# SQLite's file change counter catches in-place updates that keep the size and mtime
+		with open(self.path, 'rb') as f:
+			f.seek(24)
+			counter = f.read(4)
+		identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size, counter)
+		if identity != self.identity:
+			self.routes, self.catch_all_enabled = load_did_index(self.path)
+			self.identity = identity
+
+	def resolve(self, did):
+		self.refresh()
+		if self.routes is None:
+			return scan_projects(self.base_dir, did)
+		return did in self.routes, self.catch_all_enabled
+
+class FastAGIServer:
+	def __init__(self, base_dir):
+		self.index = HotDidIndex(base_dir)
+		self.queue = VoicemailQueue(os.path.join(base_dir, QUEUE_DB))
+		self.scripts = {
+			'check_did': self.check_did,
+			'enqueue_voicemail': self.enqueue_voicemail,
+		}
+
+	async def check_did(self, session):
+		args = session.args
+		did = args[0] if args else ''
+		did_exists, catch_all_enabled = self.index.resolve(did)
+
+		# Set variables for dialplan
+		await session.set_variable('DID_EXISTS', '1' if did_exists else '0')
+		await session.set_variable('CATCH_ALL_ENABLED', '1' if catch_all_enabled else '0')
+
+	async def enqueue_voicemail(self, session):
+		args = session.args
+		if len(args) != 3:
+			await session.command('VERBOSE "enqueue_voicemail expects voicemail_id,caller,did" 1')
+			return
+		loop = asyncio.get_event_loop()
+		await loop.run_in_executor(None, self.queue.enqueue, *args)
+
+	async def handle(self, reader, writer):
+		try:
+			env = {}
+			while True:
+				line = await reader.readline()
+				if not line or not line.strip():
+					break
+				key, _, value = line.decode().partition(':')
+				env[key.strip()] = value.strip()
+
+			script = urlparse(env.get('agi_network_script', '')).path.strip('/')
+			handler = self.scripts.get(script)
+			session = AGISession(reader, writer, env)
+			if handler:
+				await handler(session)
+			else:
+				print(f"Unknown FastAGI script: {script}")
+				await session.command('VERBOSE "Unknown FastAGI script" 1')
+		except ConnectionError:
+			pass
+		except Exception as e:
+			print(f"FastAGI request failed: {str(e)}")
+		finally:
+			writer.close()
+
+	async def serve(self, host=FASTAGI_HOST, port=FASTAGI_PORT):
+		server = await asyncio.start_server(self.handle, host, port)
+		print(f"FastAGI server listening on {host}:{port}")
+		async with server:
+			await server.serve_forever()
+
+if __name__ == '__main__':
+	base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	asyncio.run(FastAGIServer(base_dir).serve())
@@ -0,0 +1,88 @@
+import os
+import time
+import bisect
+import ipaddress
+import threading
+
+ALLOWLIST_CHECK_INTERVAL = 1.0
+
+def parse_entries(entries):
+	networks = []
+	for entry in entries:
+		entry = entry.split('#', 1)[0].strip()
+		if not entry:
+			continue
+		try:
+			networks.append(ipaddress.ip_network(entry, strict=False))
+		except ValueError:
+			print(f"Ignoring invalid allowlist entry: {entry}")
+	return networks
+
+class IPAllowlist:
+	# IPv4/IPv6 addresses and CIDRs merged into sorted, non-overlapping integer ranges
+	def __init__(self, entries=()):
+		self._ranges = {4: ([], []), 6: ([], [])}
+		for version in (4, 6):
+			nets = [n for n in parse_entries(entries) if n.version == version]
+			starts, ends = self._ranges[version]
+			for net in ipaddress.collapse_addresses(nets):
+				starts.append(int(net.network_address))
+				ends.append(int(net.broadcast_address))
+
+	def __contains__(self, ip):
+		try:
+			address = ipaddress.ip_address(ip)
+		except ValueError:
+			return False
+		if address.version == 6 and address.ipv4_mapped:
+			address = address.ipv4_mapped
+		starts, ends = self._ranges[address.version]
+		value = int(address)
+		i = bisect.bisect_right(starts, value) - 1
+		return i >= 0 and value <= ends[i]
+
+	def __len__(self):
+		return sum(len(starts) for starts, _ in self._ranges.values())
+
+class ReloadingAllowlist:
+	# Entries from ALLOWED_IPS plus an optional file (one entry per line), reloaded when the file changes
+	def __init__(self, entries=(), path=None, check_interval=ALLOWLIST_CHECK_INTERVAL):
+		self.entries = list(entries)
+		self.path = path
+		self.check_interval = check_interval
+		self._identity = None
+		self._next_check = 0
+		self._lock = threading.Lock()
+		self.allowlist = IPAllowlist(self.entries)
+		self.reload_if_changed()
+
+	def _file_identity(self):
+		try:
+			stat = os.stat(self.path)
+		except OSError:
+			return None
+		return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+	def reload_if_changed(self):
+		if not self.path:
+			return
+		identity = self._file_identity()
+		if identity == self._identity:
+			return
+		file_entries = []
+		if identity is not None:
+			with open(self.path) as f:
+				file_entries = f.read().splitlines()
+		self.allowlist = IPAllowlist(self.entries + file_entries)
+		self._identity = identity
+
+	def allows(self, ip):
+		# Stat the file at most once per check_interval, not on every request
+		now = time.monotonic()
+		if self.path and now >= self._next_check and self._lock.acquire(blocking=False):
+			try:
+				self._next_check = now + self.check_interval
+				self.reload_if_changed()
+			finally:
+				self._lock.release()
+		return ip in self.allowlist
@@ -0,0 +1,136 @@
+from dnc_filter import normalize_number
+
+# The T-SQL behind the DNC, archive and call history routes. Every function borrows from the
+# pool it is given, so the same queries run against SQL Server in production and SQLite in tests.
+
+BULK_MAX_NUMBERS = 5000
+# SQL Server allows about 2100 parameters per statement
+BULK_LOOKUP_CHUNK = 1000
+
+def add_to_dnc(pool, number, added_by, source=None, voicemail_id=None, notes=None):
+	with pool.connection() as conn:
+		cursor = conn.cursor()
+		cursor.execute(
+			"""
+			INSERT INTO DNCSoftphone (PhoneNumber, DateAdded, AddedBy, Source, VoicemailId, Notes)
+			VALUES (%s, GETDATE(), %s, %s, %s, %s)
+			""",
+			(number, added_by, source, voicemail_id, notes)
+		)
+		conn.commit()
+
+def archive_number(pool, number, archived_by, reason=''):
+	with pool.connection() as conn:
+		cursor = conn.cursor()
+		cursor.execute(
+			"""
+			INSERT INTO ArchivedNumbers (PhoneNumber, ArchivedDate, ArchivedBy, Reason)
+			VALUES (%s, GETDATE(), %s, %s)
+			""",
+			(number, archived_by, reason)
+		)
+		conn.commit()
+
+def bulk_numbers(numbers):
+	# One {number, status} result per input entry. Numbers are compared by their digits, the way
+	# DncSet does, so "+1 (555) 010-0000" and "15550100000" in one request count once.
+	results = []
+	unique = []
+	seen = set()
+	for raw in numbers:
+		number = raw.strip() if isinstance(raw, str) else ''
+		key = normalize_number(number)
+		if key is None:
+			results.append({'number': raw, 'status': 'invalid'})
+		elif key in seen:
+			results.append({'number': number, 'status': 'duplicate'})
+		else:
+			seen.add(key)
+			unique.append(number)
+			results.append({'number': number, 'status': None})
+	return results, unique
+
+def _existing_numbers(cursor, table, numbers):
+	# UPDLOCK + HOLDLOCK keep the key ranges locked until commit, so no other request can insert
+	# one of these numbers between this check and our insert
+	found = set()
+	for i in range(0, len(numbers), BULK_LOOKUP_CHUNK):
+		chunk = numbers[i:i + BULK_LOOKUP_CHUNK]
+		cursor.execute(
+			f"SELECT PhoneNumber FROM {table} WITH (UPDLOCK, HOLDLOCK) WHERE PhoneNumber IN ({', '.join(['%s'] * len(chunk))})",
+			tuple(chunk)
+		)
+		found.update(row[0] for row in cursor.fetchall())
+	return found
+
+def _bulk_insert(pool, numbers, table, insert_sql, row):
+	# Checks which numbers exist, then inserts the rest with one executemany in the same transaction;
+	# the pool rolls the whole batch back if any row fails. Returns (results, added).
+	results, unique = bulk_numbers(numbers)
+	added = []
+	if unique:
+		with pool.connection() as conn:
+			cursor = conn.cursor()
+			existing = _existing_numbers(cursor, table, unique)
+			added = [number for number in unique if number not in existing]
+			if added:
+				cursor.executemany(insert_sql, [row(number) for number in added])
+			conn.commit()
+	added_set = set(added)
+	for result in results:
+		if result['status'] is None:
+			result['status'] = 'added' if result['number'] in added_set else 'exists'
+	return results, added
+
+def add_many_to_dnc(pool, numbers, added_by, notes=''):
+	return _bulk_insert(
+		pool,
+		numbers,
+		'DNCSoftphone',
+		"""
+		INSERT INTO DNCSoftphone (PhoneNumber, DateAdded, AddedBy, Source, Notes)
+		VALUES (%s, GETDATE(), %s, %s, %s)
+		""",
+		lambda number: (number, added_by, 'VOICEMAIL_SYSTEM', notes)
+	)
+
+def archive_numbers(pool, numbers, archived_by, reason=''):
+	return _bulk_insert(
+		pool,
+		numbers,
+		'ArchivedNumbers',
+		"""
+		INSERT INTO ArchivedNumbers (PhoneNumber, ArchivedDate, ArchivedBy, Reason)
+		VALUES (%s, GETDATE(), %s, %s)
+		""",
+		lambda number: (number, archived_by, reason)
+	)
+
+def is_dnc(pool, number):
+	with pool.connection() as conn:
+		cursor = conn.cursor()
+		cursor.execute("SELECT TOP 1 1 FROM DNCSoftphone WHERE PhoneNumber = %s", (number,))
+		return cursor.fetchone() is not None
+
+def is_archived(pool, number):
+	with pool.connection() as conn:
+		cursor = conn.cursor()
+		cursor.execute("SELECT TOP 1 1 FROM ArchivedNumbers WHERE PhoneNumber = %s", (number,))
+		return cursor.fetchone() is not None
+
+def call_history(pool, number, limit=10):
+	with pool.connection() as conn:
+		cursor = conn.cursor()
+		cursor.execute(
+			f"""
+			SELECT TOP {int(limit)} CallDate, CallType, Duration, Result
+			FROM CallHistory
+			WHERE PhoneNumber = %s
+			ORDER BY CallDate DESC
+			""",
+			(number,)
+		)
+		return [
+			{'date': row[0].isoformat(), 'type': row[1], 'duration': row[2], 'result': row[3]}
+			for row in cursor.fetchall()
+		]
@@ -1,122 +1,150 @@
-#!/usr/bin/env python3
-import sys
-import os
-import json
-import shutil
-from datetime import datetime
-import requests
-from google.cloud import speech
-from google.cloud import storage
-
-def process_voicemail(voicemail_id, caller_number, did):
-	# Get absolute paths
-	base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-	voicemail_dir = os.path.join(base_dir, 'voicemails')
-	projects_file = os.path.join(base_dir, 'projects.json')
-	
-	recording_file = os.path.join("/var/spool/asterisk/voicemail", f"{voicemail_id}.wav")
-	dest_path = os.path.join(voicemail_dir, f"{voicemail_id}.wav")
-	
-	# Create voicemail directory if it doesn't exist
-	os.makedirs(voicemail_dir, exist_ok=True)
-	
-	# Move recording to application storage
-	shutil.move(recording_file, dest_path)
-	
-	# Get audio duration
-	duration = get_audio_duration(dest_path)
-	
-	# Transcribe voicemail
-	transcription = transcribe_audio(dest_path)
-	
-	# Create voicemail metadata
-	metadata = {
-		'id': voicemail_id,
-		'caller': caller_number,
-		'did': did,
-		'timestamp': datetime.now().isoformat(),
-		'duration': duration,
-		'transcription': transcription,
-		'audioUrl': dest_path,
-		'isNew': True,
-		'isCatchAll': did == 'catch-all'
-	}
-	
-	# Save metadata
-	save_metadata(metadata, voicemail_dir)
-	
-	# If this is a catch-all voicemail, add it to the catch-all project
-	if did == 'catch-all':
-		add_to_catch_all_project(metadata, projects_file)
-	
-	# Send notifications
-	send_notifications(metadata)
-
-def add_to_catch_all_project(metadata, projects_file):
-	try:
-		with open(projects_file, 'r') as f:
-			projects = json.load(f)
-	except FileNotFoundError:
-		projects = []
-	
-	# Find or create catch-all project
-	catch_all_project = next(
-		(p for p in projects if p.get('isCatchAll', False)),
-		None
-	)
-	
-	if not catch_all_project:
-		catch_all_project = {
-			'id': 'catch-all',
-			'name': 'General Voicemail Box',
-			'description': 'Voicemails from unrecognized DIDs',
-			'isCatchAll': True,
-			'voicemails': []
-		}
-		projects.append(catch_all_project)
-	
-	# Add voicemail to project
-	catch_all_project['voicemails'].append(metadata)
-	
-	# Save updated projects
-	with open(projects_file, 'w') as f:
-		json.dump(projects, f)
-
-def get_audio_duration(file_path):
-	# Implementation to get audio duration
-	return "0:30"  # Placeholder
-
-def transcribe_audio(file_path):
-	client = speech.SpeechClient()
-	
-	with open(file_path, 'rb') as audio_file:
-		content = audio_file.read()
-	
-	audio = speech.RecognitionAudio(content=content)
-	config = speech.RecognitionConfig(
-		encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-		language_code="en-US"
-	)
-	
-	response = client.recognize(config=config, audio=audio)
-	return " ".join(result.alternatives[0].transcript for result in response.results)
-
-def save_metadata(metadata, voicemail_dir):
-	metadata_file = os.path.join(voicemail_dir, f"{metadata['id']}.json")
-	with open(metadata_file, 'w') as f:
-		json.dump(metadata, f)
-
-def send_notifications(metadata):
-	# Send email notification
-	email_data = {
-		'subject': f'New voicemail from {metadata["caller"]}',
-		'body': f'You have received a new voicemail.\n\nTranscription: {metadata["transcription"]}'
-	}
-	requests.post('http://localhost:5000/api/notifications/email', json=email_data)
-
-if __name__ == '__main__':
-	if len(sys.argv) != 4:
-		print("Usage: process_voicemail.py <voicemail_id> <caller_number> <did>")
-		sys.exit(1)
-	
+#!/usr/bin/env python3
+import sys
+import os
+import json
+import shutil
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import requests
+from google.cloud import storage
+from project_store import open_store
+from did_index import DID_INDEX_FILE, lookup_did
+from audio_store import compress_recording, TranscodeError, AUDIO_STORAGE
+from audio_probe import audio_duration
+from transcription import get_transcription_service
+from search_index import SearchIndex, SEARCH_DB
+
+@contextmanager
+def timed(timings, stage):
+	# Record how long each processing stage takes, in seconds
+	start = time.monotonic()
+	try:
+		yield
+	finally:
+		if timings is not None:
+			timings[stage] = round(time.monotonic() - start, 3)
+
+def process_voicemail(voicemail_id, caller_number, did, timings=None):
+	# Get absolute paths
+	base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	voicemail_dir = os.path.join(base_dir, 'voicemails')
+	
+	recording_file = os.path.join("/var/spool/asterisk/voicemail", f"{voicemail_id}.wav")
+	dest_path = os.path.join(voicemail_dir, f"{voicemail_id}.wav")
+	
+	# Create voicemail directory if it doesn't exist
+	os.makedirs(voicemail_dir, exist_ok=True)
+	
+	# Move recording to application storage; a retried job may have moved it already
+	with timed(timings, 'store'):
+		if os.path.exists(recording_file) or not os.path.exists(dest_path):
+			shutil.move(recording_file, dest_path)
+	
+	# Duration in seconds from the WAV header; None if the recording can't be probed
+	duration = audio_duration(dest_path)
+	
+	# Transcribe voicemail
+	with timed(timings, 'transcribe'):
+		transcription = transcribe_audio(dest_path)
+	
+	# Compress for storage; the WAV is kept for the grace period and serves as the fallback
+	audio_format = 'wav'
+	with timed(timings, 'compress'):
+		try:
+			if compress_recording(voicemail_dir, voicemail_id):
+				audio_format = AUDIO_STORAGE
+		except TranscodeError as e:
+			print(f"Could not compress {voicemail_id}, keeping WAV: {str(e)}")
+	
+	# Create voicemail metadata
+	metadata = {
+		'id': voicemail_id,
+		'caller': caller_number,
+		'did': did,
+		'timestamp': datetime.now().isoformat(),
+		'duration': duration,
+		'transcription': transcription,
+		'audioUrl': f"/api/voicemails/{voicemail_id}/audio",
+		'audioFormat': audio_format,
+		'isNew': True,
+		'isCatchAll': did == 'catch-all'
+	}
+	
+	# Save metadata
+	with timed(timings, 'metadata'):
+		save_metadata(metadata, voicemail_dir)
+	
+		# If this is a catch-all voicemail, add it to the catch-all project
+		if did == 'catch-all':
+			project_id = add_to_catch_all_project(metadata, base_dir)
+		else:
+			project_id = add_to_did_project(metadata, base_dir)
+	
+	# Make the transcription searchable; a retried job re-indexes the same row
+	if project_id is not None:
+		with timed(timings, 'index'):
+			index = SearchIndex(os.path.join(base_dir, SEARCH_DB))
+			try:
+				index.add(project_id, metadata)
+			finally:
+				index.close()
+	
+	# Send notifications
+	with timed(timings, 'notify'):
+		send_notifications(metadata)
+
+def add_to_catch_all_project(metadata, base_dir):
+	# Go through the project store so this process never overwrites the API server's writes
+	store = open_store(base_dir=base_dir)
+	try:
+		# Find or create catch-all project
+		store.ensure_project({
+			'id': 'catch-all',
+			'name': 'General Voicemail Box',
+			'description': 'Voicemails from unrecognized DIDs',
+			'isCatchAll': True,
+			'voicemails': []
+		})
+		
+		# Add voicemail to project; retried jobs don't add it twice
+		store.add_voicemail('catch-all', metadata)
+	finally:
+		store.close()
+	return 'catch-all'
+
+def add_to_did_project(metadata, base_dir):
+	# Index the voicemail under the project that owns the DID so listings never scan files
+	route = lookup_did(os.path.join(base_dir, DID_INDEX_FILE), metadata['did'])
+	if not route or route[0] is None:
+		return None
+	store = open_store(base_dir=base_dir)
+	try:
+		store.add_voicemail(route[0], metadata)
+	finally:
+		store.close()
+	return route[0]
+
+def transcribe_audio(file_path):
+	# TRANSCRIPTION_BACKEND picks the engine; timeouts and a full transcription queue raise so the job is retried later
+	return get_transcription_service(os.path.dirname(file_path)).transcribe(file_path)
+
+def save_metadata(metadata, voicemail_dir):
+	metadata_file = os.path.join(voicemail_dir, f"{metadata['id']}.json")
+	with open(metadata_file, 'w') as f:
+		json.dump(metadata, f)
+
+def send_notifications(metadata):
+	# Send email notification
+	email_data = {
+		'subject': f'New voicemail from {metadata["caller"]}',
+		'body': f'You have received a new voicemail.\n\nTranscription: {metadata["transcription"]}'
+	}
+	requests.post('http://localhost:5000/api/notifications/email', json=email_data, timeout=10)
+
+if __name__ == '__main__':
+	if len(sys.argv) != 4:
+		print("Usage: process_voicemail.py <voicemail_id> <caller_number> <did>")
+		sys.exit(1)
+	
 	process_voicemail(sys.argv[1], sys.argv[2], sys.argv[3])
\ No newline at end of file
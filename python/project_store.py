@@ -0,0 +1,832 @@
+#!/usr/bin/env python3
+import os
+import sys
+import glob
+import json
+import base64
+import bisect
+import time
+import stat
+import fcntl
+import sqlite3
+import uuid
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+PROJECTS_FILE = "projects.json"
+PROJECTS_DB = "projects.db"
+STORAGE_BACKEND = os.environ.get('VOICEMAIL_STORAGE', 'json')
+
+# Per-project lists that are stored as their own entities
+COLLECTIONS = ('dids', 'archivedDids', 'voicemails', 'notes')
+# Orders list_voicemails can page through
+VOICEMAIL_SORTS = ('timestamp', 'duration')
+# How many change log rows to keep for readers catching up
+CHANGE_LOG_SIZE = 10000
+# projects.json's change log is started over once it grows past this
+CHANGE_LOG_BYTES = 4 * 1024 * 1024
+
+def did_number(did):
+	# DIDs are stored either as bare numbers or as objects with a number
+	return did['number'] if isinstance(did, dict) else did
+
+def duration_seconds(voicemail):
+	# Older voicemails carry a placeholder string like "0:30"; those count as unknown
+	duration = voicemail.get('duration')
+	if isinstance(duration, bool) or not isinstance(duration, (int, float)):
+		return None
+	return duration
+
+def format_duration(voicemail):
+	# m:ss, as formatDuration in js/format.js shows it
+	seconds = duration_seconds(voicemail)
+	if seconds is None:
+		return voicemail.get('duration') or 'unknown'
+	seconds = round(seconds)
+	return f"{seconds // 60}:{seconds % 60:02d}"
+
+def sort_value(voicemail, sort='timestamp'):
+	if sort == 'duration':
+		return duration_seconds(voicemail) or 0
+	return voicemail.get('timestamp') or ''
+
+def encode_cursor(voicemail, sort='timestamp'):
+	key = json.dumps([sort_value(voicemail, sort), voicemail['id']])
+	return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_cursor(cursor):
+	try:
+		timestamp, voicemail_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+	except (ValueError, TypeError):
+		raise ValueError("Invalid cursor")
+	return timestamp, voicemail_id
+
+def open_store(backend=None, base_dir=''):
+	backend = backend or STORAGE_BACKEND
+	if backend == 'sqlite':
+		return SqliteProjectStore(os.path.join(base_dir, PROJECTS_DB))
+	if backend == 'json':
+		return JsonProjectStore(os.path.join(base_dir, PROJECTS_FILE))
+	raise ValueError(f"Unknown storage backend: {backend}")
+
+class ProjectStore(ABC):
+	@abstractmethod
+	def load_projects(self):
+		pass
+
+	@abstractmethod
+	def save_projects(self, projects):
+		pass
+
+	@abstractmethod
+	def add_project(self, project):
+		pass
+
+	@abstractmethod
+	def save_project(self, project, replace=()):
+		# Persist the project's own fields, plus any collections named in replace
+		pass
+
+	@abstractmethod
+	def delete_project(self, project_id):
+		pass
+
+	def add_did(self, project_id, did):
+		self.add_dids(project_id, [did])
+
+	@abstractmethod
+	def add_dids(self, project_id, dids):
+		pass
+
+	@abstractmethod
+	def remove_did(self, project_id, number):
+		pass
+
+	@abstractmethod
+	def archive_did(self, project_id, did):
+		pass
+
+	@abstractmethod
+	def add_note(self, project_id, note):
+		pass
+
+	@abstractmethod
+	def delete_note(self, project_id, note_id):
+		pass
+
+	@abstractmethod
+	def add_voicemail(self, project_id, voicemail):
+		pass
+
+	@abstractmethod
+	def update_voicemails(self, updates):
+		# updates maps voicemail id to the fields to merge into it
+		pass
+
+	@abstractmethod
+	def delete_voicemails(self, voicemail_ids):
+		pass
+
+	def load_project(self, project_id):
+		return next((p for p in self.load_projects() if p.get('id') == project_id), None)
+
+	def get_voicemail(self, voicemail_id):
+		for project in self.load_projects():
+			for voicemail in project.get('voicemails', []):
+				if voicemail['id'] == voicemail_id:
+					return dict(voicemail, projectId=project.get('id'))
+		return None
+
+	def get_voicemails(self, voicemail_ids):
+		# Returns {id: voicemail} for the ids that exist
+		wanted = set(voicemail_ids)
+		return {
+			vm['id']: dict(vm, projectId=project.get('id'))
+			for project in self.load_projects() for vm in project.get('voicemails', []) if vm['id'] in wanted
+		}
+
+	def _sorted_voicemails(self, sort):
+		# Every voicemail with its projectId, ascending by (sort value, id), plus the matching sort keys
+		voicemails = [
+			dict(voicemail, projectId=project.get('id'))
+			for project in self.load_projects() for voicemail in project.get('voicemails', [])
+		]
+		voicemails.sort(key=lambda vm: (sort_value(vm, sort), vm['id']))
+		return voicemails, [(sort_value(vm, sort), vm['id']) for vm in voicemails]
+
+	def list_voicemails(self, filters=None, limit=50, cursor=None, descending=True, sort='timestamp'):
+		# Returns (voicemails, next_cursor), newest (or longest) first unless descending is False.
+		# Filters: project_id, did, caller, since, until, is_new. Sort: timestamp or duration.
+		if sort not in VOICEMAIL_SORTS:
+			raise ValueError(f"Invalid sort: {sort}")
+		filters = filters or {}
+
+		def matches(vm):
+			timestamp = vm.get('timestamp') or ''
+			return (
+				filters.get('project_id') in (None, vm['projectId']) and
+				filters.get('did') in (None, vm.get('did')) and
+				filters.get('caller') in (None, vm.get('caller')) and
+				filters.get('is_new') in (None, bool(vm.get('isNew'))) and
+				(filters.get('since') is None or timestamp >= filters['since']) and
+				(filters.get('until') is None or timestamp < filters['until'])
+			)
+
+		voicemails, keys = self._sorted_voicemails(sort)
+		# Start from the cursor's position and stop once a page (plus one to tell if there's more) matched
+		position = tuple(decode_cursor(cursor)) if cursor else None
+		if descending:
+			end = bisect.bisect_left(keys, position) if position else len(keys)
+			indexes = range(end - 1, -1, -1)
+		else:
+			indexes = range(bisect.bisect_right(keys, position) if position else 0, len(keys))
+		page = []
+		for i in indexes:
+			if matches(voicemails[i]):
+				page.append(dict(voicemails[i]))
+				if len(page) > limit:
+					break
+		return page[:limit], (encode_cursor(page[limit - 1], sort) if len(page) > limit else None)
+
+	@abstractmethod
+	def ensure_project(self, project):
+		# Create the project unless one with the same id already exists
+		pass
+
+	@abstractmethod
+	def change_cursor(self):
+		pass
+
+	@abstractmethod
+	def changes_since(self, cursor):
+		# Returns (changes, new_cursor); a change with op 'reload' means reload everything
+		pass
+
+	def prune_changes(self, keep=None):
+		pass
+
+	def close(self):
+		pass
+
+class JsonProjectStore(ProjectStore):
+	# Legacy single-file storage; every write rewrites the whole file under an exclusive lock
+	def __init__(self, path=PROJECTS_FILE):
+		self.path = path
+		self.lock_path = f"{path}.lock"
+		# Append-only NDJSON change log shared by every process writing the file. The first line names
+		# the log's generation; cursors are (generation, byte offset).
+		self.changes_path = f"{path}.changes"
+		# sort -> (file identity, sorted voicemails, sort keys), so paging doesn't re-read and re-sort the file
+		self._voicemail_cache = {}
+
+	@contextmanager
+	def _locked(self):
+		# flock serializes writers across processes (server, queue workers, migrations)
+		with open(self.lock_path, 'a') as lock_file:
+			fcntl.flock(lock_file, fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+	def _identity(self):
+		try:
+			st = os.stat(self.path)
+		except FileNotFoundError:
+			return None
+		return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+	def load_projects(self):
+		if os.path.exists(self.path):
+			with open(self.path, 'r') as f:
+				return json.load(f)
+		return []
+
+	def _sorted_voicemails(self, sort):
+		identity = self._identity()
+		cached = self._voicemail_cache.get(sort)
+		if cached is None or cached[0] != identity:
+			cached = (identity,) + super()._sorted_voicemails(sort)
+			self._voicemail_cache[sort] = cached
+		return cached[1], cached[2]
+
+	def _write(self, projects):
+		# Caller holds the lock
+		directory = os.path.dirname(os.path.abspath(self.path))
+		fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.projects-', suffix='.tmp')
+		with os.fdopen(fd, 'w') as f:
+			json.dump(projects, f)
+			f.flush()
+			os.fsync(f.fileno())
+		mode = stat.S_IMODE(os.stat(self.path).st_mode) if os.path.exists(self.path) else 0o644
+		os.chmod(tmp_path, mode)
+		try:
+			os.replace(tmp_path, self.path)
+		except OSError:
+			# A single-file bind mount can't be renamed over; fall back to writing in place
+			os.remove(tmp_path)
+			with open(self.path, 'w') as f:
+				json.dump(projects, f)
+
+	def _log(self, *changes):
+		# Caller holds the lock. Each change is (project_id, entity, entity_id, op).
+		if not changes:
+			return
+		try:
+			size = os.path.getsize(self.changes_path)
+		except FileNotFoundError:
+			size = 0
+		if size == 0 or size > CHANGE_LOG_BYTES:
+			# Start a new generation; readers holding a cursor into the old one reload
+			directory = os.path.dirname(os.path.abspath(self.changes_path))
+			fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.changes-', suffix='.tmp')
+			with os.fdopen(fd, 'w') as f:
+				f.write(json.dumps({'generation': uuid.uuid4().hex}) + '\n')
+			os.replace(tmp_path, self.changes_path)
+		lines = ''.join(json.dumps({
+			'project_id': project_id, 'entity': entity, 'entity_id': entity_id, 'op': op, 'origin': os.getpid()
+		}) + '\n' for project_id, entity, entity_id, op in changes)
+		with open(self.changes_path, 'a') as f:
+			f.write(lines)
+
+	def save_projects(self, projects):
+		with self._locked():
+			self._write(projects)
+			self._log((None, 'project', None, 'reload'))
+
+	def _update(self, project_id, apply, entity, entity_id, op):
+		with self._locked():
+			projects = self.load_projects()
+			project = next((p for p in projects if p.get('id') == project_id), None)
+			if project is not None:
+				apply(project)
+				self._write(projects)
+				self._log((project_id, entity, entity_id, op))
+
+	def add_project(self, project):
+		with self._locked():
+			projects = self.load_projects()
+			projects.append(project)
+			self._write(projects)
+			self._log((project['id'], 'project', project['id'], 'create'))
+
+	def ensure_project(self, project):
+		with self._locked():
+			projects = self.load_projects()
+			if not any(p.get('id') == project['id'] for p in projects):
+				projects.append(project)
+				self._write(projects)
+				self._log((project['id'], 'project', project['id'], 'create'))
+
+	def save_project(self, project, replace=()):
+		def apply(stored):
+			for key, value in project.items():
+				if key not in COLLECTIONS or key in replace:
+					stored[key] = value
+		self._update(project['id'], apply, 'project', project['id'], 'update')
+
+	def delete_project(self, project_id):
+		with self._locked():
+			projects = self.load_projects()
+			self._write([p for p in projects if p.get('id') != project_id])
+			self._log((project_id, 'project', project_id, 'delete'))
+
+	def add_dids(self, project_id, dids):
+		self._update(project_id, lambda p: p.setdefault('dids', []).extend(dids), 'did', None, 'create')
+
+	def remove_did(self, project_id, number):
+		def apply(project):
+			project['dids'] = [d for d in project.get('dids', []) if did_number(d) != number]
+		self._update(project_id, apply, 'did', number, 'delete')
+
+	def archive_did(self, project_id, did):
+		def apply(project):
+			number = did_number(did)
+			project['dids'] = [d for d in project.get('dids', []) if did_number(d) != number]
+			project.setdefault('archivedDids', []).append(did)
+		self._update(project_id, apply, 'did', did_number(did), 'archive')
+
+	def add_note(self, project_id, note):
+		self._update(project_id, lambda p: p.setdefault('notes', []).append(note), 'note', note['id'], 'create')
+
+	def delete_note(self, project_id, note_id):
+		def apply(project):
+			project['notes'] = [n for n in project.get('notes', []) if n['id'] != note_id]
+		self._update(project_id, apply, 'note', note_id, 'delete')
+
+	def add_voicemail(self, project_id, voicemail):
+		def apply(project):
+			voicemails = project.setdefault('voicemails', [])
+			if not any(vm['id'] == voicemail['id'] for vm in voicemails):
+				voicemails.append(voicemail)
+		self._update(project_id, apply, 'voicemail', voicemail['id'], 'create')
+
+	def update_voicemails(self, updates):
+		with self._locked():
+			projects = self.load_projects()
+			updated = []
+			for project in projects:
+				for voicemail in project.get('voicemails', []):
+					if voicemail['id'] in updates:
+						voicemail.update(updates[voicemail['id']])
+						updated.append((project['id'], voicemail['id']))
+			self._write(projects)
+			self._log(*[(project_id, 'voicemail', voicemail_id, 'update') for project_id, voicemail_id in updated])
+
+	def delete_voicemails(self, voicemail_ids):
+		wanted = set(voicemail_ids)
+		with self._locked():
+			projects = self.load_projects()
+			removed = []
+			for project in projects:
+				voicemails = project.get('voicemails', [])
+				project['voicemails'] = [vm for vm in voicemails if vm['id'] not in wanted]
+				removed += [(project['id'], vm['id']) for vm in voicemails if vm['id'] in wanted]
+			if removed:
+				self._write(projects)
+			self._log(*[(project_id, 'voicemail', voicemail_id, 'delete') for project_id, voicemail_id in removed])
+
+	def _open_changes(self):
+		# Returns (file, generation) positioned after the header, or (None, None) before the first write
+		try:
+			f = open(self.changes_path, 'rb')
+		except FileNotFoundError:
+			return None, None
+		try:
+			return f, json.loads(f.readline())['generation']
+		except (ValueError, KeyError, TypeError):
+			f.close()
+			return None, None
+
+	def change_cursor(self):
+		f, generation = self._open_changes()
+		if f is None:
+			return (None, 0)
+		with f:
+			# Stop at the last complete line; a writer may be appending right now
+			header_end = f.tell()
+			pos = f.seek(0, os.SEEK_END)
+			while pos > header_end:
+				start = max(header_end, pos - 4096)
+				f.seek(start)
+				newline = f.read(pos - start).rfind(b'\n')
+				if newline >= 0:
+					return (generation, start + newline + 1)
+				pos = start
+			return (generation, header_end)
+
+	def changes_since(self, cursor):
+		# Tails the change log from the cursor; a log that was started over means a full reload
+		generation, offset = cursor
+		f, current = self._open_changes()
+		if f is None:
+			return ([{'op': 'reload'}] if generation is not None else []), (None, 0)
+		with f:
+			if generation is None:
+				offset = f.tell()
+			elif generation != current:
+				return [{'op': 'reload'}], self.change_cursor()
+			f.seek(offset)
+			data = f.read()
+		end = data.rfind(b'\n') + 1
+		changes = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+		return changes, (current, offset + end)
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+	[
+		"""CREATE TABLE projects (
+			id TEXT PRIMARY KEY,
+			data TEXT NOT NULL
+		)""",
+		"""CREATE TABLE dids (
+			project_id TEXT NOT NULL,
+			number TEXT NOT NULL,
+			data TEXT NOT NULL
+		)""",
+		"CREATE INDEX dids_project ON dids (project_id)",
+		"CREATE INDEX dids_number ON dids (number)",
+		"""CREATE TABLE archived_dids (
+			project_id TEXT NOT NULL,
+			number TEXT NOT NULL,
+			data TEXT NOT NULL
+		)""",
+		"CREATE INDEX archived_dids_project ON archived_dids (project_id)",
+		"""CREATE TABLE voicemails (
+			id TEXT PRIMARY KEY,
+			project_id TEXT,
+			timestamp TEXT,
+			data TEXT NOT NULL
+		)""",
+		"CREATE INDEX voicemails_project ON voicemails (project_id)",
+		"""CREATE TABLE notes (
+			id TEXT PRIMARY KEY,
+			project_id TEXT NOT NULL,
+			data TEXT NOT NULL
+		)""",
+		"CREATE INDEX notes_project ON notes (project_id)",
+	],
+	[
+		"""CREATE TABLE changes (
+			seq INTEGER PRIMARY KEY AUTOINCREMENT,
+			project_id TEXT,
+			entity TEXT NOT NULL,
+			entity_id TEXT,
+			op TEXT NOT NULL,
+			origin INTEGER NOT NULL,
+			at REAL NOT NULL
+		)""",
+	],
+	[
+		"ALTER TABLE voicemails ADD COLUMN did TEXT",
+		"ALTER TABLE voicemails ADD COLUMN caller TEXT",
+		"ALTER TABLE voicemails ADD COLUMN is_new INTEGER NOT NULL DEFAULT 0",
+		"""UPDATE voicemails SET
+			did = json_extract(data, '$.did'),
+			caller = json_extract(data, '$.caller'),
+			is_new = COALESCE(json_extract(data, '$.isNew'), 0)""",
+		"CREATE INDEX voicemails_timestamp ON voicemails (timestamp, id)",
+		"CREATE INDEX voicemails_project_timestamp ON voicemails (project_id, timestamp, id)",
+		"CREATE INDEX voicemails_did_timestamp ON voicemails (did, timestamp, id)",
+		"CREATE INDEX voicemails_caller_timestamp ON voicemails (caller, timestamp, id)",
+	],
+	[
+		# Seconds; 0 until the duration has been probed
+		"ALTER TABLE voicemails ADD COLUMN duration REAL NOT NULL DEFAULT 0",
+		"""UPDATE voicemails SET duration = json_extract(data, '$.duration')
+			WHERE json_type(data, '$.duration') IN ('integer', 'real')""",
+		"CREATE INDEX voicemails_duration ON voicemails (duration, id)",
+	],
+]
+
+class SqliteProjectStore(ProjectStore):
+	# One row per project, DID, voicemail and note so a write only touches its own row
+	def __init__(self, path=PROJECTS_DB):
+		self.path = path
+		self._local = threading.local()
+		self._migrate()
+
+	def _connect(self):
+		conn = getattr(self._local, 'conn', None)
+		if conn is None:
+			conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("PRAGMA synchronous=NORMAL")
+			self._local.conn = conn
+		return conn
+
+	@contextmanager
+	def _transaction(self):
+		conn = self._connect()
+		conn.execute("BEGIN IMMEDIATE")
+		try:
+			yield conn
+		except BaseException:
+			# Includes KeyboardInterrupt, so an interrupted write never leaves the transaction open
+			conn.execute("ROLLBACK")
+			raise
+		conn.execute("COMMIT")
+
+	def _migrate(self):
+		with self._transaction() as conn:
+			version = conn.execute("PRAGMA user_version").fetchone()[0]
+			for statements in MIGRATIONS[version:]:
+				for statement in statements:
+					conn.execute(statement)
+			conn.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+
+	def close(self):
+		conn = getattr(self._local, 'conn', None)
+		if conn is not None:
+			conn.close()
+			self._local.conn = None
+
+	def _rows(self, conn, table, order='rowid'):
+		grouped = {}
+		for project_id, data in conn.execute(f"SELECT project_id, data FROM {table} ORDER BY {order}"):
+			grouped.setdefault(project_id, []).append(json.loads(data))
+		return grouped
+
+	def load_projects(self):
+		conn = self._connect()
+		collections = {
+			'dids': self._rows(conn, 'dids'),
+			'archivedDids': self._rows(conn, 'archived_dids'),
+			'voicemails': self._rows(conn, 'voicemails'),
+			'notes': self._rows(conn, 'notes'),
+		}
+		projects = []
+		for project_id, data in conn.execute("SELECT id, data FROM projects ORDER BY rowid"):
+			project = json.loads(data)
+			for key, grouped in collections.items():
+				project[key] = grouped.get(project_id, [])
+			projects.append(project)
+		return projects
+
+	def save_projects(self, projects):
+		with self._transaction() as conn:
+			for table in ('projects', 'dids', 'archived_dids', 'voicemails', 'notes'):
+				conn.execute(f"DELETE FROM {table}")
+			for project in projects:
+				self._insert_project(conn, project)
+			self._log(conn, None, 'project', None, 'reload')
+
+	def _insert_project(self, conn, project):
+		conn.execute(
+			"INSERT INTO projects (id, data) VALUES (?, ?)",
+			(project['id'], self._project_data(project))
+		)
+		for key in COLLECTIONS:
+			self._insert_collection(conn, key, project['id'], project.get(key, []))
+
+	def _project_data(self, project):
+		return json.dumps({k: v for k, v in project.items() if k not in COLLECTIONS})
+
+	def _insert_collection(self, conn, key, project_id, items):
+		if key == 'dids':
+			conn.executemany(
+				"INSERT INTO dids (project_id, number, data) VALUES (?, ?, ?)",
+				[(project_id, did_number(d), json.dumps(d)) for d in items]
+			)
+		elif key == 'archivedDids':
+			conn.executemany(
+				"INSERT INTO archived_dids (project_id, number, data) VALUES (?, ?, ?)",
+				[(project_id, did_number(d), json.dumps(d)) for d in items]
+			)
+		elif key == 'voicemails':
+			for voicemail in items:
+				self._insert_voicemail(conn, project_id, voicemail)
+		elif key == 'notes':
+			conn.executemany(
+				"INSERT OR REPLACE INTO notes (id, project_id, data) VALUES (?, ?, ?)",
+				[(n['id'], project_id, json.dumps(n)) for n in items]
+			)
+
+	def _voicemail_columns(self, voicemail):
+		return (
+			voicemail.get('timestamp') or '', voicemail.get('did'), voicemail.get('caller'),
+			1 if voicemail.get('isNew') else 0, duration_seconds(voicemail) or 0, json.dumps(voicemail)
+		)
+
+	def _insert_voicemail(self, conn, project_id, voicemail):
+		conn.execute(
+			"""INSERT OR REPLACE INTO voicemails (id, project_id, timestamp, did, caller, is_new, duration, data)
+			VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+			(voicemail['id'], project_id) + self._voicemail_columns(voicemail)
+		)
+
+	def _log(self, conn, project_id, entity, entity_id, op):
+		conn.execute(
+			"INSERT INTO changes (project_id, entity, entity_id, op, origin, at) VALUES (?, ?, ?, ?, ?, ?)",
+			(project_id, entity, entity_id, op, os.getpid(), time.time())
+		)
+
+	def load_project(self, project_id):
+		conn = self._connect()
+		row = conn.execute("SELECT data FROM projects WHERE id = ?", (project_id,)).fetchone()
+		if row is None:
+			return None
+		project = json.loads(row[0])
+		for key, table in (('dids', 'dids'), ('archivedDids', 'archived_dids'), ('voicemails', 'voicemails'), ('notes', 'notes')):
+			rows = conn.execute(f"SELECT data FROM {table} WHERE project_id = ? ORDER BY rowid", (project_id,))
+			project[key] = [json.loads(data) for data, in rows]
+		return project
+
+	def add_project(self, project):
+		with self._transaction() as conn:
+			self._insert_project(conn, project)
+			self._log(conn, project['id'], 'project', project['id'], 'create')
+
+	def ensure_project(self, project):
+		with self._transaction() as conn:
+			if conn.execute("SELECT 1 FROM projects WHERE id = ?", (project['id'],)).fetchone() is None:
+				self._insert_project(conn, project)
+				self._log(conn, project['id'], 'project', project['id'], 'create')
+
+	def save_project(self, project, replace=()):
+		table_for = {'dids': 'dids', 'archivedDids': 'archived_dids', 'voicemails': 'voicemails', 'notes': 'notes'}
+		with self._transaction() as conn:
+			conn.execute(
+				"INSERT INTO projects (id, data) VALUES (?, ?) ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+				(project['id'], self._project_data(project))
+			)
+			for key in replace:
+				if key in table_for:
+					conn.execute(f"DELETE FROM {table_for[key]} WHERE project_id = ?", (project['id'],))
+					self._insert_collection(conn, key, project['id'], project.get(key, []))
+			self._log(conn, project['id'], 'project', project['id'], 'update')
+
+	def delete_project(self, project_id):
+		with self._transaction() as conn:
+			conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+			for table in ('dids', 'archived_dids', 'voicemails', 'notes'):
+				conn.execute(f"DELETE FROM {table} WHERE project_id = ?", (project_id,))
+			self._log(conn, project_id, 'project', project_id, 'delete')
+
+	def add_dids(self, project_id, dids):
+		with self._transaction() as conn:
+			self._insert_collection(conn, 'dids', project_id, dids)
+			self._log(conn, project_id, 'did', None, 'create')
+
+	def remove_did(self, project_id, number):
+		with self._transaction() as conn:
+			conn.execute("DELETE FROM dids WHERE project_id = ? AND number = ?", (project_id, number))
+			self._log(conn, project_id, 'did', number, 'delete')
+
+	def archive_did(self, project_id, did):
+		with self._transaction() as conn:
+			conn.execute("DELETE FROM dids WHERE project_id = ? AND number = ?", (project_id, did_number(did)))
+			self._insert_collection(conn, 'archivedDids', project_id, [did])
+			self._log(conn, project_id, 'did', did_number(did), 'archive')
+
+	def add_note(self, project_id, note):
+		with self._transaction() as conn:
+			self._insert_collection(conn, 'notes', project_id, [note])
+			self._log(conn, project_id, 'note', note['id'], 'create')
+
+	def delete_note(self, project_id, note_id):
+		with self._transaction() as conn:
+			conn.execute("DELETE FROM notes WHERE id = ? AND project_id = ?", (note_id, project_id))
+			self._log(conn, project_id, 'note', note_id, 'delete')
+
+	def add_voicemail(self, project_id, voicemail):
+		with self._transaction() as conn:
+			self._insert_voicemail(conn, project_id, voicemail)
+			self._log(conn, project_id, 'voicemail', voicemail['id'], 'create')
+
+	def update_voicemails(self, updates):
+		# UPDATE in place rather than INSERT OR REPLACE, which would move the row to the end of its project
+		with self._transaction() as conn:
+			for voicemail_id, fields in updates.items():
+				row = conn.execute("SELECT project_id, data FROM voicemails WHERE id = ?", (voicemail_id,)).fetchone()
+				if row is None:
+					continue
+				voicemail = dict(json.loads(row[1]), **fields)
+				conn.execute(
+					"UPDATE voicemails SET timestamp = ?, did = ?, caller = ?, is_new = ?, duration = ?, data = ? WHERE id = ?",
+					self._voicemail_columns(voicemail) + (voicemail_id,)
+				)
+				self._log(conn, row[0], 'voicemail', voicemail_id, 'update')
+
+	def delete_voicemails(self, voicemail_ids):
+		with self._transaction() as conn:
+			for voicemail_id in voicemail_ids:
+				row = conn.execute("SELECT project_id FROM voicemails WHERE id = ?", (voicemail_id,)).fetchone()
+				if row is None:
+					continue
+				conn.execute("DELETE FROM voicemails WHERE id = ?", (voicemail_id,))
+				self._log(conn, row[0], 'voicemail', voicemail_id, 'delete')
+
+	def get_voicemail(self, voicemail_id):
+		row = self._connect().execute("SELECT project_id, data FROM voicemails WHERE id = ?", (voicemail_id,)).fetchone()
+		return dict(json.loads(row[1]), projectId=row[0]) if row else None
+
+	def get_voicemails(self, voicemail_ids):
+		voicemail_ids = list(voicemail_ids)
+		if not voicemail_ids:
+			return {}
+		rows = self._connect().execute(
+			f"SELECT project_id, data FROM voicemails WHERE id IN ({', '.join('?' * len(voicemail_ids))})",
+			voicemail_ids
+		).fetchall()
+		return {vm['id']: dict(vm, projectId=project_id) for project_id, vm in ((p, json.loads(d)) for p, d in rows)}
+
+	def list_voicemails(self, filters=None, limit=50, cursor=None, descending=True, sort='timestamp'):
+		# Keyset pagination over the (column, timestamp, id) and (duration, id) indexes; cost is independent of offset
+		if sort not in VOICEMAIL_SORTS:
+			raise ValueError(f"Invalid sort: {sort}")
+		filters = filters or {}
+		clauses, params = [], []
+		for key, column in (('project_id', 'project_id'), ('did', 'did'), ('caller', 'caller')):
+			if filters.get(key) is not None:
+				clauses.append(f"{column} = ?")
+				params.append(filters[key])
+		if filters.get('is_new') is not None:
+			clauses.append("is_new = ?")
+			params.append(1 if filters['is_new'] else 0)
+		if filters.get('since') is not None:
+			clauses.append("timestamp >= ?")
+			params.append(filters['since'])
+		if filters.get('until') is not None:
+			clauses.append("timestamp < ?")
+			params.append(filters['until'])
+		if cursor:
+			clauses.append(f"({sort}, id) < (?, ?)" if descending else f"({sort}, id) > (?, ?)")
+			params.extend(decode_cursor(cursor))
+
+		direction = 'DESC' if descending else 'ASC'
+		where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+		rows = self._connect().execute(
+			f"SELECT project_id, data FROM voicemails {where} ORDER BY {sort} {direction}, id {direction} LIMIT ?",
+			params + [limit + 1]
+		).fetchall()
+
+		page = [dict(json.loads(data), projectId=project_id) for project_id, data in rows[:limit]]
+		return page, (encode_cursor(page[-1], sort) if len(rows) > limit else None)
+
+	def change_cursor(self):
+		return self._connect().execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+	def changes_since(self, cursor):
+		rows = self._connect().execute(
+			"SELECT seq, project_id, entity, entity_id, op, origin FROM changes WHERE seq > ? ORDER BY seq",
+			(cursor,)
+		).fetchall()
+		changes = [
+			{'seq': seq, 'project_id': project_id, 'entity': entity, 'entity_id': entity_id, 'op': op, 'origin': origin}
+			for seq, project_id, entity, entity_id, op, origin in rows
+		]
+		return changes, (changes[-1]['seq'] if changes else cursor)
+
+	def prune_changes(self, keep=CHANGE_LOG_SIZE):
+		with self._transaction() as conn:
+			conn.execute("DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (keep,))
+
+def migrate_json_to_sqlite(json_path=PROJECTS_FILE, db_path=PROJECTS_DB):
+	projects = JsonProjectStore(json_path).load_projects()
+	store = SqliteProjectStore(db_path)
+	try:
+		store.save_projects(projects)
+	finally:
+		store.close()
+	counts = {'projects': len(projects)}
+	for key in COLLECTIONS:
+		counts[key] = sum(len(p.get(key, [])) for p in projects)
+	return counts
+
+def import_voicemail_metadata(store, voicemail_dir):
+	# One-off import of per-voicemail metadata files that were never added to a project
+	projects = store.load_projects()
+	known = {vm['id'] for p in projects for vm in p.get('voicemails', [])}
+	routes = {did_number(d): p['id'] for p in projects for d in p.get('dids', [])}
+	catch_all = next((p['id'] for p in projects if p.get('isCatchAll')), None)
+
+	imported = 0
+	for path in glob.glob(os.path.join(voicemail_dir, '*.json')):
+		with open(path, 'r') as f:
+			metadata = json.load(f)
+		if metadata.get('id') in known:
+			continue
+		project_id = catch_all if metadata.get('isCatchAll') else routes.get(metadata.get('did'))
+		if project_id is None:
+			continue
+		store.add_voicemail(project_id, metadata)
+		imported += 1
+	return imported
+
+if __name__ == '__main__':
+	command = sys.argv[1] if len(sys.argv) > 1 else ''
+	if command == 'migrate':
+		json_path = sys.argv[2] if len(sys.argv) > 2 else PROJECTS_FILE
+		db_path = sys.argv[3] if len(sys.argv) > 3 else PROJECTS_DB
+		counts = migrate_json_to_sqlite(json_path, db_path)
+		print(f"Migrated {json_path} to {db_path}: " + ", ".join(f"{v} {k}" for k, v in counts.items()))
+	elif command == 'import-voicemails':
+		voicemail_dir = sys.argv[2] if len(sys.argv) > 2 else 'voicemails'
+		imported = import_voicemail_metadata(open_store(), voicemail_dir)
+		print(f"Imported {imported} voicemails from {voicemail_dir}")
+	else:
+		print("Usage: project_store.py migrate [projects.json] [projects.db] | import-voicemails [voicemails_dir]")
+		sys.exit(1)
@@ -0,0 +1,71 @@
+import json
+import hashlib
+import threading
+from project_store import duration_seconds, COLLECTIONS
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def page_size(args):
+	# A missing limit gets the default; anything out of range is clamped, anything non-numeric is a ValueError
+	return max(1, min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+
+def paginate(items, args):
+	# Offset paging for small in-memory lists; the cursor is the next offset
+	offset = int(args.get('cursor') or 0)
+	if offset < 0:
+		raise ValueError("Invalid cursor")
+	limit = page_size(args)
+	page = items[offset:offset + limit]
+	next_cursor = str(offset + limit) if offset + limit < len(items) else None
+	return page, next_cursor
+
+def project_summary(project):
+	# Everything except the large per-project lists, which have their own endpoints
+	summary = {k: v for k, v in project.items() if k not in COLLECTIONS}
+	voicemails = project.get('voicemails', [])
+	summary.update({
+		'dids': project.get('dids', []),
+		'activeDidCount': len(project.get('dids', [])),
+		'archivedDidCount': len(project.get('archivedDids', [])),
+		'totalMessages': len(voicemails),
+		'newMessages': sum(1 for vm in voicemails if vm.get('isNew')),
+		'totalDuration': round(sum(duration_seconds(vm) or 0 for vm in voicemails), 3),
+		'noteCount': len(project.get('notes', []))
+	})
+	return summary
+
+def projects_etag(change_cursor):
+	return hashlib.sha1(repr(change_cursor).encode()).hexdigest()[:16]
+
+def etag_matches(if_none_match, etag):
+	# If-None-Match uses the weak comparison, and "*" matches whatever is current
+	for tag in (if_none_match or '').split(','):
+		tag = tag.strip()
+		if tag == '*':
+			return True
+		if tag.startswith('W/'):
+			tag = tag[2:]
+		if tag and tag.strip('"') == etag:
+			return True
+	return False
+
+class SummaryCache:
+	# The serialized summary list for the latest ETag, so repeated polls skip rebuilding it
+	def __init__(self):
+		self._etag = None
+		self._body = None
+		self._lock = threading.Lock()
+
+	def body(self, etag, projects):
+		with self._lock:
+			if self._etag != etag:
+				self._body = json.dumps([project_summary(p) for p in projects])
+				self._etag = etag
+			return self._body
+
+def projects_response(projects, etag, if_none_match, cache):
+	# Returns (status, body) for the project list: 304 with no body when the client's copy is current
+	if etag_matches(if_none_match, etag):
+		return 304, None
+	return 200, cache.body(etag, projects)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from audio_store import stored_audio, FORMATS, TRANSCODE_CACHE_DIR
+from project_store import open_store
+from search_index import SearchIndex, SEARCH_DB
+from transcription import TRANSCRIPTION_CACHE_DIR
+
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', '200'))
+# Pause between batches so the store lock and the disk are free for API requests in between
+RETENTION_BATCH_PAUSE = float(os.environ.get('RETENTION_BATCH_PAUSE', '0.5'))
+RETENTION_MAX_MB_PER_SEC = float(os.environ.get('RETENTION_MAX_MB_PER_SEC', '20'))
+# A run stops after this long; whatever is left is picked up by the next run
+RETENTION_MAX_RUNTIME = float(os.environ.get('RETENTION_MAX_RUNTIME', '300'))
+
+def retention_cutoff(days, now=None):
+	# Timestamps are stored as local ISO strings, so the cutoff compares as a string
+	return ((now or datetime.now()) - timedelta(days=days)).isoformat()
+
+def voicemail_files(voicemail_dir, voicemail_id):
+	paths = [os.path.join(voicemail_dir, f"{voicemail_id}.json")]
+	paths.extend(stored_audio(voicemail_dir, voicemail_id).values())
+	for ext, _, _ in FORMATS.values():
+		paths.append(os.path.join(voicemail_dir, TRANSCODE_CACHE_DIR, f"{voicemail_id}.{ext}"))
+	return paths
+
+def remove_files(paths):
+	# Returns (files, bytes) removed; files that are already gone are skipped
+	removed, freed = 0, 0
+	for path in paths:
+		try:
+			size = os.path.getsize(path)
+			os.remove(path)
+		except FileNotFoundError:
+			continue
+		removed += 1
+		freed += size
+	return removed, freed
+
+def prune_transcripts(voicemail_dir, days, now=None):
+	# Cached transcripts are keyed by audio hash, not voicemail id, so they expire by age instead.
+	# An entry is written when its voicemail is transcribed, so it never outlives the voicemail for long.
+	cutoff = (now or time.time()) - days * 86400
+	cache_dir = os.path.join(voicemail_dir, TRANSCRIPTION_CACHE_DIR)
+	expired = []
+	for root, _, names in os.walk(cache_dir):
+		for name in names:
+			path = os.path.join(root, name)
+			try:
+				if os.path.getmtime(path) < cutoff:
+					expired.append(path)
+			except FileNotFoundError:
+				continue
+	return remove_files(expired)
+
+def purge_expired(store, voicemail_dir, days, index=None, on_deleted=None, batch_size=RETENTION_BATCH_SIZE,
+		pause=RETENTION_BATCH_PAUSE, max_mb_per_sec=RETENTION_MAX_MB_PER_SEC, max_runtime=RETENTION_MAX_RUNTIME,
+		clock=time.monotonic, sleep=time.sleep):
+	# Deletes voicemails older than days, oldest first, in batches read from the store's timestamp index.
+	# Files go before records, so an interrupted batch is simply found and finished by the next run.
+	# With projects.json every batch re-reads and re-sorts the whole file, so large stores need SQLite.
+	cutoff = retention_cutoff(days)
+	report = {
+		'cutoff': cutoff, 'voicemails': 0, 'transcripts': 0, 'files': 0, 'bytes': 0, 'batches': 0, 'complete': False
+	}
+	start = clock()
+	previous = None
+	while True:
+		# since='0' leaves out voicemails with no timestamp, which can't be aged
+		batch, _ = store.list_voicemails({'since': '0', 'until': cutoff}, limit=batch_size, descending=False)
+		ids = [vm['id'] for vm in batch]
+		if not ids:
+			report['complete'] = True
+			break
+		if ids == previous:
+			raise RuntimeError(f"Store did not delete expired voicemails {ids[:5]}")
+		previous = ids
+
+		files, freed = 0, 0
+		for voicemail_id in ids:
+			removed, size = remove_files(voicemail_files(voicemail_dir, voicemail_id))
+			files += removed
+			freed += size
+		if index is not None:
+			index.remove_many(ids)
+		store.delete_voicemails(ids)
+		if on_deleted:
+			on_deleted(ids)
+
+		report['voicemails'] += len(ids)
+		report['files'] += files
+		report['bytes'] += freed
+		report['batches'] += 1
+		if len(ids) < batch_size:
+			report['complete'] = True
+			break
+		if clock() - start >= max_runtime:
+			break
+		# Batches that freed a lot of data wait long enough to stay under the I/O budget
+		sleep(max(pause, freed / (max_mb_per_sec * 1024 * 1024) if max_mb_per_sec else 0))
+	report['transcripts'], freed = prune_transcripts(voicemail_dir, days)
+	report['files'] += report['transcripts']
+	report['bytes'] += freed
+	report['seconds'] = round(clock() - start, 3)
+	return report
+
+if __name__ == '__main__':
+	if len(sys.argv) < 2:
+		print("Usage: retention.py <days> [voicemails_dir]")
+		sys.exit(1)
+	store = open_store()
+	index = SearchIndex(SEARCH_DB)
+	try:
+		report = purge_expired(store, sys.argv[2] if len(sys.argv) > 2 else 'voicemails', float(sys.argv[1]), index=index)
+	finally:
+		store.close()
+		index.close()
+	print(f"Removed {report['voicemails']} voicemails and {report['transcripts']} cached transcripts "
+		f"older than {report['cutoff']}: {report['files']} files, {report['bytes'] / 1024 / 1024:.1f} MB")
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+import re
+import sys
+import sqlite3
+import threading
+from contextlib import contextmanager
+from project_store import open_store
+
+SEARCH_DB = "search.db"
+SNIPPET_TOKENS = 12
+
+SCHEMA = [
+	# Row ids are shared with the FTS table, so re-indexing a voicemail deletes by rowid instead of scanning
+	"""CREATE TABLE IF NOT EXISTS documents (
+		rowid INTEGER PRIMARY KEY,
+		voicemail_id TEXT NOT NULL UNIQUE,
+		project_id TEXT,
+		did TEXT,
+		timestamp TEXT
+	)""",
+	"""CREATE VIRTUAL TABLE IF NOT EXISTS voicemail_text USING fts5(
+		transcription, caller, tokenize = 'porter unicode61'
+	)""",
+]
+
+QUERY_TOKEN = re.compile(r'"([^"]*)"?|(\S+)')
+
+def build_query(text):
+	# Turns user input into an FTS5 query: "quoted phrases" match in order, bare words are ANDed,
+	# and a trailing * makes a prefix match. Everything is quoted so operators in the input can't break the syntax.
+	terms = []
+	for phrase, word in QUERY_TOKEN.findall(text or ''):
+		if phrase:
+			terms.append('"' + phrase.replace('"', '') + '"')
+		elif word:
+			prefix = word.endswith('*')
+			word = word.strip('*').replace('"', '')
+			if word:
+				terms.append('"' + word + '"' + ('*' if prefix else ''))
+	return ' '.join(terms)
+
+class SearchIndex:
+	# Full-text index over transcriptions, kept next to the project store and updated as voicemails are processed
+	def __init__(self, path=SEARCH_DB):
+		self.path = path
+		self._local = threading.local()
+		with self._transaction() as conn:
+			for statement in SCHEMA:
+				conn.execute(statement)
+
+	def _connect(self):
+		conn = getattr(self._local, 'conn', None)
+		if conn is None:
+			conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("PRAGMA synchronous=NORMAL")
+			self._local.conn = conn
+		return conn
+
+	@contextmanager
+	def _transaction(self):
+		conn = self._connect()
+		conn.execute("BEGIN IMMEDIATE")
+		try:
+			yield conn
+		except BaseException:
+			# Includes KeyboardInterrupt, so an interrupted write never leaves the transaction open
+			conn.execute("ROLLBACK")
+			raise
+		conn.execute("COMMIT")
+
+	def close(self):
+		conn = getattr(self._local, 'conn', None)
+		if conn is not None:
+			conn.close()
+			self._local.conn = None
+
+	def _upsert(self, conn, project_id, voicemail):
+		row = conn.execute("SELECT rowid FROM documents WHERE voicemail_id = ?", (voicemail['id'],)).fetchone()
+		if row is not None:
+			conn.execute("DELETE FROM voicemail_text WHERE rowid = ?", (row[0],))
+			conn.execute(
+				"UPDATE documents SET project_id = ?, did = ?, timestamp = ? WHERE rowid = ?",
+				(project_id, voicemail.get('did'), voicemail.get('timestamp') or '', row[0])
+			)
+			rowid = row[0]
+		else:
+			rowid = conn.execute(
+				"INSERT INTO documents (voicemail_id, project_id, did, timestamp) VALUES (?, ?, ?, ?)",
+				(voicemail['id'], project_id, voicemail.get('did'), voicemail.get('timestamp') or '')
+			).lastrowid
+		conn.execute(
+			"INSERT INTO voicemail_text (rowid, transcription, caller) VALUES (?, ?, ?)",
+			(rowid, voicemail.get('transcription') or '', voicemail.get('caller') or '')
+		)
+
+	def add(self, project_id, voicemail):
+		with self._transaction() as conn:
+			self._upsert(conn, project_id, voicemail)
+
+	def add_many(self, items):
+		# items are (project_id, voicemail) pairs, written in one transaction
+		with self._transaction() as conn:
+			for project_id, voicemail in items:
+				self._upsert(conn, project_id, voicemail)
+
+	def remove(self, voicemail_id):
+		self.remove_many([voicemail_id])
+
+	def remove_many(self, voicemail_ids):
+		with self._transaction() as conn:
+			for voicemail_id in voicemail_ids:
+				row = conn.execute("SELECT rowid FROM documents WHERE voicemail_id = ?", (voicemail_id,)).fetchone()
+				if row is not None:
+					conn.execute("DELETE FROM voicemail_text WHERE rowid = ?", (row[0],))
+					conn.execute("DELETE FROM documents WHERE rowid = ?", (row[0],))
+
+	def search(self, text, filters=None, limit=50, offset=0):
+		# Returns (hits, has_more) ranked by bm25; each hit has voicemailId, projectId, snippet and score.
+		# Filters: project_id, did.
+		query = build_query(text)
+		if not query:
+			raise ValueError("Empty search query")
+		filters = filters or {}
+		clauses, params = ["voicemail_text MATCH ?"], [query]
+		for key, column in (('project_id', 'd.project_id'), ('did', 'd.did')):
+			if filters.get(key) is not None:
+				clauses.append(f"{column} = ?")
+				params.append(filters[key])
+		try:
+			rows = self._connect().execute(
+				f"""SELECT d.voicemail_id, d.project_id, snippet(voicemail_text, 0, '[', ']', '...', {SNIPPET_TOKENS}), rank
+				FROM voicemail_text JOIN documents d ON d.rowid = voicemail_text.rowid
+				WHERE {' AND '.join(clauses)}
+				ORDER BY rank LIMIT ? OFFSET ?""",
+				params + [limit + 1, offset]
+			).fetchall()
+		except sqlite3.OperationalError as e:
+			raise ValueError(f"Invalid search query: {str(e)}")
+		hits = [
+			{'voicemailId': voicemail_id, 'projectId': project_id, 'snippet': snippet, 'score': round(-rank, 4)}
+			for voicemail_id, project_id, snippet, rank in rows[:limit]
+		]
+		return hits, len(rows) > limit
+
+	def count(self):
+		return self._connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+	def optimize(self):
+		# Merges FTS segments; worth running after a large rebuild
+		with self._transaction() as conn:
+			conn.execute("INSERT INTO voicemail_text (voicemail_text) VALUES ('optimize')")
+
+def rebuild_index(store, index, batch_size=1000):
+	batch = []
+	indexed = 0
+	for project in store.load_projects():
+		for voicemail in project.get('voicemails', []):
+			batch.append((project['id'], voicemail))
+			if len(batch) >= batch_size:
+				index.add_many(batch)
+				indexed += len(batch)
+				batch = []
+	if batch:
+		index.add_many(batch)
+		indexed += len(batch)
+	index.optimize()
+	return indexed
+
+if __name__ == '__main__':
+	command = sys.argv[1] if len(sys.argv) > 1 else ''
+	if command == 'rebuild':
+		store = open_store()
+		index = SearchIndex(sys.argv[2] if len(sys.argv) > 2 else SEARCH_DB)
+		try:
+			print(f"Indexed {rebuild_index(store, index)} voicemails")
+		finally:
+			store.close()
+			index.close()
+	elif command == 'search' and len(sys.argv) > 2:
+		for hit in SearchIndex().search(' '.join(sys.argv[2:]))[0]:
+			print(f"{hit['score']:8.3f}  {hit['voicemailId']}  {hit['snippet']}")
+	else:
+		print("Usage: search_index.py rebuild [search.db] | search <query>")
+		sys.exit(1)
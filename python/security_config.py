@@ -1,90 +1,284 @@
-import os
-from datetime import timedelta
-from functools import wraps
-from flask import request, jsonify
-import jwt
-from werkzeug.security import generate_password_hash, check_password_hash
-import re
-
-# Security settings
-JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-here')
-JWT_EXPIRATION = timedelta(hours=8)
-PASSWORD_PATTERN = r'^(?=.*[A-Za-z])(?=.*\d)(?=.*[@$!%*#?&])[A-Za-z\d@$!%*#?&]{8,}$'
-ALLOWED_IPS = os.environ.get('ALLOWED_IPS', '127.0.0.1').split(',')
-RATE_LIMIT = int(os.environ.get('RATE_LIMIT', '100'))
-RATE_LIMIT_PERIOD = int(os.environ.get('RATE_LIMIT_PERIOD', '3600'))
-
-def require_auth(f):
-	@wraps(f)
-	def decorated(*args, **kwargs):
-		token = request.headers.get('Authorization')
-		if not token:
-			return jsonify({'error': 'No token provided'}), 401
-		
-		try:
-			token = token.split(' ')[1]
-			payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
-			request.user = payload
-		except jwt.ExpiredSignatureError:
-			return jsonify({'error': 'Token expired'}), 401
-		except jwt.InvalidTokenError:
-			return jsonify({'error': 'Invalid token'}), 401
-			
-		return f(*args, **kwargs)
-	return decorated
-
-def validate_password(password):
-	return bool(re.match(PASSWORD_PATTERN, password))
-
-def check_ip_whitelist():
-	client_ip = request.remote_addr
-	return client_ip in ALLOWED_IPS
-
-def rate_limit(key_prefix):
-	def decorator(f):
-		@wraps(f)
-		def decorated(*args, **kwargs):
-			from redis import Redis
-			redis_client = Redis(host='redis', port=6379, db=0)
-			
-			key = f"{key_prefix}:{request.remote_addr}"
-			current = redis_client.get(key)
-			
-			if current is not None and int(current) >= RATE_LIMIT:
-				return jsonify({'error': 'Rate limit exceeded'}), 429
-				
-			pipe = redis_client.pipeline()
-			pipe.incr(key)
-			pipe.expire(key, RATE_LIMIT_PERIOD)
-			pipe.execute()
-			
-			return f(*args, **kwargs)
-		return decorated
-	return decorator
-
-def sanitize_input(data):
-	if isinstance(data, str):
-		# Remove potential XSS
-		data = data.replace('<', '&lt;').replace('>', '&gt;')
-		# Prevent SQL injection
-		data = data.replace("'", "''")
-	elif isinstance(data, dict):
-		return {k: sanitize_input(v) for k, v in data.items()}
-	elif isinstance(data, list):
-		return [sanitize_input(x) for x in data]
-	return data
-
-def audit_log(action, user_id, resource_type, resource_id, status):
-	from datetime import datetime
-	log_entry = {
-		'timestamp': datetime.utcnow().isoformat(),
-		'action': action,
-		'user_id': user_id,
-		'resource_type': resource_type,
-		'resource_id': resource_id,
-		'status': status,
-		'ip_address': request.remote_addr,
-		'user_agent': request.user_agent.string
-	}
-	# Save to database or log file
+import os
+import math
+import hashlib
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import wraps
+from flask import request, jsonify
+import jwt
+from werkzeug.security import generate_password_hash, check_password_hash
+import re
+from ip_allowlist import ReloadingAllowlist
+
+# Security settings
+JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-here')
+JWT_EXPIRATION = timedelta(hours=8)
+PASSWORD_PATTERN = r'^(?=.*[A-Za-z])(?=.*\d)(?=.*[@$!%*#?&])[A-Za-z\d@$!%*#?&]{8,}$'
+ALLOWED_IPS = os.environ.get('ALLOWED_IPS', '127.0.0.1').split(',')
+# Optional file of extra addresses/CIDRs, one per line; edits apply without a restart
+ALLOWED_IPS_FILE = os.environ.get('ALLOWED_IPS_FILE')
+RATE_LIMIT = int(os.environ.get('RATE_LIMIT', '100'))
+RATE_LIMIT_PERIOD = int(os.environ.get('RATE_LIMIT_PERIOD', '3600'))
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', '50'))
+REDIS_TIMEOUT = float(os.environ.get('REDIS_TIMEOUT', '0.5'))
+# After a Redis failure, limit locally for this long before trying Redis again
+REDIS_RETRY_AFTER = float(os.environ.get('REDIS_RETRY_AFTER', '30'))
+LOCAL_BUCKET_KEYS = 10000
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+
+# Drops hits older than the window, then records this one if there is room.
+# Returns {allowed, hits in window, ms until the oldest hit leaves the window}.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= limit then
+	local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+	return {0, count, tonumber(oldest[2]) + window - now}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, count + 1, 0}
+"""
+
+_redis_client = None
+_redis_lock = threading.Lock()
+
+def get_redis():
+	# One pooled client per process instead of a new connection per request
+	global _redis_client
+	if _redis_client is None:
+		with _redis_lock:
+			if _redis_client is None:
+				from redis import Redis, ConnectionPool
+				password = os.environ.get('REDIS_PASSWORD')
+				if os.environ.get('REDIS_PASSWORD_FILE'):
+					with open(os.environ['REDIS_PASSWORD_FILE']) as f:
+						password = f.read().strip()
+				pool = ConnectionPool.from_url(
+					REDIS_URL,
+					password=password,
+					max_connections=REDIS_MAX_CONNECTIONS,
+					socket_timeout=REDIS_TIMEOUT,
+					socket_connect_timeout=REDIS_TIMEOUT
+				)
+				_redis_client = Redis(connection_pool=pool)
+	return _redis_client
+
+class TokenBucket:
+	# In-process limiter used while Redis is unreachable; refills limit tokens per period
+	def __init__(self, limit, period, clock=time.monotonic, max_keys=LOCAL_BUCKET_KEYS):
+		self.limit = limit
+		self.rate = limit / period
+		self.clock = clock
+		self.max_keys = max_keys
+		self._buckets = OrderedDict()
+		self._lock = threading.Lock()
+
+	def hit(self, key):
+		now = self.clock()
+		with self._lock:
+			tokens, last = self._buckets.pop(key, (self.limit, now))
+			tokens = min(self.limit, tokens + (now - last) * self.rate)
+			allowed = tokens >= 1
+			if allowed:
+				tokens -= 1
+			self._buckets[key] = (tokens, now)
+			if len(self._buckets) > self.max_keys:
+				self._buckets.popitem(last=False)
+		return allowed, 0 if allowed else (1 - tokens) / self.rate
+
+class SlidingWindowLimiter:
+	def __init__(self, client_factory=get_redis, limit=RATE_LIMIT, period=RATE_LIMIT_PERIOD, clock=time.time):
+		self.client_factory = client_factory
+		self.limit = limit
+		self.period = period
+		self.clock = clock
+		self.fallback = TokenBucket(limit, period)
+		self._script = None
+		self._redis_down_until = 0
+		self.stats = {'allowed': 0, 'limited': 0, 'redisErrors': 0, 'localChecks': 0}
+
+	def hit(self, key):
+		# Returns (allowed, seconds until the next request would be allowed)
+		allowed, retry_after = self._hit_redis(key)
+		if allowed is None:
+			self.stats['localChecks'] += 1
+			allowed, retry_after = self.fallback.hit(key)
+		self.stats['allowed' if allowed else 'limited'] += 1
+		return allowed, retry_after
+
+	def _hit_redis(self, key):
+		if time.monotonic() < self._redis_down_until:
+			return None, 0
+		now_ms = int(self.clock() * 1000)
+		try:
+			if self._script is None:
+				self._script = self.client_factory().register_script(SLIDING_WINDOW_SCRIPT)
+			allowed, _, retry_ms = self._script(
+				keys=[key],
+				args=[now_ms, self.period * 1000, self.limit, f"{now_ms}-{uuid.uuid4().hex[:8]}"]
+			)
+		except Exception as e:
+			self.stats['redisErrors'] += 1
+			self._redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+			print(f"Rate limiter falling back to local buckets: {str(e)}")
+			return None, 0
+		return bool(allowed), int(retry_ms) / 1000
+
+limiter = SlidingWindowLimiter()
+
+class TokenCache:
+	# Verified claims keyed by token digest, so repeat requests skip the HMAC check.
+	# Entries expire with the token; revoked tokens and users are rejected even when cached.
+	def __init__(self, maxsize=TOKEN_CACHE_SIZE, clock=time.time):
+		self.maxsize = maxsize
+		self.clock = clock
+		self._claims = OrderedDict()
+		self._revoked_tokens = {}
+		self._revoked_users = {}
+		self._lock = threading.Lock()
+		self.stats = {'hits': 0, 'misses': 0}
+
+	@staticmethod
+	def digest(token):
+		return hashlib.sha256(token.encode()).digest()
+
+	def get(self, digest):
+		now = self.clock()
+		with self._lock:
+			claims = self._claims.get(digest)
+			if claims is None or claims['exp'] <= now:
+				self._claims.pop(digest, None)
+				self.stats['misses'] += 1
+				return None
+			self._claims.move_to_end(digest)
+			self.stats['hits'] += 1
+			return claims
+
+	def put(self, digest, claims):
+		if 'exp' not in claims:
+			return
+		with self._lock:
+			self._claims[digest] = claims
+			while len(self._claims) > self.maxsize:
+				self._claims.popitem(last=False)
+
+	def is_revoked(self, digest, claims):
+		cutoff = self._revoked_users.get(claims.get('id'))
+		if cutoff is not None and claims.get('iat', 0) < cutoff:
+			return True
+		return digest in self._revoked_tokens
+
+	def revoke(self, digest, exp):
+		now = self.clock()
+		with self._lock:
+			self._claims.pop(digest, None)
+			# Revoked tokens only need remembering until they would have expired anyway
+			self._revoked_tokens = {d: e for d, e in self._revoked_tokens.items() if e > now}
+			self._revoked_tokens[digest] = exp
+
+	def revoke_user(self, user_id):
+		# Tokens issued to the user before now stop working
+		with self._lock:
+			self._revoked_users[user_id] = self.clock()
+			self._claims = OrderedDict((d, c) for d, c in self._claims.items() if c.get('id') != user_id)
+
+token_cache = TokenCache()
+
+def verify_token(token):
+	# Returns the token's claims or raises jwt.InvalidTokenError (ExpiredSignatureError when expired)
+	digest = TokenCache.digest(token)
+	claims = token_cache.get(digest)
+	if claims is None:
+		claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
+		token_cache.put(digest, claims)
+	if token_cache.is_revoked(digest, claims):
+		raise jwt.InvalidTokenError('Token revoked')
+	return claims
+
+def revoke_token(token):
+	try:
+		claims = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
+	except jwt.InvalidTokenError:
+		return
+	token_cache.revoke(TokenCache.digest(token), claims.get('exp', time.time() + JWT_EXPIRATION.total_seconds()))
+
+def bearer_token():
+	scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+	return token.strip() if scheme == 'Bearer' else None
+
+def require_auth(f):
+	@wraps(f)
+	def decorated(*args, **kwargs):
+		if not request.headers.get('Authorization'):
+			return jsonify({'error': 'No token provided'}), 401
+		
+		token = bearer_token()
+		if not token:
+			return jsonify({'error': 'Invalid token'}), 401
+		try:
+			request.user = verify_token(token)
+		except jwt.ExpiredSignatureError:
+			return jsonify({'error': 'Token expired'}), 401
+		except jwt.InvalidTokenError:
+			return jsonify({'error': 'Invalid token'}), 401
+			
+		return f(*args, **kwargs)
+	return decorated
+
+def validate_password(password):
+	return bool(re.match(PASSWORD_PATTERN, password))
+
+ip_allowlist = ReloadingAllowlist(ALLOWED_IPS, ALLOWED_IPS_FILE)
+
+def check_ip_whitelist():
+	return ip_allowlist.allows(request.remote_addr)
+
+def rate_limit(key_prefix):
+	def decorator(f):
+		@wraps(f)
+		def decorated(*args, **kwargs):
+			allowed, retry_after = limiter.hit(f"ratelimit:{key_prefix}:{request.remote_addr}")
+			if not allowed:
+				response = jsonify({'error': 'Rate limit exceeded'})
+				response.status_code = 429
+				response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+				return response
+			
+			return f(*args, **kwargs)
+		return decorated
+	return decorator
+
+def sanitize_input(data):
+	if isinstance(data, str):
+		# Remove potential XSS
+		data = data.replace('<', '&lt;').replace('>', '&gt;')
+		# Prevent SQL injection
+		data = data.replace("'", "''")
+	elif isinstance(data, dict):
+		return {k: sanitize_input(v) for k, v in data.items()}
+	elif isinstance(data, list):
+		return [sanitize_input(x) for x in data]
+	return data
+
+def audit_log(action, user_id, resource_type, resource_id, status):
+	from datetime import datetime
+	log_entry = {
+		'timestamp': datetime.utcnow().isoformat(),
+		'action': action,
+		'user_id': user_id,
+		'resource_type': resource_type,
+		'resource_id': resource_id,
+		'status': status,
+		'ip_address': request.remote_addr,
+		'user_agent': request.user_agent.string
+	}
+	# Save to database or log file
 	return log_entry
\ No newline at end of file
@@ -0,0 +1,201 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+SQL_POOL_SIZE = int(os.environ.get('SQL_POOL_SIZE', '10'))
+SQL_POOL_TIMEOUT = float(os.environ.get('SQL_POOL_TIMEOUT', '5'))
+SQL_QUERY_TIMEOUT = int(os.environ.get('SQL_QUERY_TIMEOUT', '10'))
+SQL_LOGIN_TIMEOUT = int(os.environ.get('SQL_LOGIN_TIMEOUT', '5'))
+# Idle connections are pinged before reuse after this long, and closed after SQL_POOL_MAX_IDLE
+SQL_POOL_PING_AFTER = float(os.environ.get('SQL_POOL_PING_AFTER', '30'))
+SQL_POOL_MAX_IDLE = float(os.environ.get('SQL_POOL_MAX_IDLE', '300'))
+
+# Environment variable prefix for each database; archive falls back to the main server
+DATABASES = {
+	'dnc': ('SQL_SERVER', None),
+	'archive': ('ARCHIVE_SQL_SERVER', 'SQL_SERVER'),
+}
+
+class PoolTimeout(Exception):
+	pass
+
+class ConnectionPool:
+	# Bounded pool of DB-API connections shared by every request thread
+	def __init__(self, connect, max_size=SQL_POOL_SIZE, timeout=SQL_POOL_TIMEOUT,
+			ping_after=SQL_POOL_PING_AFTER, max_idle=SQL_POOL_MAX_IDLE, ping_sql='SELECT 1'):
+		self._connect = connect
+		self.max_size = max_size
+		self.timeout = timeout
+		self.ping_after = ping_after
+		self.max_idle = max_idle
+		self.ping_sql = ping_sql
+		self._idle = deque()
+		self._size = 0
+		self._cond = threading.Condition()
+		self._stats = {
+			'created': 0, 'reused': 0, 'discarded': 0, 'waits': 0, 'timeouts': 0,
+			'errors': 0, 'checkouts': 0, 'checkoutTime': 0.0, 'maxCheckoutTime': 0.0
+		}
+
+	def acquire(self):
+		deadline = time.monotonic() + self.timeout
+		with self._cond:
+			while True:
+				while self._idle:
+					conn, idle_since = self._idle.pop()
+					idle_for = time.monotonic() - idle_since
+					if idle_for > self.max_idle or (idle_for > self.ping_after and not self._ping(conn)):
+						self._discard(conn)
+						continue
+					self._stats['reused'] += 1
+					return conn
+				if self._size < self.max_size:
+					self._size += 1
+					break
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					self._stats['timeouts'] += 1
+					raise PoolTimeout(f"No database connection available within {self.timeout}s")
+				self._stats['waits'] += 1
+				self._cond.wait(remaining)
+
+		# Open outside the lock so a slow login doesn't block other borrowers
+		try:
+			conn = self._connect()
+		except Exception:
+			with self._cond:
+				self._size -= 1
+				self._stats['errors'] += 1
+				self._cond.notify()
+			raise
+		with self._cond:
+			self._stats['created'] += 1
+		return conn
+
+	def release(self, conn, broken=False):
+		with self._cond:
+			if broken:
+				self._discard(conn)
+			else:
+				self._idle.append((conn, time.monotonic()))
+			self._cond.notify()
+
+	@contextmanager
+	def connection(self):
+		conn = self.acquire()
+		start = time.monotonic()
+		try:
+			yield conn
+		except Exception:
+			# A connection that can't roll back is in an unknown state; don't hand it out again
+			with self._cond:
+				self._stats['errors'] += 1
+			self._record(start)
+			self.release(conn, broken=not self._rollback(conn))
+			raise
+		self._record(start)
+		self.release(conn)
+
+	def _record(self, start):
+		elapsed = time.monotonic() - start
+		with self._cond:
+			self._stats['checkouts'] += 1
+			self._stats['checkoutTime'] += elapsed
+			self._stats['maxCheckoutTime'] = max(self._stats['maxCheckoutTime'], elapsed)
+
+	def _rollback(self, conn):
+		try:
+			conn.rollback()
+			return True
+		except Exception:
+			return False
+
+	def _ping(self, conn):
+		try:
+			cursor = conn.cursor()
+			cursor.execute(self.ping_sql)
+			cursor.fetchall()
+			return True
+		except Exception:
+			return False
+
+	def _discard(self, conn):
+		# Caller holds the lock
+		self._size -= 1
+		self._stats['discarded'] += 1
+		try:
+			conn.close()
+		except Exception:
+			pass
+
+	def close(self):
+		with self._cond:
+			while self._idle:
+				conn, _ = self._idle.pop()
+				self._discard(conn)
+
+	def metrics(self):
+		with self._cond:
+			stats = dict(self._stats)
+			stats['size'] = self._size
+			stats['idle'] = len(self._idle)
+			stats['inUse'] = self._size - len(self._idle)
+			stats['maxSize'] = self.max_size
+		stats['avgCheckoutTime'] = round(stats['checkoutTime'] / stats['checkouts'], 4) if stats['checkouts'] else 0
+		stats['checkoutTime'] = round(stats['checkoutTime'], 3)
+		stats['maxCheckoutTime'] = round(stats['maxCheckoutTime'], 4)
+		return stats
+
+def env_setting(prefix, fallback, name, default=''):
+	for p in (prefix, fallback):
+		if not p:
+			continue
+		# Docker secrets are passed as <NAME>_FILE
+		secret_file = os.environ.get(f'{p}_{name}_FILE')
+		if secret_file:
+			with open(secret_file) as f:
+				return f.read().strip()
+		if f'{p}_{name}' in os.environ:
+			return os.environ[f'{p}_{name}']
+	return default
+
+def mssql_connector(name):
+	prefix, fallback = DATABASES[name]
+	settings = {
+		'server': env_setting(prefix, fallback, 'HOST', 'localhost'),
+		'user': env_setting(prefix, fallback, 'USER'),
+		'password': env_setting(prefix, fallback, 'PASSWORD'),
+		'database': env_setting(prefix, fallback, 'DB'),
+		'timeout': SQL_QUERY_TIMEOUT,
+		'login_timeout': SQL_LOGIN_TIMEOUT,
+	}
+
+	def connect():
+		import pymssql
+		return pymssql.connect(**settings)
+	return connect
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name):
+	with _pools_lock:
+		pool = _pools.get(name)
+		if pool is None:
+			pool = _pools[name] = ConnectionPool(mssql_connector(name))
+		return pool
+
+def set_pool(name, pool):
+	# Lets tests and tools point a database at another connection factory
+	with _pools_lock:
+		old = _pools.pop(name, None)
+		_pools[name] = pool
+	if old is not None:
+		old.close()
+
+def pool_metrics():
+	with _pools_lock:
+		pools = dict(_pools)
+	return {name: pool.metrics() for name, pool in pools.items()}
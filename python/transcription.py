@@ -0,0 +1,449 @@
+import os
+import json
+import time
+import wave
+import queue
+import hashlib
+import itertools
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+TRANSCRIPTION_BACKEND = os.environ.get('TRANSCRIPTION_BACKEND', 'google')
+TRANSCRIPTION_LANGUAGE = os.environ.get('TRANSCRIPTION_LANGUAGE', 'en-US')
+TRANSCRIPTION_TIMEOUT = float(os.environ.get('TRANSCRIPTION_TIMEOUT', '300'))
+TRANSCRIPTION_CONCURRENCY = int(os.environ.get('TRANSCRIPTION_CONCURRENCY', '2'))
+TRANSCRIPTION_QUEUE_SIZE = int(os.environ.get('TRANSCRIPTION_QUEUE_SIZE', '32'))
+TRANSCRIPTION_BATCH_SIZE = int(os.environ.get('TRANSCRIPTION_BATCH_SIZE', '8'))
+TRANSCRIPTION_BATCH_WAIT = float(os.environ.get('TRANSCRIPTION_BATCH_WAIT', '0.05'))
+TRANSCRIPTION_CACHE_DIR = 'transcriptions'
+TRANSCRIPTION_METRICS_FILE = 'transcription_metrics.json'
+SERVICE_GRACE_SECONDS = 5
+VOSK_MODEL_PATH = os.environ.get('VOSK_MODEL_PATH', 'models/vosk')
+# Streaming requests are capped at 25KB of audio each
+CHUNK_BYTES = 16000
+# A single recognition stream is cut off after about five minutes of audio
+STREAM_LIMIT_SECONDS = 280
+
+class TranscriptionError(Exception):
+	pass
+
+class TranscriptionTimeout(TranscriptionError):
+	pass
+
+class TranscriptionBusy(TranscriptionError):
+	pass
+
+def pcm_chunks(w, max_frames, chunk_bytes=CHUNK_BYTES):
+	# Reads up to max_frames frames from an open wave file, chunk_bytes at a time
+	chunk_frames = max(1, chunk_bytes // (w.getsampwidth() * w.getnchannels()))
+	while max_frames > 0:
+		data = w.readframes(min(chunk_frames, max_frames))
+		if not data:
+			return
+		max_frames -= chunk_frames
+		yield data
+
+def open_pcm(path):
+	try:
+		w = wave.open(path, 'rb')
+	except (wave.Error, EOFError) as e:
+		raise TranscriptionError(f"Unreadable WAV {path}: {str(e)}")
+	if w.getsampwidth() != 2:
+		w.close()
+		raise TranscriptionError(f"{path} is not 16-bit PCM")
+	return w
+
+class TranscriptionBackend(ABC):
+	# transcribe() must give up by deadline (a time.monotonic() value)
+	@abstractmethod
+	def cache_id(self):
+		pass
+
+	@abstractmethod
+	def transcribe(self, path, deadline):
+		pass
+
+	def transcribe_batch(self, requests):
+		# (path, deadline) pairs in, a transcript or exception per pair out; engines that can share work across recordings override this
+		results = []
+		for path, deadline in requests:
+			try:
+				results.append(self.transcribe(path, deadline))
+			except Exception as e:
+				results.append(e)
+		return results
+
+	def supports_batching(self):
+		# Only engines that override transcribe_batch gain from batching; for the rest it just delays requests
+		return type(self).transcribe_batch is not TranscriptionBackend.transcribe_batch
+
+class GoogleStreamingBackend(TranscriptionBackend):
+	# Streams the recording in chunks instead of one synchronous recognize call, so length isn't capped at a minute
+	def __init__(self, language_code=TRANSCRIPTION_LANGUAGE, chunk_bytes=CHUNK_BYTES):
+		self.language_code = language_code
+		self.chunk_bytes = chunk_bytes
+		self._client = None
+		self._lock = threading.Lock()
+
+	def cache_id(self):
+		return f"google-{self.language_code}"
+
+	def client(self):
+		with self._lock:
+			if self._client is None:
+				from google.cloud import speech
+				self._client = speech.SpeechClient()
+			return self._client
+
+	def transcribe(self, path, deadline):
+		from google.cloud import speech
+		from google.api_core import exceptions
+
+		client = self.client()
+		parts = []
+		with open_pcm(path) as w:
+			config = speech.StreamingRecognitionConfig(
+				config=speech.RecognitionConfig(
+					encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+					sample_rate_hertz=w.getframerate(),
+					audio_channel_count=w.getnchannels(),
+					language_code=self.language_code
+				)
+			)
+			segment_frames = w.getframerate() * STREAM_LIMIT_SECONDS
+			# One stream per segment; recordings longer than the stream limit take several. The loop ends when
+			# no audio is left rather than at getnframes(), which a truncated file never reaches.
+			while True:
+				chunks = pcm_chunks(w, segment_frames, self.chunk_bytes)
+				first = next(chunks, None)
+				if first is None:
+					break
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					raise TranscriptionTimeout(f"Transcription of {path} timed out")
+				requests = (
+					speech.StreamingRecognizeRequest(audio_content=chunk)
+					for chunk in itertools.chain([first], chunks)
+				)
+				try:
+					for response in client.streaming_recognize(config=config, requests=requests, timeout=remaining):
+						parts.extend(r.alternatives[0].transcript.strip() for r in response.results if r.is_final and r.alternatives)
+				except exceptions.DeadlineExceeded:
+					raise TranscriptionTimeout(f"Transcription of {path} timed out")
+				except exceptions.GoogleAPICallError as e:
+					raise TranscriptionError(str(e))
+		return " ".join(p for p in parts if p)
+
+class VoskBackend(TranscriptionBackend):
+	# Offline recognizer for development and tests; needs the vosk package and a downloaded model
+	_models = {}
+	_models_lock = threading.Lock()
+
+	def __init__(self, model_path=VOSK_MODEL_PATH, chunk_bytes=CHUNK_BYTES):
+		self.model_path = model_path
+		self.chunk_bytes = chunk_bytes
+
+	def cache_id(self):
+		return f"vosk-{os.path.basename(os.path.normpath(self.model_path))}"
+
+	def model(self):
+		# Models take seconds to load and are safe to share between recognizers
+		with self._models_lock:
+			model = self._models.get(self.model_path)
+			if model is None:
+				try:
+					from vosk import Model
+				except ImportError:
+					raise TranscriptionError("TRANSCRIPTION_BACKEND=vosk needs the vosk package")
+				model = self._models[self.model_path] = Model(self.model_path)
+			return model
+
+	def transcribe(self, path, deadline):
+		result = self.transcribe_batch([(path, deadline)])[0]
+		if isinstance(result, Exception):
+			raise result
+		return result
+
+	def transcribe_batch(self, requests):
+		# One recognizer per sample rate serves the whole batch instead of one per recording
+		try:
+			model = self.model()
+			from vosk import KaldiRecognizer
+		except Exception as e:
+			return [e] * len(requests)
+		recognizers = {}
+		results = []
+		for path, deadline in requests:
+			try:
+				results.append(self._recognize(path, deadline, recognizers, lambda rate: KaldiRecognizer(model, rate)))
+			except Exception as e:
+				results.append(e)
+		return results
+
+	def _recognize(self, path, deadline, recognizers, make_recognizer):
+		parts = []
+		with open_pcm(path) as w:
+			if w.getnchannels() != 1:
+				raise TranscriptionError(f"{path} is not mono")
+			rate = w.getframerate()
+			# Taken out while in use, so a recording that fails part way doesn't leave its audio behind
+			recognizer = recognizers.pop(rate, None) or make_recognizer(rate)
+			for chunk in pcm_chunks(w, w.getnframes(), self.chunk_bytes):
+				if time.monotonic() > deadline:
+					raise TranscriptionTimeout(f"Transcription of {path} timed out")
+				if recognizer.AcceptWaveform(chunk):
+					parts.append(json.loads(recognizer.Result()).get('text', ''))
+			# FinalResult ends the utterance, leaving the recognizer ready for the next recording
+			parts.append(json.loads(recognizer.FinalResult()).get('text', ''))
+			recognizers[rate] = recognizer
+		return " ".join(p for p in parts if p)
+
+BACKENDS = {
+	'google': GoogleStreamingBackend,
+	'vosk': VoskBackend,
+}
+
+def make_backend(name=None):
+	name = name or TRANSCRIPTION_BACKEND
+	if name not in BACKENDS:
+		raise ValueError(f"Unknown transcription backend: {name}")
+	return BACKENDS[name]()
+
+def audio_hash(path):
+	digest = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(1024 * 1024), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+class Transcriber:
+	# Wraps a backend with an overall timeout, a cap on concurrent transcriptions and a result cache keyed by audio hash
+	def __init__(self, backend, cache_dir=None, timeout=TRANSCRIPTION_TIMEOUT, max_concurrent=TRANSCRIPTION_CONCURRENCY):
+		self.backend = backend
+		self.cache_dir = cache_dir
+		self.timeout = timeout
+		self._slots = threading.BoundedSemaphore(max_concurrent)
+		self._stats_lock = threading.Lock()
+		self.stats = {'transcribed': 0, 'cacheHits': 0, 'timeouts': 0, 'errors': 0}
+
+	def _count(self, key):
+		with self._stats_lock:
+			self.stats[key] += 1
+
+	def _cache_path(self, key):
+		return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+	def _cache_get(self, key):
+		try:
+			with open(self._cache_path(key)) as f:
+				return json.load(f)['text']
+		except (OSError, ValueError, KeyError):
+			return None
+
+	def _cache_put(self, key, text):
+		path = self._cache_path(key)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with open(tmp, 'w') as f:
+			json.dump({'text': text, 'backend': self.backend.cache_id(), 'at': time.time()}, f)
+		os.replace(tmp, path)
+
+	def _key(self, path):
+		return hashlib.sha256(f"{self.backend.cache_id()}:{audio_hash(path)}".encode()).hexdigest()
+
+	def transcribe(self, path, deadline=None):
+		result = self.transcribe_batch([(path, deadline or time.monotonic() + self.timeout)])[0]
+		if isinstance(result, Exception):
+			raise result
+		return result
+
+	def transcribe_batch(self, requests):
+		# requests are (path, deadline) pairs; returns a transcript or an exception for each.
+		# Retried jobs and re-uploaded recordings hit the cache, and copies of one recording in a batch are recognized once.
+		results = [None] * len(requests)
+		pending = {}
+		for i, (path, deadline) in enumerate(requests):
+			try:
+				key = self._key(path)
+			except OSError as e:
+				results[i] = TranscriptionError(str(e))
+				continue
+			text = self._cache_get(key) if self.cache_dir else None
+			if text is not None:
+				self._count('cacheHits')
+				results[i] = text
+			else:
+				pending.setdefault(key, []).append(i)
+		if not pending:
+			return results
+
+		work = [(requests[indexes[0]][0], max(requests[i][1] for i in indexes)) for indexes in pending.values()]
+		wait = max(deadline for _, deadline in work) - time.monotonic()
+		if self._slots.acquire(timeout=max(0, wait)):
+			try:
+				outcomes = self.backend.transcribe_batch(work)
+			finally:
+				self._slots.release()
+		else:
+			outcomes = [TranscriptionTimeout("No transcription slot free before the deadline")] * len(work)
+
+		for (key, indexes), outcome in zip(pending.items(), outcomes):
+			if isinstance(outcome, TranscriptionTimeout):
+				self._count('timeouts')
+			elif isinstance(outcome, Exception):
+				self._count('errors')
+			else:
+				self._count('transcribed')
+				if self.cache_dir:
+					self._cache_put(key, outcome)
+			for i in indexes:
+				results[i] = outcome
+		return results
+
+class TranscriptionService:
+	# Long-lived worker pool in front of one Transcriber. Requests wait in a bounded queue; when it is full
+	# submit() fails fast with TranscriptionBusy so callers back off instead of piling up behind a call spike.
+	def __init__(self, transcriber, workers=TRANSCRIPTION_CONCURRENCY, max_queue=TRANSCRIPTION_QUEUE_SIZE,
+			batch_size=TRANSCRIPTION_BATCH_SIZE, batch_wait=TRANSCRIPTION_BATCH_WAIT):
+		self.transcriber = transcriber
+		self.workers = workers
+		# A backend that transcribes one recording at a time would run a batch serially on one worker
+		self.batch_size = batch_size if transcriber.backend.supports_batching() else 1
+		self.batch_wait = batch_wait
+		self._requests = queue.Queue(max_queue)
+		self._stop = threading.Event()
+		self._threads = []
+		self._lock = threading.Lock()
+		self._busy = 0
+		self._counters = {
+			'submitted': 0, 'rejected': 0, 'expired': 0, 'batches': 0, 'batchedRequests': 0,
+			'maxQueueDepth': 0, 'queueWaitTotal': 0.0
+		}
+
+	def start(self):
+		for i in range(self.workers):
+			thread = threading.Thread(target=self._run, name=f'transcription-worker-{i}', daemon=True)
+			thread.start()
+			self._threads.append(thread)
+		return self
+
+	def stop(self, timeout=5):
+		self._stop.set()
+		for thread in self._threads:
+			thread.join(timeout)
+		self._threads = []
+
+	def submit(self, path, timeout=None):
+		deadline = time.monotonic() + (timeout or self.transcriber.timeout)
+		future = Future()
+		try:
+			self._requests.put_nowait((path, deadline, future, time.monotonic()))
+		except queue.Full:
+			with self._lock:
+				self._counters['rejected'] += 1
+			raise TranscriptionBusy(f"Transcription queue is full ({self._requests.maxsize} waiting)")
+		with self._lock:
+			self._counters['submitted'] += 1
+			self._counters['maxQueueDepth'] = max(self._counters['maxQueueDepth'], self._requests.qsize())
+		return future
+
+	def transcribe(self, path, timeout=None):
+		timeout = timeout or self.transcriber.timeout
+		future = self.submit(path, timeout)
+		try:
+			# Workers resolve every request by its deadline; the margin covers a batch that is finishing up
+			return future.result(timeout=timeout + SERVICE_GRACE_SECONDS)
+		except FutureTimeout:
+			raise TranscriptionTimeout(f"Transcription of {path} timed out")
+
+	def _next_batch(self):
+		try:
+			batch = [self._requests.get(timeout=0.5)]
+		except queue.Empty:
+			return []
+		# Give requests arriving right behind the first a moment to join its batch
+		batch_deadline = time.monotonic() + self.batch_wait
+		while len(batch) < self.batch_size:
+			remaining = batch_deadline - time.monotonic()
+			try:
+				batch.append(self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait())
+			except queue.Empty:
+				break
+		return batch
+
+	def _run(self):
+		while not self._stop.is_set():
+			batch = self._next_batch()
+			if not batch:
+				continue
+			now = time.monotonic()
+			live = []
+			for path, deadline, future, queued_at in batch:
+				if deadline <= now:
+					future.set_exception(TranscriptionTimeout(f"Transcription of {path} expired in the queue"))
+				else:
+					live.append((path, deadline, future))
+			with self._lock:
+				self._busy += 1
+				self._counters['batches'] += 1
+				self._counters['batchedRequests'] += len(batch)
+				self._counters['expired'] += len(batch) - len(live)
+				self._counters['queueWaitTotal'] += sum(now - queued_at for _, _, _, queued_at in batch)
+			try:
+				results = self.transcriber.transcribe_batch([(path, deadline) for path, deadline, _ in live])
+			except Exception as e:
+				results = [e] * len(live)
+			finally:
+				with self._lock:
+					self._busy -= 1
+			for (_, _, future), result in zip(live, results):
+				if isinstance(result, Exception):
+					future.set_exception(result)
+				else:
+					future.set_result(result)
+
+	def metrics(self):
+		with self._lock:
+			counters = dict(self._counters)
+			busy = self._busy
+		batched = counters.pop('batchedRequests')
+		wait_total = counters.pop('queueWaitTotal')
+		counters.update({
+			'queueDepth': self._requests.qsize(),
+			'queueCapacity': self._requests.maxsize,
+			'workers': self.workers,
+			'busyWorkers': busy,
+			'avgBatchSize': round(batched / counters['batches'], 2) if counters['batches'] else 0,
+			'avgQueueWait': round(wait_total / batched, 3) if batched else 0,
+			'transcriber': dict(self.transcriber.stats)
+		})
+		return counters
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_transcription_service(voicemail_dir):
+	# One per process, so queue workers share the recognizer client, the worker pool and the backpressure limit
+	global _service
+	with _service_lock:
+		if _service is None:
+			transcriber = Transcriber(make_backend(), os.path.join(voicemail_dir, TRANSCRIPTION_CACHE_DIR))
+			_service = TranscriptionService(transcriber).start()
+		return _service
+
+def write_metrics(path):
+	# The API server runs in another process and reads this file for /api/metrics
+	if _service is None:
+		return
+	tmp = f"{path}.{os.getpid()}.tmp"
+	with open(tmp, 'w') as f:
+		json.dump(dict(_service.metrics(), updatedAt=time.time()), f)
+	os.replace(tmp, path)
+
+def read_metrics(path):
+	try:
+		with open(path) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
@@ -0,0 +1,109 @@
+import time
+import threading
+from collections import OrderedDict
+
+class TTLCache:
+	# Thread-safe LRU cache whose entries also expire after a TTL
+	def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic):
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._clock = clock
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+		self._loading = {}
+		# Bumped by every invalidation so a load that raced with a write isn't cached
+		self._version = 0
+		self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+	def _lookup(self, key):
+		# Caller holds the lock
+		entry = self._data.get(key)
+		if entry is None:
+			return None
+		if entry[1] <= self._clock():
+			del self._data[key]
+			self._stats['expirations'] += 1
+			return None
+		self._data.move_to_end(key)
+		return entry
+
+	def get(self, key, default=None):
+		with self._lock:
+			entry = self._lookup(key)
+			if entry is None:
+				self._stats['misses'] += 1
+				return default
+			self._stats['hits'] += 1
+			return entry[0]
+
+	def set(self, key, value, ttl=None):
+		with self._lock:
+			self._store(key, value, ttl)
+
+	def _store(self, key, value, ttl):
+		self._data[key] = (value, self._clock() + (self.ttl if ttl is None else ttl))
+		self._data.move_to_end(key)
+		while len(self._data) > self.maxsize:
+			self._data.popitem(last=False)
+			self._stats['evictions'] += 1
+
+	def get_or_load(self, key, loader, ttl=None):
+		# Concurrent misses for the same key share a single call to loader
+		with self._lock:
+			entry = self._lookup(key)
+			if entry is not None:
+				self._stats['hits'] += 1
+				return entry[0]
+			self._stats['misses'] += 1
+			pending = self._loading.get(key)
+			if pending is None:
+				pending = self._loading[key] = {'done': threading.Event()}
+				owner = True
+				version = self._version
+			else:
+				owner = False
+
+		if not owner:
+			pending['done'].wait()
+			if 'error' in pending:
+				raise pending['error']
+			return pending['value']
+
+		try:
+			value = loader()
+		except Exception as e:
+			pending['error'] = e
+			raise
+		else:
+			pending['value'] = value
+			with self._lock:
+				if version == self._version:
+					self._store(key, value, ttl)
+			return value
+		finally:
+			with self._lock:
+				self._loading.pop(key, None)
+			pending['done'].set()
+
+	def invalidate(self, key):
+		with self._lock:
+			self._version += 1
+			self._stats['invalidations'] += 1
+			self._data.pop(key, None)
+
+	def clear(self):
+		with self._lock:
+			self._version += 1
+			self._data.clear()
+
+	def __len__(self):
+		return len(self._data)
+
+	def stats(self):
+		with self._lock:
+			stats = dict(self._stats)
+			stats['size'] = len(self._data)
+			stats['maxSize'] = self.maxsize
+		lookups = stats['hits'] + stats['misses']
+		stats['hitRate'] = round(stats['hits'] / lookups, 3) if lookups else 0
+		return stats
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from transcription import write_metrics, TRANSCRIPTION_METRICS_FILE
+
+QUEUE_DB = "voicemail_queue.db"
+QUEUE_WORKERS = int(os.environ.get('QUEUE_WORKERS', '4'))
+MAX_ATTEMPTS = int(os.environ.get('QUEUE_MAX_ATTEMPTS', '5'))
+RETRY_BACKOFF = float(os.environ.get('QUEUE_RETRY_BACKOFF', '10'))
+MAX_BACKOFF = float(os.environ.get('QUEUE_MAX_BACKOFF', '900'))
+# Running jobs older than this are assumed to belong to a dead worker
+JOB_LEASE = float(os.environ.get('QUEUE_JOB_LEASE', '1800'))
+# How often workers publish transcription pool metrics for /api/metrics
+METRICS_INTERVAL = 10
+
+class VoicemailQueue:
+	# Durable post-call job queue; the dialplan enqueues and workers drain it
+	def __init__(self, path=QUEUE_DB):
+		self.path = path
+		self._local = threading.local()
+		with self._transaction() as conn:
+			conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+				id INTEGER PRIMARY KEY AUTOINCREMENT,
+				voicemail_id TEXT NOT NULL UNIQUE,
+				caller TEXT,
+				did TEXT,
+				status TEXT NOT NULL DEFAULT 'pending',
+				attempts INTEGER NOT NULL DEFAULT 0,
+				run_at REAL NOT NULL,
+				created_at REAL NOT NULL,
+				started_at REAL,
+				finished_at REAL,
+				last_error TEXT,
+				timings TEXT
+			)""")
+			conn.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at)")
+
+	def _connect(self):
+		conn = getattr(self._local, 'conn', None)
+		if conn is None:
+			conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+			conn.row_factory = sqlite3.Row
+			conn.execute("PRAGMA journal_mode=WAL")
+			conn.execute("PRAGMA synchronous=NORMAL")
+			self._local.conn = conn
+		return conn
+
+	@contextmanager
+	def _transaction(self):
+		conn = self._connect()
+		conn.execute("BEGIN IMMEDIATE")
+		try:
+			yield conn
+		except BaseException:
+			conn.execute("ROLLBACK")
+			raise
+		conn.execute("COMMIT")
+
+	def close(self):
+		conn = getattr(self._local, 'conn', None)
+		if conn is not None:
+			conn.close()
+			self._local.conn = None
+
+	def enqueue(self, voicemail_id, caller_number, did):
+		now = time.time()
+		with self._transaction() as conn:
+			conn.execute(
+				"INSERT OR IGNORE INTO jobs (voicemail_id, caller, did, run_at, created_at) VALUES (?, ?, ?, ?, ?)",
+				(voicemail_id, caller_number, did, now, now)
+			)
+
+	def claim(self):
+		now = time.time()
+		with self._transaction() as conn:
+			conn.execute(
+				"UPDATE jobs SET status = 'pending' WHERE status = 'running' AND started_at < ?",
+				(now - JOB_LEASE,)
+			)
+			job = conn.execute(
+				"SELECT * FROM jobs WHERE status = 'pending' AND run_at <= ? ORDER BY run_at LIMIT 1",
+				(now,)
+			).fetchone()
+			if job is None:
+				return None
+			conn.execute(
+				"UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ? WHERE id = ?",
+				(now, job['id'])
+			)
+		job = dict(job)
+		job['attempts'] += 1
+		return job
+
+	def complete(self, job, timings):
+		with self._transaction() as conn:
+			conn.execute(
+				"UPDATE jobs SET status = 'done', finished_at = ?, last_error = NULL, timings = ? WHERE id = ?",
+				(time.time(), json.dumps(timings), job['id'])
+			)
+
+	def fail(self, job, error, timings):
+		now = time.time()
+		if job['attempts'] >= MAX_ATTEMPTS:
+			status, run_at = 'failed', now
+		else:
+			status = 'pending'
+			run_at = now + min(RETRY_BACKOFF * 2 ** (job['attempts'] - 1), MAX_BACKOFF)
+		with self._transaction() as conn:
+			conn.execute(
+				"UPDATE jobs SET status = ?, run_at = ?, finished_at = ?, last_error = ?, timings = ? WHERE id = ?",
+				(status, run_at, now, error, json.dumps(timings), job['id'])
+			)
+		return status
+
+	def stats(self):
+		conn = self._connect()
+		counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+		oldest = conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'pending'").fetchone()[0]
+		return {
+			'pending': counts.get('pending', 0),
+			'running': counts.get('running', 0),
+			'done': counts.get('done', 0),
+			'failed': counts.get('failed', 0),
+			'oldestPendingAge': round(time.time() - oldest, 1) if oldest else 0
+		}
+
+def run_job(job, timings):
+	from process_voicemail import process_voicemail
+	process_voicemail(job['voicemail_id'], job['caller'], job['did'], timings=timings)
+
+def work(queue, stop_event, handler=run_job, poll_interval=1.0):
+	while not stop_event.is_set():
+		job = queue.claim()
+		if job is None:
+			stop_event.wait(poll_interval)
+			continue
+
+		timings = {}
+		start = time.monotonic()
+		try:
+			handler(job, timings)
+		except Exception as e:
+			timings['total'] = round(time.monotonic() - start, 3)
+			status = queue.fail(job, str(e), timings)
+			print(f"Voicemail {job['voicemail_id']} attempt {job['attempts']} failed ({status}): {str(e)}")
+			continue
+		timings['total'] = round(time.monotonic() - start, 3)
+		queue.complete(job, timings)
+		print(f"Processed voicemail {job['voicemail_id']}: {timings}")
+
+def report_metrics(stop_event, path, interval=METRICS_INTERVAL):
+	while not stop_event.wait(interval):
+		try:
+			write_metrics(path)
+		except OSError as e:
+			print(f"Could not write transcription metrics: {str(e)}")
+
+def run_workers(queue, workers=QUEUE_WORKERS, stop_event=None, handler=run_job):
+	stop_event = stop_event or threading.Event()
+	threads = [
+		threading.Thread(target=work, args=(queue, stop_event, handler), name=f'voicemail-worker-{i}', daemon=True)
+		for i in range(workers)
+	]
+	for thread in threads:
+		thread.start()
+	return threads
+
+if __name__ == '__main__':
+	base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	command = sys.argv[1] if len(sys.argv) > 1 else ''
+	queue = VoicemailQueue(os.path.join(base_dir, QUEUE_DB))
+
+	if command == 'enqueue' and len(sys.argv) == 5:
+		queue.enqueue(sys.argv[2], sys.argv[3], sys.argv[4])
+	elif command == 'work':
+		workers = int(sys.argv[2]) if len(sys.argv) > 2 else QUEUE_WORKERS
+		stop_event = threading.Event()
+		threads = run_workers(queue, workers, stop_event)
+		metrics_path = os.path.join(base_dir, TRANSCRIPTION_METRICS_FILE)
+		threading.Thread(target=report_metrics, args=(stop_event, metrics_path), name='metrics-reporter', daemon=True).start()
+		try:
+			for thread in threads:
+				thread.join()
+		except KeyboardInterrupt:
+			stop_event.set()
+	elif command == 'stats':
+		print(json.dumps(queue.stats()))
+	else:
+		print("Usage: voicemail_queue.py enqueue <voicemail_id> <caller_number> <did> | work [workers] | stats")
+		sys.exit(1)
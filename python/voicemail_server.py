@@ -2,26 +2,44 @@ import os
 import json
 import uuid
 import jwt
+import time
 from datetime import datetime, timedelta
 import pjsua as pj
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify
 from security_config import (
     require_auth, validate_password, check_ip_whitelist,
-    rate_limit, sanitize_input, audit_log
+    rate_limit, sanitize_input, audit_log, limiter,
+    token_cache, bearer_token, revoke_token, JWT_SECRET_KEY
 )
 from flask_cors import CORS
 from flask_talisman import Talisman
+from project_store import open_store, did_number, format_duration, COLLECTIONS
+from project_views import page_size, paginate, projects_etag, projects_response, SummaryCache
+from did_index import DidIndex, DID_INDEX_FILE
+from did_schedule import DidSchedule, DID_SCHEDULE_FILE, parse_date
+from event_bus import EventBus, format_sse
+from audio_store import send_audio, negotiate_audio, stored_audio, purge_originals, TranscodeError, AUDIO_STORAGE
+import queue
 import threading
-import pymssql
+from sql_pool import get_pool, pool_metrics
+import number_lists
+from ttl_cache import TTLCache
+from dnc_filter import DncFilter, DNC_SYNC_INTERVAL
+from transcription import read_metrics, TRANSCRIPTION_METRICS_FILE
+from search_index import SearchIndex, SEARCH_DB
+from retention import purge_expired
+from did_import import DidImporter, import_format
+from ami_client import AMIClient, ThreadedAMIClient
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.audio import MIMEAudio
 import smtplib
-import asterisk.manager
-from dateutil.parser import parse
 from apscheduler.schedulers.background import BackgroundScheduler
 
 app = Flask(__name__)
+# Let nginx/Apache stream recordings (X-Sendfile) when running behind one
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true')
 
 # Update CORS configuration
 CORS(app, resources={
@@ -59,20 +77,40 @@ def security_middleware():
     if not check_ip_whitelist():
         return jsonify({"error": "Access denied"}), 403
 
-# JWT Configuration
-JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secure-jwt-key-here')
+# JWT Configuration; tokens are signed with security_config's key so require_auth accepts them
 JWT_EXPIRATION = timedelta(hours=8)
 
 VOICEMAIL_DIR = "voicemails"
-PROJECTS_FILE = "projects.json"
 SETTINGS_FILE = "settings.json"
+STORE_SYNC_INTERVAL = int(os.environ.get('STORE_SYNC_INTERVAL', '2'))
+SSE_HEARTBEAT = 15
+NUMBER_CACHE_SIZE = int(os.environ.get('NUMBER_CACHE_SIZE', '10000'))
+NUMBER_CACHE_TTL = int(os.environ.get('NUMBER_CACHE_TTL', '300'))
+CALL_HISTORY_CACHE_TTL = int(os.environ.get('CALL_HISTORY_CACHE_TTL', '60'))
+
+# DNC status, archive status and call history per phone number
+number_cache = TTLCache(NUMBER_CACHE_SIZE, NUMBER_CACHE_TTL)
+lookup_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='number-lookup')
 
 class VoicemailServer:
     def __init__(self):
         self.lib = None
         self.acc = None
+        self.scheduler = None
+        self.store = open_store()
+        self.sync_lock = threading.Lock()
+        self.summary_cache = SummaryCache()
+        self.events = EventBus()
+        self.change_cursor = self.store.change_cursor()
         self.projects = self.load_projects()
         self.settings = self.load_settings()
+        self.did_index = DidIndex()
+        self.did_schedule = DidSchedule(DID_SCHEDULE_FILE)
+        self.reindex_dids()
+        self.dnc = DncFilter(get_pool('dnc'))
+        self.search = SearchIndex(SEARCH_DB)
+        self.did_imports = DidImporter(self.import_dids, self.setup_asterisk_did)
+        self.retention_report = None
         
         if not os.path.exists(VOICEMAIL_DIR):
             os.makedirs(VOICEMAIL_DIR)
@@ -85,16 +123,118 @@ class VoicemailServer:
         self.scheduler = BackgroundScheduler()
         self.scheduler.start()
         self.setup_did_monitoring()
+        self.setup_store_sync()
+        self.setup_dnc_sync()
+        self.setup_audio_purge()
+        self.setup_retention()
 
     def load_projects(self):
-        if os.path.exists(PROJECTS_FILE):
-            with open(PROJECTS_FILE, 'r') as f:
-                return json.load(f)
-        return []
+        return self.store.load_projects()
         
     def save_projects(self):
-        with open(PROJECTS_FILE, 'w') as f:
-            json.dump(self.projects, f)
+        # Full rewrite; handlers should prefer the per-entity store methods
+        self.store.save_projects(self.projects)
+        self.reindex_dids()
+
+    def setup_store_sync(self):
+        # Pick up writes made by other processes, e.g. queue workers adding voicemails
+        self.scheduler.add_job(
+            self.sync_from_store,
+            'interval',
+            seconds=STORE_SYNC_INTERVAL,
+            id='store_sync',
+            replace_existing=True
+        )
+
+    def setup_dnc_sync(self):
+        # Load the DNC list in the background now, then pick up new entries periodically
+        self.scheduler.add_job(
+            self.sync_dnc,
+            'interval',
+            seconds=DNC_SYNC_INTERVAL,
+            id='dnc_sync',
+            next_run_time=datetime.now(),
+            replace_existing=True
+        )
+
+    def sync_dnc(self):
+        try:
+            self.dnc.sync()
+        except Exception as e:
+            print(f"DNC sync failed: {str(e)}")
+
+    def with_dnc(self, voicemails):
+        # Flag callers on the DNC list; left out until the first sync has finished
+        if not self.dnc.loaded:
+            return voicemails
+        return [dict(vm, dnc=vm.get('caller') in self.dnc) for vm in voicemails]
+
+    def sync_from_store(self):
+        with self.sync_lock:
+            changes, self.change_cursor = self.store.changes_since(self.change_cursor)
+            self.apply_changes(changes)
+
+    def apply_changes(self, changes):
+        foreign = [c for c in changes if c.get('origin') != os.getpid()]
+        if foreign:
+            if any(c['op'] == 'reload' for c in foreign):
+                self.projects = self.load_projects()
+            else:
+                for project_id in {c['project_id'] for c in foreign}:
+                    self.refresh_project(project_id)
+            self.reindex_dids()
+
+        # Every change, ours or another process's, goes out to dashboards
+        for change in changes:
+            self.publish_change(change)
+        if changes:
+            self.store.prune_changes()
+
+    def publish_change(self, change):
+        entity, op = change.get('entity'), change['op']
+        if op == 'reload':
+            self.events.publish('projects-reloaded', {})
+        elif entity == 'voicemail' and op == 'create':
+            voicemail = self.store.get_voicemail(change['entity_id'])
+            if voicemail:
+                voicemail = self.with_dnc([voicemail])[0]
+                self.events.publish('voicemail-created', {'projectId': change['project_id'], 'voicemail': voicemail})
+        elif entity == 'did' and op == 'archive':
+            self.events.publish('did-archived', {'projectId': change['project_id'], 'did': change['entity_id']})
+        else:
+            self.events.publish('project-changed', {'projectId': change['project_id'], 'entity': entity, 'op': op})
+
+    def projects_etag(self):
+        # Catch up with the store first so the tag never runs ahead of what we serve
+        if self.store.change_cursor() != self.change_cursor:
+            self.sync_from_store()
+        return projects_etag(self.change_cursor)
+
+    def refresh_project(self, project_id):
+        fresh = self.store.load_project(project_id)
+        current = next((p for p in self.projects if p['id'] == project_id), None)
+        if fresh is None:
+            self.projects = [p for p in self.projects if p['id'] != project_id]
+        elif current is None:
+            self.projects.append(fresh)
+        else:
+            # Update in place so handlers holding a reference see the new data
+            current.clear()
+            current.update(fresh)
+
+    def reindex_dids(self):
+        # Refresh the DID routing index read by check_did.py after any DID change
+        self.did_index.rebuild(self.projects)
+        self.did_index.save(DID_INDEX_FILE, self.settings.get('catchAllEnabled', False))
+        self.did_schedule.sync(self.projects)
+        self.schedule_did_monitor()
+
+    def update_dids(self, project_id, added=(), removed=()):
+        # One project's DIDs changed: update the index rows and schedule entries in place rather than rebuilding them
+        self.did_index.apply(project_id, [did_number(d) for d in added], removed,
+                             DID_INDEX_FILE, self.settings.get('catchAllEnabled', False))
+        self.did_schedule.update(project_id, added, removed)
+        self.schedule_did_monitor()
             
     def load_settings(self):
         if os.path.exists(SETTINGS_FILE):
@@ -112,6 +252,7 @@ class VoicemailServer:
     def save_settings(self):
         with open(SETTINGS_FILE, 'w') as f:
             json.dump(self.settings, f)
+        self.did_index.save(DID_INDEX_FILE, self.settings.get('catchAllEnabled', False))
 
     def init_pjsua(self):
         self.lib = pj.Lib()
@@ -132,18 +273,15 @@ class VoicemailServer:
             self.lib.destroy()
 
     def connect_asterisk(self):
-        try:
-            self.ami = asterisk.manager.Manager()
-            self.ami.connect('localhost')  # Or your Asterisk server address
-            self.ami.login('admin', 'password')  # Replace with your AMI credentials
-            
-            # Register event handlers
-            self.ami.register_event('Newchannel', self.handle_new_call)
-            self.ami.register_event('Hangup', self.handle_hangup)
-            
-            print("Connected to Asterisk Manager Interface")
-        except Exception as e:
-            print(f"Failed to connect to Asterisk: {str(e)}")
+        # One persistent AMI connection on its own event loop thread; it reconnects by itself,
+        # and actions are pipelined so handlers don't wait on Asterisk
+        self.ami = ThreadedAMIClient(AMIClient())
+        
+        # Register event handlers
+        self.ami.register_event('Newchannel', self.handle_new_call)
+        self.ami.register_event('Hangup', self.handle_hangup)
+        
+        self.ami.start()
 
     def handle_new_call(self, event):
         # Handle incoming calls
@@ -155,56 +293,130 @@ class VoicemailServer:
         project = self.find_project_for_did(did)
         
         if project:
-            # Play greeting
-            greeting = project.get('greetingUrl', 'default-greeting.wav')
-            self.ami.command(f'Playback({greeting})')
-            
-            # Start recording
-            recording_path = f"{VOICEMAIL_DIR}/{uuid.uuid4()}.wav"
-            self.ami.command(f'Monitor(wav,{recording_path},m)')
+            # The dialplan plays the greeting, since AMI has no Playback action.
+            # Start recording; Monitor adds the .wav extension itself
+            recording_path = f"{VOICEMAIL_DIR}/{uuid.uuid4()}"
+            self.ami.send_action('Monitor', Channel=channel, File=recording_path, Format='wav', Mix='true')
 
     def handle_hangup(self, event):
         # Stop recording and process voicemail
         channel = event.get('Channel')
-        self.ami.command(f'StopMonitor({channel})')
+        self.ami.send_action('StopMonitor', Channel=channel)
         
         # Process the recorded voicemail
         # Add to project's voicemail list
         # Send notifications
 
     def setup_did_monitoring(self):
-        # Check DIDs daily for expiration and 90-day alerts
+        self.schedule_did_monitor()
+
+    def schedule_did_monitor(self):
+        # One date job for the next due DID event instead of a daily scan of every DID
+        if self.scheduler is None:
+            return
+        due = self.did_schedule.next_due()
+        if due is None:
+            if self.scheduler.get_job('did_monitor'):
+                self.scheduler.remove_job('did_monitor')
+            return
         self.scheduler.add_job(
             self.monitor_dids,
-            'interval',
-            days=1,
+            'date',
+            run_date=max(due, datetime.now()),
             id='did_monitor',
+            misfire_grace_time=None,
+            replace_existing=True
+        )
+
+    def setup_audio_purge(self):
+        # Drop original WAVs once their compressed copy is past the grace period
+        if AUDIO_STORAGE == 'wav':
+            return
+        self.scheduler.add_job(
+            self.purge_audio_originals,
+            'interval',
+            hours=1,
+            id='audio_purge',
             replace_existing=True
         )
 
+    def purge_audio_originals(self):
+        try:
+            removed = purge_originals(VOICEMAIL_DIR)
+            if removed:
+                print(f"Removed {removed} original recordings past the grace period")
+        except Exception as e:
+            print(f"Audio purge failed: {str(e)}")
+
+    def setup_retention(self):
+        # Delete voicemails older than settings.retentionDays; runs never overlap
+        self.scheduler.add_job(
+            self.enforce_retention,
+            'interval',
+            hours=1,
+            id='retention',
+            max_instances=1,
+            replace_existing=True
+        )
+
+    def enforce_retention(self):
+        try:
+            # The settings form may send the number as a string
+            days = float(self.settings.get('retentionDays') or 0)
+        except (TypeError, ValueError):
+            return
+        if days <= 0:
+            return
+        try:
+            report = purge_expired(self.store, VOICEMAIL_DIR, days, index=self.search, on_deleted=self.forget_voicemails)
+            self.retention_report = dict(report, finishedAt=time.time())
+            if report['voicemails']:
+                print(f"Retention removed {report['voicemails']} voicemails, {report['files']} files, {report['bytes']} bytes")
+        except Exception as e:
+            print(f"Retention run failed: {str(e)}")
+
+    def forget_voicemails(self, voicemail_ids):
+        # Our own store deletes aren't replayed by sync_from_store, so drop them from memory here
+        voicemail_ids = set(voicemail_ids)
+        with self.sync_lock:
+            for project in self.projects:
+                voicemails = project.get('voicemails', [])
+                if any(vm['id'] in voicemail_ids for vm in voicemails):
+                    project['voicemails'] = [vm for vm in voicemails if vm['id'] not in voicemail_ids]
+
     def monitor_dids(self):
-        today = datetime.now()
-        
-        for project in self.projects:
-            for did in project.get('dids', []):
-                # Check end date
-                if did.get('endDate'):
-                    end_date = parse(did['endDate'])
-                    if end_date <= today:
-                        self.archive_did(project['id'], did['number'])
-                        continue
-                
-                # Check 90-day counter
-                start_date = parse(did['startDate'])
-                days_active = (today - start_date).days
-                
-                if days_active >= 90:
-                    self.send_did_alert(project['id'], did['number'], days_active)
+        now = datetime.now()
+        try:
+            for event in self.did_schedule.pop_due(now):
+                try:
+                    self.handle_did_event(event, now)
+                except Exception as e:
+                    # Re-queued with backoff; without it a failed alert or archive was lost until the next restart
+                    delay = self.did_schedule.retry(event, now)
+                    retry = f", retrying in {delay}" if delay else ""
+                    print(f"DID {event['kind']} for {event['number']} failed{retry}: {str(e)}")
+        finally:
+            self.schedule_did_monitor()
+
+    def handle_did_event(self, event, now):
+        if event['kind'] == 'archive':
+            self.archive_did(event['projectId'], event['number'])
+            return
+        project = find_project(event['projectId'])
+        did_obj = project and next((d for d in project.get('dids', []) if did_number(d) == event['number']), None)
+        start_date = parse_date(did_obj.get('startDate')) if isinstance(did_obj, dict) else None
+        if start_date is not None:
+            self.send_did_alert(event['projectId'], event['number'], (now - start_date).days)
+            self.did_schedule.mark_alert_sent(event['projectId'], event['number'])
 
     def send_did_alert(self, project_id, did, days_active):
         project = next((p for p in self.projects if p['id'] == project_id), None)
         if not project:
             return
+        # DIDs are a list, so look the DID up by number
+        did_obj = next((d for d in project.get('dids', []) if did_number(d) == did), None)
+        if not isinstance(did_obj, dict):
+            return
             
         # Send email alert
         subject = f"DID Alert: {did} active for {days_active} days"
@@ -214,7 +426,7 @@ class VoicemailServer:
         
         Project: {project['name']}
         DID: {did}
-        Active Since: {project['dids'][did]['startDate']}
+        Active Since: {did_obj['startDate']}
         """
         
         # Send email using your preferred method
@@ -227,10 +439,10 @@ class VoicemailServer:
         return ''
 
     def find_project_for_did(self, did):
-        for project in self.projects:
-            if did in project.get('dids', []):
-                return project
-        return None
+        project_id = self.did_index.get(did)
+        if project_id is None:
+            return None
+        return next((p for p in self.projects if p['id'] == project_id), None)
 
     def send_email_alert(self, subject, body):
         # Implement email sending logic here
@@ -241,39 +453,108 @@ class VoicemailServer:
         if not project:
             return
             
-        did_obj = next((d for d in project['dids'] if d['number'] == did), None)
+        did_obj = next((d for d in project['dids'] if did_number(d) == did), None)
         if not did_obj:
             return
             
-        # Archive DID
+        # Archive DID; the store is written first so a failed write leaves the DID active for the retry
+        did_obj = dict(did_obj)
         did_obj['archived'] = True
         did_obj['archiveDate'] = datetime.now().isoformat()
+        self.store.archive_did(project_id, did_obj)
         
         # Remove from active DIDs
-        project['dids'] = [d for d in project['dids'] if d['number'] != did]
+        project['dids'] = [d for d in project['dids'] if did_number(d) != did]
         
         # Add to archived DIDs
         if 'archivedDids' not in project:
             project['archivedDids'] = []
         project['archivedDids'].append(did_obj)
         
-        self.save_projects()
+        self.update_dids(project_id, removed=[did])
 
     def remove_asterisk_did(self, did):
         # Implement logic to remove DID from Asterisk
         pass
 
+    def import_dids(self, project_id, dids):
+        # Called by DID import jobs; checks the global index and adds the batch in one store write
+        with self.sync_lock:
+            project = next((p for p in self.projects if p['id'] == project_id), None)
+            if not project:
+                raise KeyError(f"Project {project_id} not found")
+            new_dids = [d for d in dids if d['number'] not in self.did_index]
+            if new_dids:
+                project.setdefault('dids', []).extend(new_dids)
+                self.store.add_dids(project_id, new_dids)
+                self.update_dids(project_id, added=new_dids)
+        return new_dids
+
     def setup_asterisk_did(self, project_id, did):
         # Implement logic to setup DID in Asterisk
         pass
 
+def find_project(id):
+    return next((p for p in server.projects if p['id'] == id), None)
+
 # API Routes
 @app.route('/api/projects', methods=['GET'])
 @require_auth
 @rate_limit('get_projects')
 def get_projects():
     audit_log('get_projects', request.user['id'], 'projects', None, 'success')
-    return jsonify(server.projects)
+    if request.args.get('view') == 'full':
+        return jsonify(server.projects)
+
+    etag = server.projects_etag()
+    status, body = projects_response(server.projects, etag, request.headers.get('If-None-Match'), server.summary_cache)
+    response = Response(body, status=status, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/projects/<id>/voicemails', methods=['GET'])
+@require_auth
+@rate_limit('get_project_voicemails')
+def get_project_voicemails(id):
+    if not find_project(id):
+        return jsonify({"error": "Project not found"}), 404
+    try:
+        voicemails, next_cursor = server.store.list_voicemails(
+            {'project_id': id},
+            limit=page_size(request.args),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"voicemails": server.with_dnc(voicemails), "nextCursor": next_cursor})
+
+@app.route('/api/projects/<id>/notes', methods=['GET'])
+@require_auth
+@rate_limit('get_project_notes')
+def get_project_notes(id):
+    project = find_project(id)
+    if not project:
+        return jsonify({"error": "Project not found"}), 404
+    try:
+        notes, next_cursor = paginate(project.get('notes', []), request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor or limit"}), 400
+    return jsonify({"notes": notes, "nextCursor": next_cursor})
+
+@app.route('/api/projects/<id>/dids', methods=['GET'])
+@require_auth
+@rate_limit('get_project_dids')
+def get_project_dids(id):
+    project = find_project(id)
+    if not project:
+        return jsonify({"error": "Project not found"}), 404
+    key = 'archivedDids' if request.args.get('archived') == 'true' else 'dids'
+    try:
+        dids, next_cursor = paginate(project.get(key, []), request.args)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor or limit"}), 400
+    return jsonify({"dids": dids, "nextCursor": next_cursor})
 
 @app.route('/api/projects', methods=['POST'])
 @require_auth
@@ -283,26 +564,50 @@ def create_project():
     project['id'] = str(uuid.uuid4())
     project['voicemails'] = []
     server.projects.append(project)
-    server.save_projects()
+    server.store.add_project(project)
+    if project.get('dids'):
+        server.update_dids(project['id'], added=project['dids'])
     return jsonify(project)
 
 @app.route('/api/projects/<id>', methods=['PATCH'])
 def update_project(id):
-    project = next((p for p in server.projects if p['id'] == id), None)
+    project = find_project(id)
     if not project:
         return jsonify({"error": "Project not found"}), 404
         
     updates = request.json
+    old_numbers = [did_number(d) for d in project.get('dids', [])]
     project.update(updates)
-    server.save_projects()
+    server.store.save_project(project, replace=[k for k in updates if k in COLLECTIONS])
+    if 'dids' in updates:
+        server.update_dids(id, added=project['dids'], removed=old_numbers)
     return jsonify(project)
 
 @app.route('/api/projects/<id>', methods=['DELETE'])
 def delete_project(id):
+    project = find_project(id)
     server.projects = [p for p in server.projects if p['id'] != id]
-    server.save_projects()
+    server.store.delete_project(id)
+    if project and project.get('dids'):
+        server.update_dids(id, removed=[did_number(d) for d in project['dids']])
     return jsonify({"success": True})
 
+@app.route('/api/metrics', methods=['GET'])
+@require_auth
+def get_metrics():
+    return jsonify({
+        "sql": pool_metrics(),
+        "numberCache": number_cache.stats(),
+        "dnc": server.dnc.stats(),
+        "rateLimit": dict(limiter.stats),
+        "tokenCache": dict(token_cache.stats),
+        "eventSubscribers": server.events.subscriber_count(),
+        # Written by the queue worker process; null until it has transcribed something
+        "transcription": read_metrics(TRANSCRIPTION_METRICS_FILE),
+        "retention": server.retention_report,
+        "ami": server.ami.metrics()
+    })
+
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
     return jsonify(server.settings)
@@ -323,9 +628,8 @@ def update_catch_all():
         server.settings['catchAllEnabled'] = data['enabled']
         server.save_settings()
         
-        # Update Asterisk system variable
-        ami_command = f"setvar CATCH_ALL_ENABLED {1 if data['enabled'] else 0}"
-        server.ami.command(ami_command)
+        # Update the Asterisk global variable; queued on the AMI connection rather than awaited here
+        server.ami.send_action('Setvar', Variable='CATCH_ALL_ENABLED', Value=1 if data['enabled'] else 0)
         
         return jsonify({"success": True})
     except Exception as e:
@@ -346,12 +650,101 @@ def update_catch_all_greeting():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/voicemails', methods=['GET'])
+@require_auth
+@rate_limit('list_voicemails')
+def list_voicemails():
+    try:
+        args = request.args
+        filters = {
+            'project_id': args.get('projectId'),
+            'did': args.get('did'),
+            'caller': args.get('caller'),
+            'since': args.get('since'),
+            'until': args.get('until'),
+            'is_new': {'true': True, 'false': False}.get(args.get('isNew', '').lower())
+        }
+        voicemails, next_cursor = server.store.list_voicemails(
+            filters,
+            limit=page_size(request.args),
+            cursor=args.get('cursor'),
+            descending=args.get('order', 'desc') != 'asc',
+            sort=args.get('sort', 'timestamp')
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"voicemails": server.with_dnc(voicemails), "nextCursor": next_cursor})
+
+@app.route('/api/voicemails/search', methods=['GET'])
+@require_auth
+@rate_limit('search_voicemails')
+def search_voicemails():
+    # Ranked full-text search over transcriptions and callers; "quoted phrases" match in order
+    try:
+        limit = page_size(request.args)
+        offset = max(0, int(request.args.get('cursor', 0)))
+        hits, has_more = server.search.search(
+            request.args.get('q', ''),
+            {'project_id': request.args.get('projectId'), 'did': request.args.get('did')},
+            limit=limit,
+            offset=offset
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Hits for voicemails that have since been removed from the store are dropped
+    stored = server.store.get_voicemails([hit['voicemailId'] for hit in hits])
+    voicemails = [
+        dict(stored[hit['voicemailId']], snippet=hit['snippet'], score=hit['score'])
+        for hit in hits if hit['voicemailId'] in stored
+    ]
+    return jsonify({
+        "voicemails": server.with_dnc(voicemails),
+        "nextCursor": str(offset + limit) if has_more else None
+    })
+
+@app.route('/api/events', methods=['GET'])
+@require_auth
+@rate_limit('events')
+def stream_events():
+    # Server-Sent Events: voicemail-created, did-archived, project-changed, projects-reloaded
+    last_event_id = request.headers.get('Last-Event-ID')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    subscriber = server.events.subscribe(last_event_id)
+
+    def stream():
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_sse(event)
+        finally:
+            server.events.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/voicemails/<id>/audio', methods=['GET'])
 def get_voicemail_audio(id):
-    audio_path = os.path.join(VOICEMAIL_DIR, f"{id}.wav")
-    if os.path.exists(audio_path):
-        return send_file(audio_path)
-    return jsonify({"error": "Voicemail not found"}), 404
+    # Picks the stored format the client accepts (?format= overrides), transcoding when none fits
+    try:
+        audio_path, mimetype = negotiate_audio(VOICEMAIL_DIR, id, request.accept_mimetypes, request.args.get('format'))
+        response = send_audio(audio_path, mimetype)
+    except FileNotFoundError:
+        return jsonify({"error": "Voicemail not found"}), 404
+    except TranscodeError as e:
+        return jsonify({"error": f"Transcoding failed: {str(e)}"}), 500
+    response.vary.add('Accept')
+    return response
 
 @app.route('/api/voicemails/<id>/notes', methods=['POST'])
 def add_note(id):
@@ -364,22 +757,9 @@ def add_to_dnc():
     try:
         phone = request.json['phoneNumber']
         
-        # Connect to remote SQL Server
-        conn = pymssql.connect(
-            server='your_server',
-            user='your_username',
-            password='your_password',
-            database='your_database'
-        )
-        
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO DNCSoftphone (PhoneNumber, DateAdded, AddedBy) VALUES (%s, GETDATE(), %s)",
-            (phone, "VOICEMAIL_SYSTEM")
-        )
-        
-        conn.commit()
-        conn.close()
+        number_lists.add_to_dnc(get_pool('dnc'), phone, "VOICEMAIL_SYSTEM")
+        server.dnc.add(phone)
+        number_cache.invalidate(('dnc', phone))
         
         return jsonify({"success": True})
     except Exception as e:
@@ -395,36 +775,17 @@ def add_voicemail_to_dnc(id):
         if not voicemail:
             return jsonify({"error": "Voicemail not found"}), 404
 
-        # Connect to SQL Server
-        conn = pymssql.connect(
-            server=os.environ.get('SQL_SERVER_HOST', 'your_server'),
-            user=os.environ.get('SQL_SERVER_USER', 'your_username'),
-            password=os.environ.get('SQL_SERVER_PASSWORD', 'your_password'),
-            database=os.environ.get('SQL_SERVER_DB', 'your_database')
-        )
-        
-        cursor = conn.cursor()
-        
         # Add to DNC with additional metadata
-        cursor.execute("""
-            INSERT INTO DNCSoftphone (
-                PhoneNumber, 
-                DateAdded, 
-                AddedBy, 
-                Source, 
-                VoicemailId, 
-                Notes
-            ) VALUES (%s, GETDATE(), %s, %s, %s, %s)
-        """, (
+        number_lists.add_to_dnc(
+            get_pool('dnc'),
             voicemail['caller'],
             request.user['id'],
-            'VOICEMAIL_SYSTEM',
-            voicemail['id'],
-            request.json.get('notes', '')
-        ))
-        
-        conn.commit()
-        conn.close()
+            source='VOICEMAIL_SYSTEM',
+            voicemail_id=voicemail['id'],
+            notes=request.json.get('notes', '')
+        )
+        server.dnc.add(voicemail['caller'])
+        number_cache.invalidate(('dnc', voicemail['caller']))
         
         # Log the action
         audit_log('add_to_dnc', request.user['id'], 'voicemail', id, 'success')
@@ -465,7 +826,7 @@ def share_voicemail(id):
         body = f"""A voicemail has been shared with you:
         
         From: {voicemail['caller']}
-        Duration: {voicemail['duration']}
+        Duration: {format_duration(voicemail)}
         Time: {voicemail['timestamp']}
         
         Listen to the attached audio file.
@@ -473,9 +834,14 @@ def share_voicemail(id):
         msg.attach(MIMEText(body, 'plain'))
         
         # Attach audio file
-        with open(f"{VOICEMAIL_DIR}/{id}.wav", 'rb') as f:
-            audio = MIMEAudio(f.read(), 'wav')
-            audio.add_header('Content-Disposition', 'attachment', filename=f'voicemail_{id}.wav')
+        stored = stored_audio(VOICEMAIL_DIR, id)
+        if not stored:
+            return jsonify({"error": "Recording not found"}), 404
+        audio_path = next(iter(stored.values()))
+        extension = os.path.splitext(audio_path)[1].lstrip('.')
+        with open(audio_path, 'rb') as f:
+            audio = MIMEAudio(f.read(), extension)
+            audio.add_header('Content-Disposition', 'attachment', filename=f'voicemail_{id}.{extension}')
             msg.attach(audio)
         
         # Send email
@@ -491,22 +857,22 @@ def share_voicemail(id):
 @app.route('/api/projects/<id>/dids', methods=['POST'])
 def add_did(id):
     try:
-        project = next((p for p in server.projects if p['id'] == id), None)
+        project = find_project(id)
         if not project:
             return jsonify({"error": "Project not found"}), 404
             
         did = request.json['did']
         
         # Check if DID exists in any other project
-        for p in server.projects:
-            if did in p.get('dids', []):
-                return jsonify({"error": "DID already exists in another project"}), 400
+        if did_number(did) in server.did_index:
+            return jsonify({"error": "DID already exists in another project"}), 400
                 
         if 'dids' not in project:
             project['dids'] = []
             
         project['dids'].append(did)
-        server.save_projects()
+        server.store.add_did(id, did)
+        server.update_dids(id, added=[did])
         return jsonify({"success": True, "did": did})
         
     except Exception as e:
@@ -515,15 +881,16 @@ def add_did(id):
 @app.route('/api/projects/<id>/dids/<did>', methods=['DELETE'])
 def remove_did(id, did):
     try:
-        project = next((p for p in server.projects if p['id'] == id), None)
+        project = find_project(id)
         if not project:
             return jsonify({"error": "Project not found"}), 404
             
-        if did not in project.get('dids', []):
+        if server.did_index.get(did) != id:
             return jsonify({"error": "DID not found in project"}), 404
             
-        project['dids'].remove(did)
-        server.save_projects()
+        project['dids'] = [d for d in project['dids'] if did_number(d) != did]
+        server.store.remove_did(id, did)
+        server.update_dids(id, removed=[did])
         return jsonify({"success": True})
         
     except Exception as e:
@@ -532,31 +899,62 @@ def remove_did(id, did):
 @app.route('/api/archive/number/<number>', methods=['POST'])
 def archive_number(number):
     try:
-        # Connect to archive database
-        conn = pymssql.connect(
-            server='your_archive_server',
-            user='your_username',
-            password='your_password',
-            database='your_archive_db'
-        )
-        
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO ArchivedNumbers 
-            (PhoneNumber, ArchivedDate, ArchivedBy, Reason) 
-            VALUES (%s, GETDATE(), %s, %s)
-            """,
-            (number, request.json.get('archivedBy', 'SYSTEM'), request.json.get('reason', ''))
+        number_lists.archive_number(
+            get_pool('archive'), number, request.json.get('archivedBy', 'SYSTEM'), request.json.get('reason', '')
         )
-        
-        conn.commit()
-        conn.close()
+        number_cache.invalidate(('archived', number))
         
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/dnc/bulk', methods=['POST'])
+@require_auth
+@rate_limit('add_to_dnc_bulk')
+def add_many_to_dnc():
+    try:
+        numbers = request.json.get('phoneNumbers')
+        if not isinstance(numbers, list) or not numbers:
+            return jsonify({"error": "phoneNumbers must be a non-empty list"}), 400
+        if len(numbers) > number_lists.BULK_MAX_NUMBERS:
+            return jsonify({"error": f"At most {number_lists.BULK_MAX_NUMBERS} numbers per request"}), 400
+
+        user_id = request.user['id']
+        notes = request.json.get('notes', '')
+        results, added = number_lists.add_many_to_dnc(get_pool('dnc'), numbers, user_id, notes)
+        for number in added:
+            server.dnc.add(number)
+            number_cache.invalidate(('dnc', number))
+
+        audit_log('add_to_dnc_bulk', user_id, 'numbers', f'{len(added)}/{len(numbers)}', 'success')
+        return jsonify({"success": True, "added": len(added), "results": results})
+    except Exception as e:
+        audit_log('add_to_dnc_bulk', request.user['id'], 'numbers', None, 'error')
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/archive/numbers', methods=['POST'])
+@require_auth
+@rate_limit('archive_numbers')
+def archive_numbers():
+    try:
+        numbers = request.json.get('numbers')
+        if not isinstance(numbers, list) or not numbers:
+            return jsonify({"error": "numbers must be a non-empty list"}), 400
+        if len(numbers) > number_lists.BULK_MAX_NUMBERS:
+            return jsonify({"error": f"At most {number_lists.BULK_MAX_NUMBERS} numbers per request"}), 400
+
+        archived_by = request.json.get('archivedBy') or request.user['id']
+        reason = request.json.get('reason', '')
+        results, added = number_lists.archive_numbers(get_pool('archive'), numbers, archived_by, reason)
+        for number in added:
+            number_cache.invalidate(('archived', number))
+
+        audit_log('archive_numbers', request.user['id'], 'numbers', f'{len(added)}/{len(numbers)}', 'success')
+        return jsonify({"success": True, "added": len(added), "results": results})
+    except Exception as e:
+        audit_log('archive_numbers', request.user['id'], 'numbers', None, 'error')
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/numbers/<number>/meta', methods=['GET'])
 def get_number_metadata(number):
     try:
@@ -570,54 +968,25 @@ def get_number_metadata(number):
             "history": []
         }
         
-        # Check archive status
-        archive_conn = pymssql.connect(
-            server='your_archive_server',
-            user='your_username',
-            password='your_password',
-            database='your_archive_db'
+        # Cached lookups; misses go to the archive and DNC databases concurrently
+        # The local DNC list answers without a query once it has loaded
+        dnc_loaded = server.dnc.loaded
+        archived = lookup_executor.submit(
+            number_cache.get_or_load, ('archived', number), lambda: number_lists.is_archived(get_pool('archive'), number)
         )
-        
-        cursor = archive_conn.cursor()
-        cursor.execute("SELECT TOP 1 1 FROM ArchivedNumbers WHERE PhoneNumber = %s", (number,))
-        meta["archived"] = cursor.fetchone() is not None
-        
-        # Check DNC status
-        dnc_conn = pymssql.connect(
-            server='your_dnc_server',
-            user='your_username',
-            password='your_password',
-            database='your_dnc_db'
-        )
-        
-        cursor = dnc_conn.cursor()
-        cursor.execute("SELECT TOP 1 1 FROM DNCSoftphone WHERE PhoneNumber = %s", (number,))
-        meta["dnc"] = cursor.fetchone() is not None
-        
-        # Get call history
-        cursor.execute(
-            """
-            SELECT TOP 10 
-                CallDate, 
-                CallType, 
-                Duration, 
-                Result
-            FROM CallHistory 
-            WHERE PhoneNumber = %s 
-            ORDER BY CallDate DESC
-            """, 
-            (number,)
+        if not dnc_loaded:
+            dnc = lookup_executor.submit(
+                number_cache.get_or_load, ('dnc', number), lambda: number_lists.is_dnc(get_pool('dnc'), number)
+            )
+        history = lookup_executor.submit(
+            number_cache.get_or_load,
+            ('history', number),
+            lambda: number_lists.call_history(get_pool('dnc'), number),
+            CALL_HISTORY_CACHE_TTL
         )
-        
-        meta["history"] = [
-            {
-                "date": row[0].isoformat(),
-                "type": row[1],
-                "duration": row[2],
-                "result": row[3]
-            }
-            for row in cursor.fetchall()
-        ]
+        meta["archived"] = archived.result()
+        meta["dnc"] = number in server.dnc if dnc_loaded else dnc.result()
+        meta["history"] = history.result()
         
         return jsonify(meta)
     except Exception as e:
@@ -626,7 +995,7 @@ def get_number_metadata(number):
 @app.route('/api/projects/<id>/notes', methods=['POST'])
 def add_project_note(id):
     try:
-        project = next((p for p in server.projects if p['id'] == id), None)
+        project = find_project(id)
         if not project:
             return jsonify({"error": "Project not found"}), 404
             
@@ -641,7 +1010,7 @@ def add_project_note(id):
         }
         
         project['notes'].append(note)
-        server.save_projects()
+        server.store.add_note(id, note)
         
         return jsonify({"success": True, "note": note})
     except Exception as e:
@@ -650,12 +1019,12 @@ def add_project_note(id):
 @app.route('/api/projects/<id>/notes/<note_id>', methods=['DELETE'])
 def delete_project_note(id, note_id):
     try:
-        project = next((p for p in server.projects if p['id'] == id), None)
+        project = find_project(id)
         if not project:
             return jsonify({"error": "Project not found"}), 404
             
         project['notes'] = [n for n in project.get('notes', []) if n['id'] != note_id]
-        server.save_projects()
+        server.store.delete_note(id, note_id)
         
         return jsonify({"success": True})
     except Exception as e:
@@ -667,17 +1036,18 @@ def add_bulk_dids(id):
         data = request.json
         dids = data['dids']
         
-        project = next((p for p in server.projects if p['id'] == id), None)
+        project = find_project(id)
         if not project:
             return jsonify({"error": "Project not found"}), 404
             
-        # Validate DIDs
-        existing_dids = set()
-        for p in server.projects:
-            existing_dids.update(d['number'] for d in p.get('dids', []))
-            
-        # Filter out existing DIDs
-        new_dids = [d for d in dids if d['number'] not in existing_dids]
+        # Filter out DIDs already routed to a project, and repeats within the request
+        new_dids = []
+        seen = set()
+        for d in dids:
+            if d['number'] in server.did_index or d['number'] in seen:
+                continue
+            seen.add(d['number'])
+            new_dids.append(d)
         
         if not new_dids:
             return jsonify({"error": "All DIDs already exist"}), 400
@@ -687,41 +1057,81 @@ def add_bulk_dids(id):
             project['dids'] = []
             
         project['dids'].extend(new_dids)
-        server.save_projects()
+        server.store.add_dids(id, new_dids)
+        server.update_dids(id, added=new_dids)
         
-        # Setup Asterisk for new DIDs
-        for did in new_dids:
-            server.setup_asterisk_did(id, did['number'])
+        # Asterisk setup runs on the provisioning pool rather than in this request
+        server.did_imports.provision_all(id, [did['number'] for did in new_dids])
         
         return jsonify({"success": True, "dids": new_dids})
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/projects/<id>/dids/import', methods=['POST'])
+@require_auth
+@rate_limit('import_dids')
+def import_dids(id):
+    # Streams a CSV or NDJSON upload (raw body or multipart "file") to disk and imports it in the background
+    if not find_project(id):
+        return jsonify({"error": "Project not found"}), 404
+    # Only touch request.files for multipart bodies; for anything else it would parse the whole body into memory
+    upload = None
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if not upload:
+            return jsonify({"error": "Multipart uploads need a 'file' field"}), 400
+    elif request.mimetype == 'application/x-www-form-urlencoded':
+        return jsonify({"error": "Send the file as the request body or as a multipart 'file'"}), 415
+    try:
+        fmt = import_format(request.content_type, upload.filename if upload else None, request.args.get('format'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    defaults = {k: request.args[k] for k in ('startDate', 'endDate') if request.args.get(k)}
+    try:
+        job = server.did_imports.start(id, upload.stream if upload else request.stream, fmt, defaults)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers['Location'] = f"/api/dids/imports/{job.id}"
+    return response
+
+@app.route('/api/dids/imports/<job_id>', methods=['GET'])
+@require_auth
+def get_did_import(job_id):
+    job = server.did_imports.get(job_id)
+    if not job:
+        return jsonify({"error": "Import job not found"}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/api/projects/<id>/dids/<did>/archive', methods=['POST'])
 def archive_did(id, did):
     try:
-        project = next((p for p in server.projects if p['id'] == id), None)
+        project = find_project(id)
         if not project:
             return jsonify({"error": "Project not found"}), 404
             
-        did_obj = next((d for d in project['dids'] if d['number'] == did), None)
+        did_obj = next((d for d in project.get('dids', []) if did_number(d) == did), None)
         if not did_obj:
             return jsonify({"error": "DID not found"}), 404
             
         # Archive DID
+        if isinstance(did_obj, str):
+            did_obj = {'number': did_obj}
         did_obj['archived'] = True
         did_obj['archiveDate'] = datetime.now().isoformat()
         
         # Remove from active DIDs
-        project['dids'] = [d for d in project['dids'] if d['number'] != did]
+        project['dids'] = [d for d in project['dids'] if did_number(d) != did]
         
         # Add to archived DIDs
         if 'archivedDids' not in project:
             project['archivedDids'] = []
         project['archivedDids'].append(did_obj)
         
-        server.save_projects()
+        server.store.archive_did(id, did_obj)
+        server.update_dids(id, removed=[did])
         
         # Remove from Asterisk
         server.remove_asterisk_did(did)
@@ -743,14 +1153,23 @@ def login():
     if not username or not password:
         return jsonify({"error": "Missing credentials"}), 400
         
-    # Generate JWT token
-    token = jwt.encode({
-        'id': username,
+    audit_log('login', username, 'auth', None, 'success')
+    return jsonify({"token": issue_token(username)})
+
+def issue_token(user_id):
+    # iat keeps sub-second precision so a password change can revoke everything issued before it
+    return jwt.encode({
+        'id': user_id,
+        'iat': time.time(),
         'exp': datetime.utcnow() + JWT_EXPIRATION
     }, JWT_SECRET_KEY)
-    
-    audit_log('login', username, 'auth', None, 'success')
-    return jsonify({"token": token})
+
+@app.route('/api/auth/logout', methods=['POST'])
+@require_auth
+def logout():
+    revoke_token(bearer_token())
+    audit_log('logout', request.user['id'], 'auth', None, 'success')
+    return jsonify({"success": True})
 
 @app.route('/api/auth/change-password', methods=['POST'])
 @require_auth
@@ -763,8 +1182,10 @@ def change_password():
         return jsonify({"error": "Invalid password format"}), 400
         
     # Update password in database
+    # Sign out every other session; the caller continues with the new token
+    token_cache.revoke_user(request.user['id'])
     audit_log('change_password', request.user['id'], 'auth', None, 'success')
-    return jsonify({"success": True})
+    return jsonify({"success": True, "token": issue_token(request.user['id'])})
 
 def start_server():
     global server
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# Concurrent playback throughput for recordings: full downloads per seek (old behaviour)
+# versus byte-range requests, served by a threaded local server.
+# Usage: python tests/bench_audio.py [clients] [seeks_per_client] [file_mb]
+import os
+import sys
+import time
+import random
+import logging
+import shutil
+import tempfile
+import threading
+import http.client
+from flask import Flask, send_file
+from werkzeug.serving import make_server
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+from audio_store import send_audio
+
+CHUNK = 256 * 1024
+
+def serve(path):
+	app = Flask(__name__)
+	app.add_url_rule('/legacy', 'legacy', lambda: send_file(path, conditional=False, etag=False))
+	app.add_url_rule('/audio', 'audio', lambda: send_audio(path))
+	logging.getLogger('werkzeug').setLevel(logging.ERROR)
+	server = make_server('127.0.0.1', 0, app, threaded=True)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	return server
+
+def client(port, path, seeks, size, totals, lock):
+	conn = http.client.HTTPConnection('127.0.0.1', port)
+	received = requests = 0
+	for _ in range(seeks):
+		headers = {}
+		if path == '/audio':
+			start = random.randrange(0, size - CHUNK)
+			headers['Range'] = f'bytes={start}-{start + CHUNK - 1}'
+		conn.request('GET', path, headers=headers)
+		response = conn.getresponse()
+		received += len(response.read())
+		requests += 1
+	conn.close()
+	with lock:
+		totals['bytes'] += received
+		totals['requests'] += requests
+
+def run(port, path, clients, seeks, size):
+	totals = {'bytes': 0, 'requests': 0}
+	lock = threading.Lock()
+	threads = [threading.Thread(target=client, args=(port, path, seeks, size, totals, lock)) for _ in range(clients)]
+	start = time.perf_counter()
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	elapsed = time.perf_counter() - start
+	print(f"{path:<8} {totals['requests'] / elapsed:8.1f} seeks/s  {totals['bytes'] / elapsed / 1e6:8.1f} MB/s  "
+		f"{elapsed / seeks * 1000:7.1f} ms per seek per client")
+
+if __name__ == '__main__':
+	clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+	seeks = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+	size = int(float(sys.argv[3]) * 1024 * 1024) if len(sys.argv) > 3 else 5 * 1024 * 1024
+
+	test_dir = tempfile.mkdtemp()
+	try:
+		path = os.path.join(test_dir, 'voicemail.wav')
+		with open(path, 'wb') as f:
+			f.write(os.urandom(size))
+		server = serve(path)
+		print(f"{clients} clients x {seeks} seeks on a {size / 1024 / 1024:.1f} MB recording")
+		run(server.server_port, '/legacy', clients, seeks, size)
+		run(server.server_port, '/audio', clients, seeks, size)
+		server.shutdown()
+	finally:
+		shutil.rmtree(test_dir, ignore_errors=True)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Per-request cost of require_auth with and without the verified-token cache.
+# Usage: python tests/bench_auth.py [requests]
+import os
+import sys
+import time
+import jwt
+from datetime import datetime, timedelta
+from flask import Flask, jsonify
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+import security_config
+from security_config import TokenCache, require_auth, JWT_SECRET_KEY
+
+def bench(label, requests, cache_size):
+	security_config.token_cache = TokenCache(maxsize=cache_size)
+	app = Flask(__name__)
+
+	@app.route('/bare')
+	def bare():
+		return jsonify({})
+
+	@app.route('/auth')
+	@require_auth
+	def authed():
+		return jsonify({})
+
+	token = jwt.encode({'id': 'bench', 'iat': time.time(), 'exp': datetime.utcnow() + timedelta(hours=1)}, JWT_SECRET_KEY)
+	headers = {'Authorization': f'Bearer {token}'}
+	client = app.test_client()
+
+	timings = {}
+	for path in ('/bare', '/auth'):
+		client.get(path, headers=headers)
+		start = time.perf_counter()
+		for _ in range(requests):
+			client.get(path, headers=headers)
+		timings[path] = (time.perf_counter() - start) / requests * 1e6
+	overhead = timings['/auth'] - timings['/bare']
+	print(f"{label:<10} bare {timings['/bare']:8.1f} us  auth {timings['/auth']:8.1f} us  overhead {overhead:7.1f} us/request")
+
+	# The auth check alone, without Flask's request handling
+	with app.test_request_context('/auth', headers=headers):
+		check = require_auth(lambda: None)
+		start = time.perf_counter()
+		for _ in range(requests):
+			check()
+		print(f"{'':<10} require_auth alone {(time.perf_counter() - start) / requests * 1e6:7.1f} us/call")
+
+if __name__ == '__main__':
+	requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+	bench('no cache', requests, 0)
+	bench('cached', requests, 10000)
@@ -0,0 +1,86 @@
+import asyncio
+
+class FakeAMIServer:
+	# A local stand-in for Asterisk's manager port: it checks logins, answers actions (optionally after
+	# a per-action Delay header, so replies can come back out of order), pushes events and drops clients.
+	def __init__(self, username='admin', secret='password'):
+		self.username = username
+		self.secret = secret
+		self.actions = []
+		self.logins = 0
+		self.writers = []
+		self.server = None
+		self.port = None
+
+	async def start(self, port=0):
+		self.server = await asyncio.start_server(self.handle, '127.0.0.1', port)
+		self.port = self.server.sockets[0].getsockname()[1]
+		return self
+
+	async def stop(self):
+		self.drop_clients()
+		self.server.close()
+		await self.server.wait_closed()
+
+	def drop_clients(self):
+		for writer in self.writers:
+			writer.close()
+		self.writers = []
+
+	def send_event(self, name, **fields):
+		for writer in self.writers:
+			self.write(writer, dict({'Event': name}, **fields))
+
+	def write(self, writer, message):
+		writer.write(("".join(f"{k}: {v}\r\n" for k, v in message.items()) + "\r\n").encode())
+
+	async def handle(self, reader, writer):
+		writer.write(b"Asterisk Call Manager/5.0.1\r\n")
+		logged_in = False
+		try:
+			while True:
+				action = {}
+				while True:
+					line = await reader.readline()
+					if not line:
+						return
+					line = line.decode().rstrip('\r\n')
+					if not line:
+						break
+					key, _, value = line.partition(': ')
+					action[key] = value
+				if action.get('Action') == 'Login':
+					logged_in = action.get('Username') == self.username and action.get('Secret') == self.secret
+					if logged_in:
+						self.logins += 1
+						self.writers.append(writer)
+						self.write(writer, {'Response': 'Success', 'ActionID': action['ActionID'], 'Message': 'Authentication accepted'})
+					else:
+						self.write(writer, {'Response': 'Error', 'ActionID': action['ActionID'], 'Message': 'Authentication failed'})
+					continue
+				self.actions.append(action)
+				asyncio.ensure_future(self.respond(writer, action))
+		finally:
+			writer.close()
+
+	async def respond(self, writer, action):
+		await asyncio.sleep(float(action.get('Delay', 0)))
+		if writer.is_closing():
+			return
+		action_id = action['ActionID']
+		name = action['Action']
+		if name == 'Command':
+			# Old-style command output, as sent by Asterisk before 14
+			writer.write(
+				f"Response: Follows\r\nPrivilege: Command\r\nActionID: {action_id}\r\n"
+				f"Output of {action['Command']}\nsecond line\n--END COMMAND--\r\n\r\n".encode()
+			)
+		elif name == 'CoreShowChannels':
+			self.write(writer, {'Response': 'Success', 'ActionID': action_id, 'EventList': 'start'})
+			for channel in ('SIP/100-1', 'SIP/200-2'):
+				self.write(writer, {'Event': 'CoreShowChannel', 'ActionID': action_id, 'Channel': channel})
+			self.write(writer, {'Event': 'CoreShowChannelsComplete', 'ActionID': action_id, 'EventList': 'Complete'})
+		elif name == 'Fail':
+			self.write(writer, {'Response': 'Error', 'ActionID': action_id, 'Message': 'Permission denied'})
+		elif name != 'Ignore':
+			self.write(writer, {'Response': 'Success', 'ActionID': action_id, 'Echo': action.get('Value', '')})
@@ -0,0 +1,12 @@
+class FakeClock:
+	# A monotonic clock that only moves when told to; sleep() records the wait and advances time
+	def __init__(self, now=0.0):
+		self.now = now
+		self.sleeps = []
+
+	def __call__(self):
+		return self.now
+
+	def sleep(self, seconds):
+		self.sleeps.append(seconds)
+		self.now += seconds
@@ -0,0 +1,72 @@
+import re
+import sqlite3
+from datetime import datetime
+
+# Runs the T-SQL the server sends to SQL Server against SQLite, enough for the DNC and archive queries
+TOP = re.compile(r'\bSELECT\s+TOP\s+(\d+)\b', re.IGNORECASE)
+# Table hints such as WITH (UPDLOCK, HOLDLOCK); a locking read takes SQLite's write lock instead,
+# which holds it until commit the way HOLDLOCK does
+HINTS = re.compile(r'\bWITH\s*\(\s*[A-Z]+(\s*,\s*[A-Z]+)*\s*\)', re.IGNORECASE)
+
+# DATETIME columns come back as datetime objects, as they do from pymssql
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+def translate(sql):
+	sql = sql.replace('%s', '?').replace('GETDATE()', 'CURRENT_TIMESTAMP')
+	sql = HINTS.sub('', sql)
+	match = TOP.search(sql)
+	if match:
+		sql = TOP.sub('SELECT', sql, count=1).rstrip().rstrip(';') + f' LIMIT {match.group(1)}'
+	return sql
+
+class ShimCursor:
+	def __init__(self, cursor):
+		self._cursor = cursor
+
+	def execute(self, sql, params=()):
+		if HINTS.search(sql) and not self._cursor.connection.in_transaction:
+			self._cursor.execute("BEGIN IMMEDIATE")
+		self._cursor.execute(translate(sql), params)
+		return self
+
+	def executemany(self, sql, seq):
+		self._cursor.executemany(translate(sql), seq)
+		return self
+
+	def __getattr__(self, name):
+		return getattr(self._cursor, name)
+
+class ShimConnection:
+	def __init__(self, path):
+		self._conn = sqlite3.connect(path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+		self.closed = False
+
+	def cursor(self):
+		if self.closed:
+			raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+		return ShimCursor(self._conn.cursor())
+
+	def commit(self):
+		self._conn.commit()
+
+	def rollback(self):
+		self._conn.rollback()
+
+	def close(self):
+		self.closed = True
+		self._conn.close()
+
+def connector(path, schema=()):
+	# Returns a connect() for ConnectionPool; schema statements run once against the file
+	conn = sqlite3.connect(path)
+	for statement in schema:
+		conn.execute(statement)
+	conn.commit()
+	conn.close()
+	return lambda: ShimConnection(path)
+
+SCHEMA = (
+	"CREATE TABLE IF NOT EXISTS DNCSoftphone (PhoneNumber TEXT, DateAdded TEXT, AddedBy TEXT, Source TEXT, VoicemailId TEXT, Notes TEXT)",
+	"CREATE TABLE IF NOT EXISTS ArchivedNumbers (PhoneNumber TEXT, ArchivedDate TEXT, ArchivedBy TEXT, Reason TEXT)",
+	"CREATE TABLE IF NOT EXISTS CallHistory (PhoneNumber TEXT, CallDate DATETIME, CallType TEXT, Duration INTEGER, Result TEXT)",
+)
@@ -0,0 +1,180 @@
+import unittest
+import asyncio
+import socket
+import threading
+import time
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ami_client import AMIClient, AMIError, AMIBusy, ThreadedAMIClient
+from fake_ami import FakeAMIServer
+
+def unused_port():
+	with socket.socket() as s:
+		s.bind(('127.0.0.1', 0))
+		return s.getsockname()[1]
+
+async def wait_until(condition, timeout=5):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		if time.monotonic() > deadline:
+			raise AssertionError("Timed out waiting for condition")
+		await asyncio.sleep(0.01)
+
+class TestAMIClient(unittest.TestCase):
+	def run_with_server(self, scenario, **client_args):
+		async def main():
+			fake = await FakeAMIServer().start()
+			client_args.setdefault('reconnect_min', 0.01)
+			client_args.setdefault('reconnect_max', 0.05)
+			client = AMIClient('127.0.0.1', fake.port, 'admin', 'password', **client_args)
+			await client.start()
+			try:
+				return await scenario(fake, client)
+			finally:
+				await client.close()
+				await fake.stop()
+		return asyncio.run(main())
+
+	def test_pipelined_actions_are_matched_by_action_id(self):
+		async def scenario(fake, client):
+			# Replies arrive in reverse order of sending
+			responses = await asyncio.gather(*(
+				client.send_action('Echo', Value=str(i), Delay=str(0.05 * (3 - i))) for i in range(4)
+			))
+			self.assertEqual([r['Echo'] for r in responses], ['0', '1', '2', '3'])
+			# All four were on the wire before the first reply came back
+			self.assertEqual(len({a['ActionID'] for a in fake.actions}), 4)
+			metrics = client.metrics()
+			self.assertEqual((metrics['sent'], metrics['responses'], metrics['inFlight']), (4, 4, 0))
+			self.assertTrue(metrics['connected'])
+			self.assertGreaterEqual(metrics['rttMs']['max'], 150)
+		self.run_with_server(scenario)
+
+	def test_command_output_errors_and_event_lists(self):
+		async def scenario(fake, client):
+			response = await client.command('core show uptime')
+			self.assertEqual(response['Output'], 'Output of core show uptime\nsecond line')
+			with self.assertRaises(AMIError) as raised:
+				await client.send_action('Fail')
+			self.assertEqual(str(raised.exception), 'Permission denied')
+			response = await client.send_action('CoreShowChannels')
+			self.assertEqual([e['Channel'] for e in response['events']], ['SIP/100-1', 'SIP/200-2'])
+			self.assertEqual(client.metrics()['errors'], 1)
+		self.run_with_server(scenario)
+
+	def test_events_fan_out_to_handlers(self):
+		received = []
+		def on_hangup(event):
+			received.append(('sync', event['Channel']))
+		async def on_any(event):
+			received.append(('async', event['Event']))
+
+		async def scenario(fake, client):
+			await client.send_action('Ping')
+			fake.send_event('Hangup', Channel='SIP/100-1')
+			fake.send_event('Newchannel', Channel='SIP/200-2')
+			await wait_until(lambda: len(received) == 3)
+			self.assertEqual(sorted(received), [('async', 'Hangup'), ('async', 'Newchannel'), ('sync', 'SIP/100-1')])
+
+		def register(fake, client):
+			client.register_event('Hangup', on_hangup)
+			client.register_event('*', on_any)
+			return scenario(fake, client)
+		self.run_with_server(register)
+
+	def test_reconnects_after_the_connection_drops(self):
+		async def scenario(fake, client):
+			await client.send_action('Ping')
+			lost = asyncio.ensure_future(client.send_action('Ignore'))
+			await wait_until(lambda: len(fake.actions) == 2)
+			fake.drop_clients()
+			# An action that was already written fails instead of being silently resent
+			with self.assertRaises(ConnectionError):
+				await lost
+			response = await client.send_action('Echo', Value='back')
+			self.assertEqual(response['Echo'], 'back')
+			self.assertEqual(fake.logins, 2)
+			self.assertEqual(client.metrics()['connects'], 2)
+		self.run_with_server(scenario)
+
+	def test_timeouts_and_full_queue(self):
+		async def scenario(fake, client):
+			with self.assertRaises(AMIError):
+				await client.send_action('Ignore', timeout=0.05)
+			self.assertEqual(client.metrics()['timeouts'], 1)
+		self.run_with_server(scenario)
+
+		async def unreachable():
+			client = AMIClient('127.0.0.1', unused_port(), max_queue=1, reconnect_min=0.01, reconnect_max=0.05)
+			await client.start()
+			try:
+				queued = asyncio.ensure_future(client.send_action('Ping', timeout=5))
+				await asyncio.sleep(0)
+				with self.assertRaises(AMIBusy):
+					await client.send_action('Ping')
+				self.assertEqual(client.metrics()['queueDepth'], 1)
+				await wait_until(lambda: client.metrics()['reconnectAttempts'] >= 2)
+				self.assertFalse(client.metrics()['connected'])
+			finally:
+				await client.close()
+			with self.assertRaises(ConnectionError):
+				await queued
+		asyncio.run(unreachable())
+
+	def test_actions_queued_while_disconnected_go_out_on_connect(self):
+		async def main():
+			port = unused_port()
+			client = AMIClient('127.0.0.1', port, reconnect_min=0.01, reconnect_max=0.05)
+			await client.start()
+			pending = asyncio.ensure_future(client.send_action('Echo', Value='late'))
+			await asyncio.sleep(0.05)
+			fake = await FakeAMIServer().start(port)
+			try:
+				self.assertEqual((await pending)['Echo'], 'late')
+			finally:
+				await client.close()
+				await fake.stop()
+		asyncio.run(main())
+
+	def test_bad_login_is_retried(self):
+		async def scenario(fake, client):
+			await wait_until(lambda: client.metrics()['reconnectAttempts'] >= 2)
+			self.assertIn('Authentication failed', client.metrics()['lastError'])
+			self.assertEqual(fake.logins, 0)
+		async def main():
+			fake = await FakeAMIServer(secret='other').start()
+			client = AMIClient('127.0.0.1', fake.port, 'admin', 'password', reconnect_min=0.01, reconnect_max=0.05)
+			await client.start()
+			try:
+				await scenario(fake, client)
+			finally:
+				await client.close()
+				await fake.stop()
+		asyncio.run(main())
+
+class TestThreadedAMIClient(unittest.TestCase):
+	def test_actions_from_other_threads(self):
+		fake_loop = asyncio.new_event_loop()
+		fake = fake_loop.run_until_complete(FakeAMIServer().start())
+		fake_thread = threading.Thread(target=fake_loop.run_forever, daemon=True)
+		fake_thread.start()
+
+		client = ThreadedAMIClient(AMIClient('127.0.0.1', fake.port, 'admin', 'password'))
+		client.start()
+		try:
+			futures = [client.send_action('Setvar', Variable='CATCH_ALL_ENABLED', Value=str(i)) for i in range(10)]
+			self.assertEqual([f.result(timeout=5)['Echo'] for f in futures], [str(i) for i in range(10)])
+			self.assertIn('Output of', client.command('core show version').result(timeout=5)['Output'])
+			self.assertEqual(client.metrics()['responses'], 11)
+		finally:
+			client.close()
+			asyncio.run_coroutine_threadsafe(fake.stop(), fake_loop).result(timeout=5)
+			fake_loop.call_soon_threadsafe(fake_loop.stop)
+			fake_thread.join()
+			fake_loop.close()
+
+if __name__ == '__main__':
+	unittest.main()
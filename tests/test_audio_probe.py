@@ -0,0 +1,114 @@
+import unittest
+import os
+import shutil
+import struct
+import tempfile
+import wave
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+from audio_probe import probe_duration, audio_duration, backfill_durations, ProbeError
+from project_store import JsonProjectStore, SqliteProjectStore
+
+def ogg_page(granule, packet=b''):
+	# Page header without a valid CRC; the probe never checks it
+	return b'OggS' + bytes([0, 0]) + struct.pack('<qIII', granule, 1, 0, 0) + bytes([1, len(packet)]) + packet
+
+class TestAudioProbe(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def write(self, name, data):
+		path = os.path.join(self.test_dir, name)
+		with open(path, 'wb') as f:
+			f.write(data)
+		return path
+
+	def write_wav(self, name, seconds, rate=8000):
+		path = os.path.join(self.test_dir, name)
+		with wave.open(path, 'wb') as w:
+			w.setnchannels(1)
+			w.setsampwidth(2)
+			w.setframerate(rate)
+			w.writeframes(b'\0\0' * int(seconds * rate))
+		return path
+
+	def test_wav(self):
+		self.assertAlmostEqual(probe_duration(self.write_wav('a.wav', 2.5)), 2.5)
+
+	def test_wav_skips_extra_chunks(self):
+		with open(self.write_wav('a.wav', 1.25), 'rb') as f:
+			data = f.read()
+		# Insert an odd-sized LIST chunk between fmt and data
+		extra = b'LIST' + struct.pack('<I', 3) + b'abc\0'
+		data = data[:36] + extra + data[36:]
+		self.assertAlmostEqual(probe_duration(self.write('b.wav', data)), 1.25)
+
+	def test_wav_with_unset_data_length(self):
+		with open(self.write_wav('a.wav', 3), 'rb') as f:
+			data = bytearray(f.read())
+		# Asterisk leaves the data length at 0 until the recording is closed
+		data[40:44] = struct.pack('<I', 0)
+		self.assertAlmostEqual(probe_duration(self.write('b.wav', bytes(data))), 3)
+
+	def test_flac(self):
+		packed = (16000 << 44) | (0 << 41) | (15 << 36) | 48000
+		streaminfo = bytes(10) + struct.pack('>Q', packed) + bytes(16)
+		data = b'fLaC' + bytes([0x80, 0, 0, 34]) + streaminfo
+		self.assertAlmostEqual(probe_duration(self.write('a.flac', data)), 3)
+
+	def test_opus(self):
+		head = b'OpusHead' + bytes([1, 1]) + struct.pack('<HIhB', 312, 8000, 0, 0)
+		data = ogg_page(0, head) + ogg_page(-1, b'x') + ogg_page(48000 * 4 + 312) + ogg_page(-1)
+		self.assertAlmostEqual(probe_duration(self.write('a.ogg', data)), 4)
+
+	def test_vorbis(self):
+		head = b'\x01vorbis' + struct.pack('<IBIiii', 0, 1, 22050, 0, 0, 0) + bytes([0xb8, 1])
+		data = ogg_page(0, head) + ogg_page(22050 * 7)
+		self.assertAlmostEqual(probe_duration(self.write('a.ogg', data)), 7)
+
+	def test_truncated_ogg(self):
+		head = b'OpusHead' + bytes([1, 1]) + struct.pack('<HIhB', 312, 8000, 0, 0)
+		page = ogg_page(0, head)
+		for data in (b'OggS', page[:26], page[:27], page[:30], ogg_page(0, b'OpusHead\x01')):
+			with self.assertRaises(ProbeError):
+				probe_duration(self.write('a.ogg', data))
+		self.assertIsNone(audio_duration(self.write('b.ogg', b'OggS\0')))
+
+	def test_unsupported_files(self):
+		with self.assertRaises(ProbeError):
+			probe_duration(self.write('a.mp3', b'ID3\x04' + bytes(100)))
+		self.assertIsNone(audio_duration(self.write('b.wav', b'RIFF\0\0\0\0WAVE')))
+		self.assertIsNone(audio_duration(os.path.join(self.test_dir, 'missing.wav')))
+
+	def test_backfill(self):
+		voicemail_dir = os.path.join(self.test_dir, 'voicemails')
+		os.makedirs(voicemail_dir)
+		self.write_wav('voicemails/vm1.wav', 1.5)
+		self.write_wav('voicemails/vm2.wav', 4)
+		stores = [
+			JsonProjectStore(os.path.join(self.test_dir, 'projects.json')),
+			SqliteProjectStore(os.path.join(self.test_dir, 'projects.db'))
+		]
+		self.addCleanup(stores[1].close)
+		for store in stores:
+			with self.subTest(store=type(store).__name__):
+				store.add_project({'id': 'p1', 'voicemails': []})
+				store.add_voicemail('p1', {'id': 'vm1', 'timestamp': '2024-01-01', 'duration': '0:30'})
+				store.add_voicemail('p1', {'id': 'vm2', 'timestamp': '2024-01-02', 'duration': '0:30'})
+				store.add_voicemail('p1', {'id': 'vm3', 'timestamp': '2024-01-03', 'duration': '0:30'})
+
+				counts = backfill_durations(store, voicemail_dir, workers=2, batch_size=2)
+				self.assertEqual(counts, {'updated': 2, 'missing': 1})
+				voicemails = store.load_project('p1')['voicemails']
+				self.assertEqual([vm['id'] for vm in voicemails], ['vm1', 'vm2', 'vm3'])
+				self.assertEqual([vm['duration'] for vm in voicemails], [1.5, 4, '0:30'])
+
+				page, _ = store.list_voicemails(sort='duration')
+				self.assertEqual([vm['id'] for vm in page], ['vm2', 'vm1', 'vm3'])
+
+if __name__ == '__main__':
+	unittest.main()
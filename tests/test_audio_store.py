@@ -0,0 +1,175 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+import sys
+from flask import Flask
+from werkzeug.datastructures import MIMEAccept
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+import audio_store
+from audio_store import send_audio, negotiate_audio, compress_recording, purge_originals, TranscodeError
+
+# Stands in for ffmpeg: copies the input to the output with a marker prefix
+FAKE_FFMPEG = '''#!{python}
+import sys, shutil
+args = sys.argv[1:]
+src, dest = args[args.index('-i') + 1], args[-1]
+if open(src, 'rb').read(4) == b'FAIL':
+    sys.exit('invalid data')
+with open(dest, 'wb') as out:
+    out.write(('%s:' % args[args.index('-f') + 1]).encode())
+    out.write(open(src, 'rb').read())
+'''
+
+class TestSendAudio(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.test_dir, 'vm1.wav')
+		self.data = bytes(range(256)) * 400
+		with open(self.path, 'wb') as f:
+			f.write(self.data)
+
+		app = Flask(__name__)
+		app.add_url_rule('/audio', 'audio', lambda: send_audio(self.path))
+		self.client = app.test_client()
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def test_full_response_has_validators(self):
+		response = self.client.get('/audio')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data, self.data)
+		self.assertEqual(response.mimetype, 'audio/wav')
+		self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+		self.assertIn('immutable', response.headers['Cache-Control'])
+		self.assertFalse(response.headers['ETag'].startswith('W/'))
+
+	def test_range_request(self):
+		response = self.client.get('/audio', headers={'Range': 'bytes=1000-1999'})
+		self.assertEqual(response.status_code, 206)
+		self.assertEqual(response.data, self.data[1000:2000])
+		self.assertEqual(response.headers['Content-Range'], f'bytes 1000-1999/{len(self.data)}')
+
+	def test_conditional_request(self):
+		etag = self.client.get('/audio').headers['ETag']
+		response = self.client.get('/audio', headers={'If-None-Match': etag})
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response.data, b'')
+
+	def test_etag_changes_when_file_is_replaced(self):
+		etag = self.client.get('/audio').headers['ETag']
+		tmp = self.path + '.tmp'
+		with open(tmp, 'wb') as f:
+			f.write(self.data[:100])
+		os.replace(tmp, self.path)
+
+		# If-Range with the old tag must not splice ranges from two different files
+		response = self.client.get('/audio', headers={'Range': 'bytes=0-9', 'If-Range': etag})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(len(response.data), 100)
+		self.assertNotEqual(response.headers['ETag'], etag)
+
+	def test_missing_file(self):
+		os.remove(self.path)
+		with self.assertRaises(FileNotFoundError):
+			send_audio(self.path)
+
+class TestAudioStorage(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.ffmpeg = os.path.join(self.test_dir, 'ffmpeg')
+		with open(self.ffmpeg, 'w') as f:
+			f.write(FAKE_FFMPEG.format(python=sys.executable))
+		os.chmod(self.ffmpeg, 0o755)
+		self.original_ffmpeg = audio_store.FFMPEG
+		audio_store.FFMPEG = self.ffmpeg
+
+		self.voicemail_dir = os.path.join(self.test_dir, 'voicemails')
+		os.makedirs(self.voicemail_dir)
+		with open(os.path.join(self.voicemail_dir, 'vm1.wav'), 'wb') as f:
+			f.write(b'RIFFdata')
+
+	def tearDown(self):
+		audio_store.FFMPEG = self.original_ffmpeg
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def path(self, name):
+		return os.path.join(self.voicemail_dir, name)
+
+	def test_compress_keeps_original(self):
+		self.assertEqual(compress_recording(self.voicemail_dir, 'vm1', 'opus'), self.path('vm1.ogg'))
+		with open(self.path('vm1.ogg'), 'rb') as f:
+			self.assertEqual(f.read(), b'ogg:RIFFdata')
+		self.assertTrue(os.path.exists(self.path('vm1.wav')))
+		self.assertIsNone(compress_recording(self.voicemail_dir, 'vm1', 'wav'))
+
+	def test_failed_transcode_leaves_no_output(self):
+		with open(self.path('vm2.wav'), 'wb') as f:
+			f.write(b'FAIL')
+		with self.assertRaises(TranscodeError):
+			compress_recording(self.voicemail_dir, 'vm2', 'flac')
+		self.assertEqual(sorted(os.listdir(self.voicemail_dir)), ['vm1.wav', 'vm2.wav'])
+
+	def test_negotiation_prefers_accepted_stored_format(self):
+		compress_recording(self.voicemail_dir, 'vm1', 'opus')
+		anything = MIMEAccept([('*/*', 1)])
+		path, mimetype = negotiate_audio(self.voicemail_dir, 'vm1', anything)
+		self.assertEqual((os.path.basename(path), mimetype), ('vm1.ogg', 'audio/ogg'))
+
+		path, mimetype = negotiate_audio(self.voicemail_dir, 'vm1', MIMEAccept([('audio/wav', 1)]))
+		self.assertEqual((os.path.basename(path), mimetype), ('vm1.wav', 'audio/wav'))
+
+		path, _ = negotiate_audio(self.voicemail_dir, 'vm1', anything, requested='wav')
+		self.assertEqual(os.path.basename(path), 'vm1.wav')
+
+	def test_missing_format_is_transcoded_once_and_cached(self):
+		accept = MIMEAccept([('audio/flac', 1)])
+		path, mimetype = negotiate_audio(self.voicemail_dir, 'vm1', accept)
+		self.assertEqual(mimetype, 'audio/flac')
+		self.assertEqual(path, os.path.join(self.voicemail_dir, 'transcoded', 'vm1.flac'))
+		mtime = os.stat(path).st_mtime_ns
+
+		# A cache hit doesn't run ffmpeg again or change the file's ETag
+		audio_store.FFMPEG = os.path.join(self.test_dir, 'missing-ffmpeg')
+		again, _ = negotiate_audio(self.voicemail_dir, 'vm1', accept)
+		self.assertEqual(again, path)
+		self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+		with self.assertRaises(FileNotFoundError):
+			negotiate_audio(self.voicemail_dir, 'nope', accept)
+
+	def test_failed_transcode_releases_its_lock(self):
+		with open(self.path('vm2.wav'), 'wb') as f:
+			f.write(b'FAIL')
+		with self.assertRaises(TranscodeError):
+			negotiate_audio(self.voicemail_dir, 'vm2', MIMEAccept([('audio/flac', 1)]))
+		self.assertEqual(audio_store._transcode_locks, {})
+
+	def test_originals_purged_after_grace_period(self):
+		compress_recording(self.voicemail_dir, 'vm1', 'opus')
+		with open(self.path('vm2.wav'), 'wb') as f:
+			f.write(b'RIFF')
+		self.assertEqual(purge_originals(self.voicemail_dir, grace_days=1), 0)
+
+		old = time.time() - 2 * 86400
+		for name in ('vm1.wav', 'vm2.wav'):
+			os.utime(self.path(name), (old, old))
+		# vm2 has no compressed copy, so its WAV is the only one and stays
+		self.assertEqual(purge_originals(self.voicemail_dir, grace_days=1), 1)
+		self.assertEqual(sorted(os.listdir(self.voicemail_dir)), ['vm1.ogg', 'vm2.wav'])
+
+	def test_transcode_cache_is_bounded(self):
+		cache_dir = os.path.join(self.test_dir, 'cache')
+		os.makedirs(cache_dir)
+		for i, name in enumerate(('a.ogg', 'b.ogg', 'c.ogg')):
+			with open(os.path.join(cache_dir, name), 'wb') as f:
+				f.write(b'x' * 600 * 1024)
+			os.utime(os.path.join(cache_dir, name), (1000 + i, 1000 + i))
+		audio_store.prune_transcode_cache(cache_dir, max_mb=1, keep=os.path.join(cache_dir, 'a.ogg'))
+		self.assertEqual(sorted(os.listdir(cache_dir)), ['a.ogg'])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+from did_import import DidImporter, read_records, normalize_did, import_format
+
+def records(text, fmt):
+	return list(read_records(io.StringIO(text), fmt))
+
+class FakeDirectory:
+	# Stands in for the server: a global DID index and an Asterisk that tracks concurrent setups
+	def __init__(self, existing=()):
+		self.index = set(existing)
+		self.batches = []
+		self.provisioned = []
+		self.active = 0
+		self.peak = 0
+		self.lock = threading.Lock()
+
+	def add_batch(self, project_id, dids):
+		added = [d for d in dids if d['number'] not in self.index]
+		self.index.update(d['number'] for d in added)
+		self.batches.append(len(dids))
+		return added
+
+	def provision(self, project_id, number):
+		with self.lock:
+			self.active += 1
+			self.peak = max(self.peak, self.active)
+		time.sleep(0.002)
+		with self.lock:
+			self.active -= 1
+			self.provisioned.append(number)
+		if number.endswith('999'):
+			raise RuntimeError("trunk busy")
+
+class TestDidImport(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def test_csv_with_and_without_header(self):
+		rows = records("Number,EndDate,Notes\n+1555000001,2030-01-01,x\n\n+1555000002,,\n", 'csv')
+		self.assertEqual([(line, record) for line, record, _ in rows], [
+			(2, {'number': '+1555000001', 'endDate': '2030-01-01'}),
+			(4, {'number': '+1555000002'})
+		])
+		rows = records("+1555000001,2024-01-01\n", 'csv')
+		self.assertEqual(rows, [(1, {'number': '+1555000001', 'startDate': '2024-01-01'}, None)])
+
+	def test_ndjson_records(self):
+		rows = records('{"number": "+1555000001"}\n"+1555000002"\n[1]\nnot json\n', 'ndjson')
+		self.assertEqual([r[1] for r in rows[:2]], [{'number': '+1555000001'}, {'number': '+1555000002'}])
+		self.assertEqual([(r[0], r[2]) for r in rows[2:]], [(3, "Expected an object or a number"), (4, "Invalid JSON")])
+
+	def test_normalize_did(self):
+		did, error = normalize_did({'number': '+1 (555) 000-0001'}, {'startDate': '2024-01-01'})
+		self.assertIsNone(error)
+		self.assertEqual((did['number'], did['startDate']), ('+15550000001', '2024-01-01'))
+		self.assertEqual(normalize_did({'number': 'abc'})[1], "Invalid number")
+		self.assertEqual(normalize_did({'number': '5550001', 'startDate': 'soon'})[1], "Invalid startDate")
+		self.assertEqual(normalize_did({'number': '5550001', 'startDate': '2024-02-01', 'endDate': '2024-01-01'})[1],
+			"endDate is before startDate")
+
+	def test_import_format(self):
+		self.assertEqual(import_format('text/csv'), 'csv')
+		self.assertEqual(import_format('application/x-ndjson'), 'ndjson')
+		self.assertEqual(import_format('multipart/form-data', 'dids.jsonl'), 'ndjson')
+		with self.assertRaises(ValueError):
+			import_format('text/csv', requested='xlsx')
+
+	def test_import_job_validates_batches_and_provisions_concurrently(self):
+		directory = FakeDirectory(existing={'+1555000010'})
+		importer = DidImporter(directory.add_batch, directory.provision, workers=4, batch_size=100, spool_dir=self.test_dir)
+		self.addCleanup(importer.shutdown)
+		lines = ["number,startDate"] + [f"+1555{i:06d},2024-01-01" for i in range(1000)]
+		lines += ["+1555000001,2024-01-01", "bogus,2024-01-01"]
+		job = importer.start('p1', io.BytesIO("\n".join(lines).encode()), 'csv')
+		while job.to_dict()['status'] not in ('done', 'failed'):
+			time.sleep(0.01)
+
+		result = importer.get(job.id).to_dict()
+		self.assertEqual(result['status'], 'done')
+		self.assertEqual(result['counts'], {
+			'rows': 1002, 'added': 999, 'duplicate': 2, 'invalid': 1, 'provisioned': 998, 'provisionFailed': 1
+		})
+		self.assertEqual(result['pendingProvisioning'], 0)
+		self.assertEqual([e['error'] for e in result['errors']], ["Invalid number", "Provisioning failed: trunk busy"])
+		self.assertEqual(directory.batches, [100] * 10)
+		self.assertEqual(len(directory.provisioned), 999)
+		self.assertGreater(directory.peak, 1)
+		self.assertLessEqual(directory.peak, 4)
+		# The spooled upload is removed once the job finishes
+		self.assertEqual(os.listdir(self.test_dir), [])
+
+	def test_failed_batch_fails_the_job(self):
+		def add_batch(project_id, dids):
+			raise KeyError("Project p1 not found")
+		importer = DidImporter(add_batch, lambda project_id, number: None, spool_dir=self.test_dir)
+		self.addCleanup(importer.shutdown)
+		job = importer.start('p1', io.BytesIO(b'"+1555000001"\n'), 'ndjson')
+		importer.shutdown()
+		self.assertEqual(job.to_dict()['status'], 'failed')
+		self.assertIn('p1', job.to_dict()['error'])
+
+if __name__ == '__main__':
+	unittest.main()
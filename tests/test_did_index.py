@@ -0,0 +1,82 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+from did_index import DidIndex, lookup_did
+
+class TestDidIndex(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.index_file = os.path.join(self.test_dir, 'did_index.db')
+		self.projects = [
+			{'id': 'p1', 'dids': ['+1234567890']},
+			{'id': 'p2', 'dids': [{'number': '+1987654321', 'startDate': '2024-01-01'}]}
+		]
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def test_in_memory_routes(self):
+		index = DidIndex(self.projects)
+		self.assertEqual(index.get('+1234567890'), 'p1')
+		self.assertEqual(index.get('+1987654321'), 'p2')
+		self.assertNotIn('+1000000000', index)
+
+	def test_projects_without_an_id_are_skipped(self):
+		index = DidIndex(self.projects + [{'name': 'Unsaved', 'dids': ['+1555000000']}])
+		self.assertEqual(len(index), 2)
+		self.assertNotIn('+1555000000', index)
+
+	def test_concurrent_saves_publish_a_whole_index(self):
+		index = DidIndex(self.projects)
+		errors = []
+		def save():
+			try:
+				index.save(self.index_file)
+			except Exception as e:
+				errors.append(e)
+		threads = [threading.Thread(target=save) for _ in range(8)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(errors, [])
+		self.assertEqual(lookup_did(self.index_file, '+1987654321'), ('p2', False))
+		self.assertEqual(os.listdir(self.test_dir), ['did_index.db'])
+
+	def test_saved_index_lookup(self):
+		self.assertIsNone(lookup_did(self.index_file, '+1234567890'))
+
+		index = DidIndex(self.projects)
+		index.save(self.index_file, catch_all_enabled=True)
+		self.assertEqual(lookup_did(self.index_file, '+1987654321'), ('p2', True))
+		self.assertEqual(lookup_did(self.index_file, '+1000000000'), (None, True))
+
+		# Rebuilding replaces the file as a whole
+		index.rebuild(self.projects[:1])
+		index.save(self.index_file)
+		self.assertEqual(lookup_did(self.index_file, '+1987654321'), (None, False))
+		self.assertEqual(os.listdir(self.test_dir), ['did_index.db'])
+
+	def test_apply_updates_saved_index_in_place(self):
+		index = DidIndex(self.projects)
+		index.apply('p1', added=['+1000000000'], path=self.index_file, catch_all_enabled=True)
+		# No file yet, so the first change writes a full index
+		self.assertEqual(lookup_did(self.index_file, '+1987654321'), ('p2', True))
+		inode = os.stat(self.index_file).st_ino
+
+		index.apply('p1', added=['+1555000000'], removed=['+1234567890', '+1987654321'], path=self.index_file)
+		self.assertEqual(lookup_did(self.index_file, '+1555000000'), ('p1', True))
+		self.assertEqual(lookup_did(self.index_file, '+1234567890'), (None, True))
+		# Numbers routed to another project are left alone
+		self.assertEqual(lookup_did(self.index_file, '+1987654321'), ('p2', True))
+		self.assertEqual(index.get('+1987654321'), 'p2')
+		self.assertNotIn('+1234567890', index)
+		self.assertEqual(os.stat(self.index_file).st_ino, inode)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+import did_schedule
+from did_schedule import DidSchedule, parse_date
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+def day(offset):
+	return (NOW + timedelta(days=offset)).isoformat()
+
+class TestDidSchedule(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.test_dir, 'did_alerts.json')
+		self.projects = [{
+			'id': 'p1',
+			'dids': [
+				{'number': '+1001', 'startDate': day(-100)},
+				{'number': '+1002', 'startDate': day(-10), 'endDate': day(5)},
+				{'number': '+1003', 'startDate': day(-80)},
+				'+1004'
+			]
+		}]
+		self.schedule = DidSchedule(self.path)
+		self.schedule.sync(self.projects)
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def due(self, now):
+		return [(e['kind'], e['number']) for e in self.schedule.pop_due(now)]
+
+	def test_events_come_out_in_due_order_once(self):
+		self.assertEqual(self.schedule.next_due(), parse_date(day(-10)))
+		self.assertEqual(self.due(NOW), [('alert', '+1001')])
+		self.assertEqual(self.due(NOW), [])
+		# +1002's alert would come after its end date, so only the archive is scheduled
+		self.assertEqual(self.schedule.next_due(), parse_date(day(5)))
+		self.assertEqual(self.due(NOW + timedelta(days=30)), [('archive', '+1002'), ('alert', '+1003')])
+		self.assertIsNone(self.schedule.next_due())
+
+	def test_changed_dates_replace_pending_events(self):
+		self.projects[0]['dids'][2]['startDate'] = day(-30)
+		self.projects[0]['dids'][1]['endDate'] = None
+		self.schedule.sync(self.projects)
+		self.assertEqual(self.due(NOW + timedelta(days=90)), [('alert', '+1001'), ('alert', '+1003'), ('alert', '+1002')])
+
+	def test_removed_dids_are_dropped(self):
+		self.projects[0]['dids'] = self.projects[0]['dids'][2:]
+		self.schedule.sync(self.projects)
+		self.assertEqual(len(self.schedule), 1)
+		self.assertEqual(self.due(NOW + timedelta(days=30)), [('alert', '+1003')])
+
+	def test_sent_alerts_survive_a_restart(self):
+		self.schedule.pop_due(NOW)
+		self.schedule.mark_alert_sent('p1', '+1001')
+		restarted = DidSchedule(self.path)
+		restarted.sync(self.projects)
+		self.assertEqual([e['number'] for e in restarted.pop_due(NOW)], [])
+		# A new start date re-arms the alert
+		self.projects[0]['dids'][0]['startDate'] = day(-95)
+		restarted.sync(self.projects)
+		self.assertEqual([e['number'] for e in restarted.pop_due(NOW)], ['+1001'])
+
+	def test_unchanged_dids_are_not_reparsed(self):
+		calls = []
+		original = did_schedule.parse_date
+		did_schedule.parse_date = lambda value: calls.append(value) or original(value)
+		try:
+			self.projects[0]['dids'].append({'number': '+1005', 'startDate': day(0)})
+			self.schedule.sync(self.projects)
+		finally:
+			did_schedule.parse_date = original
+		self.assertEqual(calls, [day(0), None])
+
+	def test_update_touches_only_the_changed_dids(self):
+		# Other projects' DIDs are never looked at
+		self.projects.append({'id': 'p2', 'dids': [{'number': '+2001', 'startDate': day(-95)}]})
+		self.schedule.update('p2', self.projects[1]['dids'])
+		self.schedule.update('p1', [{'number': '+1003', 'startDate': day(-30)}], removed=['+1001', '+1003'])
+		self.assertEqual(self.due(NOW + timedelta(days=90)), [('alert', '+2001'), ('archive', '+1002'), ('alert', '+1003')])
+		self.schedule.update('p1', removed=['+1003'])
+		self.schedule.update('p2', ['+2001'])
+		self.assertEqual(len(self.schedule), 0)
+
+	def test_failed_events_are_retried_with_backoff(self):
+		first, most = did_schedule.DID_RETRY_MIN, did_schedule.DID_RETRY_MAX
+		event = self.schedule.pop_due(NOW)[0]
+		self.assertEqual(self.schedule.retry(event, NOW), first)
+		self.assertEqual(self.due(NOW), [])
+		self.assertEqual(self.due(NOW + first), [('alert', '+1001')])
+		delays = []
+		for _ in range(10):
+			delays.append(self.schedule.retry(event, NOW))
+			self.schedule.pop_due(NOW + most)
+		self.assertEqual(delays[:2], [first * 2, first * 4])
+		self.assertEqual(delays[-1], most)
+		# Sending the alert resets the backoff
+		self.schedule.mark_alert_sent('p1', '+1001')
+		self.assertEqual(self.schedule.retry(event, NOW), first)
+		# A retry is dropped once the DID is removed
+		self.schedule.pop_due(NOW + most)
+		self.schedule.update('p1', removed=['+1001'])
+		self.assertIsNone(self.schedule.retry(event, NOW))
+
+	def test_parse_date_normalizes_offsets(self):
+		self.assertIsNone(parse_date('not a date'))
+		self.assertIsNone(parse_date('2024-01-01T00:00:00+00:00').tzinfo)
+		self.assertLess(parse_date('2024-01-01'), datetime.now())
+
+if __name__ == '__main__':
+	unittest.main()
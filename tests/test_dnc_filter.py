@@ -0,0 +1,103 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from dnc_filter import DncSet, DncFilter, BloomFilter, normalize_number
+from sql_pool import ConnectionPool
+import sql_shim
+
+class TestDncSet(unittest.TestCase):
+	def test_membership_is_exact(self):
+		numbers = [f'+1555{i:07d}' for i in range(0, 20000, 2)]
+		dnc = DncSet(numbers)
+		self.assertEqual(len(dnc), 10000)
+		self.assertTrue(all(n in dnc for n in numbers))
+		self.assertFalse(any(f'+1555{i:07d}' in dnc for i in range(1, 20000, 2)))
+
+	def test_numbers_match_by_digits(self):
+		dnc = DncSet(['+1 (555) 010-0000'])
+		self.assertIn('15550100000', dnc)
+		self.assertNotIn('', dnc)
+		self.assertIsNone(normalize_number('anonymous'))
+
+	def test_additions_are_merged(self):
+		dnc = DncSet(['+15550000000'])
+		for i in range(5000):
+			dnc.add(f'+1666{i:07d}')
+		self.assertIn('+16660004999', dnc)
+		self.assertIn('+15550000000', dnc)
+		self.assertEqual(len(dnc), 5001)
+
+	def test_bloom_false_positive_rate(self):
+		bloom = BloomFilter(10000)
+		for i in range(10000):
+			bloom.add(i)
+		false_positives = sum(1 for i in range(10000, 30000) if i in bloom)
+		self.assertLess(false_positives / 20000, 0.01)
+
+class TestDncFilter(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.pool = ConnectionPool(sql_shim.connector(os.path.join(self.test_dir, 'dnc.db'), sql_shim.SCHEMA))
+		self.insert('+15550000001', '2024-01-01 00:00:00')
+
+	def tearDown(self):
+		self.pool.close()
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def insert(self, number, added):
+		with self.pool.connection() as conn:
+			conn.cursor().execute("INSERT INTO DNCSoftphone (PhoneNumber, DateAdded) VALUES (%s, %s)", (number, added))
+			conn.commit()
+
+	def test_full_then_incremental_sync(self):
+		dnc = DncFilter(self.pool)
+		self.assertFalse(dnc.loaded)
+		dnc.sync()
+		self.assertTrue(dnc.loaded)
+		self.assertIn('+15550000001', dnc)
+
+		self.insert('+15550000002', '2024-01-02 00:00:00')
+		self.assertNotIn('+15550000002', dnc)
+		dnc.sync()
+		self.assertIn('+15550000002', dnc)
+		self.assertEqual(dnc.watermark, '2024-01-02 00:00:00')
+
+	def test_local_additions_show_up_immediately(self):
+		dnc = DncFilter(self.pool)
+		dnc.sync()
+		dnc.add('+15550000003')
+		self.assertIn('+15550000003', dnc)
+
+	def test_additions_racing_the_rebuild_are_kept(self):
+		dnc = DncFilter(self.pool)
+		rebuild = dnc.numbers.rebuild
+		adder = threading.Thread(target=dnc.add, args=('+15550000009',))
+
+		def racing_rebuild(numbers):
+			# add() arrives after the snapshot was taken but before the new set is in place
+			adder.start()
+			adder.join(0.1)
+			rebuild(numbers)
+		dnc.numbers.rebuild = racing_rebuild
+		dnc.sync()
+		adder.join()
+		self.assertIn('+15550000009', dnc)
+		self.assertIn('+15550000001', dnc)
+
+	def test_full_sync_drops_deleted_numbers(self):
+		dnc = DncFilter(self.pool, full_sync_interval=0)
+		dnc.sync()
+		with self.pool.connection() as conn:
+			conn.cursor().execute("DELETE FROM DNCSoftphone")
+			conn.commit()
+		dnc.sync()
+		self.assertNotIn('+15550000001', dnc)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+from event_bus import EventBus, format_sse
+
+class TestEventBus(unittest.TestCase):
+	def test_fan_out(self):
+		bus = EventBus()
+		first, second = bus.subscribe(), bus.subscribe()
+		bus.publish('voicemail-created', {'projectId': 'p1'})
+
+		for subscriber in (first, second):
+			event = subscriber.get_nowait()
+			self.assertEqual(event['type'], 'voicemail-created')
+			self.assertEqual(event['data'], {'projectId': 'p1'})
+
+		bus.unsubscribe(first)
+		self.assertEqual(bus.subscriber_count(), 1)
+
+	def test_replay_after_reconnect(self):
+		bus = EventBus(history=3)
+		for i in range(3):
+			bus.publish('project-changed', {'n': i})
+
+		subscriber = bus.subscribe(last_event_id=1)
+		self.assertEqual([subscriber.get_nowait()['id'] for _ in range(2)], [2, 3])
+
+		# Event 1 was pushed out of the history, so the client must reload
+		bus.publish('project-changed', {'n': 3})
+		subscriber = bus.subscribe(last_event_id=0)
+		self.assertEqual(subscriber.get_nowait()['type'], 'projects-reloaded')
+
+	def test_slow_subscriber_is_dropped(self):
+		bus = EventBus(queue_size=2)
+		subscriber = bus.subscribe()
+		for i in range(3):
+			bus.publish('project-changed', {'n': i})
+		self.assertIsNone(subscriber.get_nowait())
+		self.assertEqual(bus.subscriber_count(), 0)
+
+	def test_format_sse(self):
+		event = {'id': 7, 'type': 'did-archived', 'data': {'did': '+1234567890'}}
+		self.assertEqual(format_sse(event), 'id: 7\nevent: did-archived\ndata: {"did": "+1234567890"}\n\n')
+
+if __name__ == '__main__':
+	unittest.main()
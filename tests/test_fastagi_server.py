@@ -0,0 +1,63 @@
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+from did_index import DidIndex, DID_INDEX_FILE
+from fastagi_server import FastAGIServer
+
+class TestFastAGIServer(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.index_file = os.path.join(self.test_dir, DID_INDEX_FILE)
+		DidIndex([{'id': 'p1', 'dids': ['+1234567890']}]).save(self.index_file, catch_all_enabled=True)
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	async def call_agi(self, port, script, did):
+		# Play the Asterisk side of a FastAGI exchange
+		reader, writer = await asyncio.open_connection('127.0.0.1', port)
+		writer.write(f"agi_network: yes\nagi_network_script: {script}\nagi_arg_1: {did}\n\n".encode())
+		commands = []
+		while True:
+			line = await reader.readline()
+			if not line:
+				break
+			commands.append(line.decode().strip())
+			writer.write(b"200 result=1\n")
+		writer.close()
+		return commands
+
+	def run_calls(self, agi_server, calls):
+		async def scenario():
+			server = await asyncio.start_server(agi_server.handle, '127.0.0.1', 0)
+			port = server.sockets[0].getsockname()[1]
+			results = []
+			async with server:
+				for did in calls:
+					results.append(await self.call_agi(port, 'check_did', did))
+			return results
+		return asyncio.run(scenario())
+
+	def test_check_did(self):
+		known, unknown = self.run_calls(FastAGIServer(self.test_dir), ['+1234567890', '+1000000000'])
+		self.assertEqual(known, ['SET VARIABLE DID_EXISTS "1"', 'SET VARIABLE CATCH_ALL_ENABLED "1"'])
+		self.assertEqual(unknown[0], 'SET VARIABLE DID_EXISTS "0"')
+
+	def test_index_reloads_when_replaced(self):
+		agi_server = FastAGIServer(self.test_dir)
+		self.assertEqual(self.run_calls(agi_server, ['+1000000000'])[0][0], 'SET VARIABLE DID_EXISTS "0"')
+
+		DidIndex([{'id': 'p2', 'dids': ['+1000000000']}]).save(self.index_file)
+		self.assertEqual(self.run_calls(agi_server, ['+1000000000'])[0][0], 'SET VARIABLE DID_EXISTS "1"')
+
+		# In-place updates are picked up too
+		DidIndex([{'id': 'p2', 'dids': ['+1000000000']}]).apply('p2', removed=['+1000000000'], path=self.index_file)
+		self.assertEqual(self.run_calls(agi_server, ['+1000000000'])[0][0], 'SET VARIABLE DID_EXISTS "0"')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import shutil
+import tempfile
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+from ip_allowlist import IPAllowlist, ReloadingAllowlist
+
+class TestIPAllowlist(unittest.TestCase):
+	def test_addresses_and_cidrs(self):
+		allowlist = IPAllowlist(['127.0.0.1', '192.168.1.0/24', '10.0.0.0/8', '2001:db8::/32'])
+		self.assertIn('127.0.0.1', allowlist)
+		self.assertIn('192.168.1.77', allowlist)
+		self.assertIn('10.255.255.255', allowlist)
+		self.assertIn('2001:db8::1', allowlist)
+		self.assertNotIn('192.168.2.1', allowlist)
+		self.assertNotIn('127.0.0.2', allowlist)
+		self.assertNotIn('2001:db9::1', allowlist)
+
+	def test_ipv4_mapped_ipv6(self):
+		self.assertIn('::ffff:192.168.1.5', IPAllowlist(['192.168.1.0/24']))
+
+	def test_overlapping_ranges_are_merged(self):
+		allowlist = IPAllowlist(['10.0.0.0/24', '10.0.1.0/24', '10.0.0.5', ' 10.0.0.0/23 '])
+		self.assertEqual(len(allowlist), 1)
+		self.assertIn('10.0.1.255', allowlist)
+
+	def test_invalid_entries_are_ignored(self):
+		allowlist = IPAllowlist(['not-an-ip', '', '# comment', '127.0.0.1'])
+		self.assertIn('127.0.0.1', allowlist)
+		self.assertNotIn('not-an-ip', allowlist)
+		self.assertNotIn(None, allowlist)
+
+class TestReloadingAllowlist(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.test_dir, 'allowed_ips')
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def write(self, text):
+		tmp = self.path + '.tmp'
+		with open(tmp, 'w') as f:
+			f.write(text)
+		os.replace(tmp, self.path)
+
+	def test_file_changes_apply_without_restart(self):
+		allowlist = ReloadingAllowlist(['127.0.0.1'], self.path, check_interval=0)
+		self.assertTrue(allowlist.allows('127.0.0.1'))
+		self.assertFalse(allowlist.allows('172.16.0.9'))
+
+		self.write('# office\n172.16.0.0/12\n')
+		self.assertTrue(allowlist.allows('172.16.0.9'))
+
+		self.write('')
+		self.assertFalse(allowlist.allows('172.16.0.9'))
+		self.assertTrue(allowlist.allows('127.0.0.1'))
+
+		os.remove(self.path)
+		self.assertTrue(allowlist.allows('127.0.0.1'))
+
+if __name__ == '__main__':
+	unittest.main()
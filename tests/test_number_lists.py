@@ -0,0 +1,112 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sql_pool import ConnectionPool
+import number_lists
+import sql_shim
+
+class TestNumberLists(unittest.TestCase):
+	# The queries behind /api/dnc, /api/archive and /api/numbers/<number>/meta, run through the T-SQL shim
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.pool = ConnectionPool(sql_shim.connector(os.path.join(self.test_dir, 'numbers.db'), sql_shim.SCHEMA))
+
+	def tearDown(self):
+		self.pool.close()
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def rows(self, sql):
+		with self.pool.connection() as conn:
+			return conn.cursor().execute(sql).fetchall()
+
+	def test_add_to_dnc(self):
+		self.assertFalse(number_lists.is_dnc(self.pool, '+15550001'))
+		number_lists.add_to_dnc(self.pool, '+15550001', 'VOICEMAIL_SYSTEM')
+		number_lists.add_to_dnc(self.pool, '+15550002', 'u1', source='VOICEMAIL_SYSTEM', voicemail_id='vm1', notes='rude')
+		self.assertTrue(number_lists.is_dnc(self.pool, '+15550001'))
+		self.assertEqual(
+			self.rows("SELECT PhoneNumber, AddedBy, Source, VoicemailId, Notes FROM DNCSoftphone ORDER BY PhoneNumber"),
+			[('+15550001', 'VOICEMAIL_SYSTEM', None, None, None), ('+15550002', 'u1', 'VOICEMAIL_SYSTEM', 'vm1', 'rude')]
+		)
+		self.assertIsNotNone(self.rows("SELECT DateAdded FROM DNCSoftphone")[0][0])
+
+	def test_archive_number(self):
+		self.assertFalse(number_lists.is_archived(self.pool, '+15550001'))
+		number_lists.archive_number(self.pool, '+15550001', 'SYSTEM', 'campaign over')
+		self.assertTrue(number_lists.is_archived(self.pool, '+15550001'))
+		self.assertFalse(number_lists.is_archived(self.pool, '+15550002'))
+		self.assertEqual(self.rows("SELECT ArchivedBy, Reason FROM ArchivedNumbers"), [('SYSTEM', 'campaign over')])
+
+	def test_bulk_dnc_dedupes_by_digits(self):
+		number_lists.add_to_dnc(self.pool, '+15550001', 'VOICEMAIL_SYSTEM')
+		results, added = number_lists.add_many_to_dnc(
+			self.pool, [' +15550002 ', '1 (555) 0002', '+15550001', '', 'abc', None, '+15550003'], 'u1', 'bulk'
+		)
+		self.assertEqual(results, [
+			{'number': '+15550002', 'status': 'added'},
+			{'number': '1 (555) 0002', 'status': 'duplicate'},
+			{'number': '+15550001', 'status': 'exists'},
+			{'number': '', 'status': 'invalid'},
+			{'number': 'abc', 'status': 'invalid'},
+			{'number': None, 'status': 'invalid'},
+			{'number': '+15550003', 'status': 'added'}
+		])
+		self.assertEqual(added, ['+15550002', '+15550003'])
+		self.assertEqual(
+			self.rows("SELECT PhoneNumber, AddedBy, Source, Notes FROM DNCSoftphone WHERE AddedBy = 'u1' ORDER BY PhoneNumber"),
+			[('+15550002', 'u1', 'VOICEMAIL_SYSTEM', 'bulk'), ('+15550003', 'u1', 'VOICEMAIL_SYSTEM', 'bulk')]
+		)
+
+	def test_bulk_lookup_spans_chunks(self):
+		number_lists.archive_numbers(self.pool, ['+15550001', '+15550004'], 'u1')
+		original = number_lists.BULK_LOOKUP_CHUNK
+		number_lists.BULK_LOOKUP_CHUNK = 2
+		self.addCleanup(setattr, number_lists, 'BULK_LOOKUP_CHUNK', original)
+		results, added = number_lists.archive_numbers(self.pool, [f'+155500{i:02d}' for i in range(1, 6)], 'u2')
+		self.assertEqual([r['status'] for r in results], ['exists', 'added', 'added', 'exists', 'added'])
+		self.assertEqual(added, ['+15550002', '+15550003', '+15550005'])
+
+	def test_concurrent_bulk_archives_insert_each_number_once(self):
+		numbers = [f'+1555{i:06d}' for i in range(200)]
+		added = []
+		def archive(chunk):
+			added.extend(number_lists.archive_numbers(self.pool, chunk, 'u1', 'closed')[1])
+		threads = [threading.Thread(target=archive, args=(numbers[i::2] + numbers,)) for i in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual(sorted(added), numbers)
+		self.assertEqual(self.rows("SELECT COUNT(*), COUNT(DISTINCT PhoneNumber) FROM ArchivedNumbers"), [(200, 200)])
+
+	def test_failed_bulk_insert_rolls_back(self):
+		with self.pool.connection() as conn:
+			conn.cursor().execute("CREATE TRIGGER no_bad BEFORE INSERT ON DNCSoftphone WHEN NEW.PhoneNumber = '+15550009' BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+			conn.commit()
+		with self.assertRaises(Exception):
+			number_lists.add_many_to_dnc(self.pool, ['+15550001', '+15550009'], 'u1')
+		self.assertEqual(self.rows("SELECT COUNT(*) FROM DNCSoftphone"), [(0,)])
+
+	def test_call_history_is_newest_first_and_limited(self):
+		with self.pool.connection() as conn:
+			conn.cursor().executemany(
+				"INSERT INTO CallHistory (PhoneNumber, CallDate, CallType, Duration, Result) VALUES (%s, %s, %s, %s, %s)",
+				[('+15550001', f'2024-01-{day:02d} 10:00:00', 'inbound', day, 'answered') for day in range(1, 13)]
+				+ [('+15550002', '2024-02-01 10:00:00', 'outbound', 5, 'busy')]
+			)
+			conn.commit()
+		history = number_lists.call_history(self.pool, '+15550001')
+		self.assertEqual(len(history), 10)
+		self.assertEqual(history[0], {'date': datetime(2024, 1, 12, 10).isoformat(), 'type': 'inbound', 'duration': 12, 'result': 'answered'})
+		self.assertEqual([h['duration'] for h in history], list(range(12, 2, -1)))
+		self.assertEqual(number_lists.call_history(self.pool, '+15550003'), [])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,252 @@
+import unittest
+import os
+import json
+import shutil
+import tempfile
+import threading
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+import project_store
+from project_store import ProjectStore, JsonProjectStore, SqliteProjectStore, migrate_json_to_sqlite, format_duration
+
+class TestProjectStore(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.project = {
+			'id': 'p1',
+			'name': 'Test Project',
+			'dids': [{'number': '+1234567890', 'startDate': '2024-01-01'}],
+			'voicemails': [],
+			'notes': []
+		}
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def stores(self):
+		json_store = JsonProjectStore(os.path.join(self.test_dir, 'projects.json'))
+		sqlite_store = SqliteProjectStore(os.path.join(self.test_dir, 'projects.db'))
+		self.addCleanup(sqlite_store.close)
+		return [json_store, sqlite_store]
+
+	def test_entity_operations(self):
+		for store in self.stores():
+			with self.subTest(store=type(store).__name__):
+				store.add_project(dict(self.project))
+				store.add_note('p1', {'id': 'n1', 'text': 'hello'})
+				store.add_did('p1', {'number': '+1999', 'startDate': '2024-02-01'})
+				store.archive_did('p1', {'number': '+1234567890', 'archived': True})
+				store.add_voicemail('p1', {'id': 'vm1', 'caller': '+1555', 'timestamp': '2024-03-01T00:00:00'})
+				store.save_project({'id': 'p1', 'name': 'Renamed', 'voicemails': []})
+
+				project = store.load_projects()[0]
+				self.assertEqual(project['name'], 'Renamed')
+				self.assertEqual([n['id'] for n in project['notes']], ['n1'])
+				self.assertEqual([d['number'] for d in project['dids']], ['+1999'])
+				self.assertEqual([d['number'] for d in project['archivedDids']], ['+1234567890'])
+				self.assertEqual([v['id'] for v in project['voicemails']], ['vm1'])
+
+				store.delete_note('p1', 'n1')
+				store.remove_did('p1', '+1999')
+				project = store.load_projects()[0]
+				self.assertEqual(project['notes'], [])
+				self.assertEqual(project['dids'], [])
+
+				store.delete_project('p1')
+				self.assertEqual(store.load_projects(), [])
+
+	def test_concurrent_writers_keep_every_update(self):
+		paths = [os.path.join(self.test_dir, 'projects.json'), os.path.join(self.test_dir, 'projects.db')]
+		for path, store_class in zip(paths, (JsonProjectStore, SqliteProjectStore)):
+			with self.subTest(store=store_class.__name__):
+				store_class(path).add_project(dict(self.project))
+
+				def add_voicemails(worker):
+					# Each thread stands in for a separate process with its own store
+					store = store_class(path)
+					for i in range(10):
+						store.add_voicemail('p1', {'id': f'vm-{worker}-{i}', 'timestamp': '2024-03-01T00:00:00'})
+					store.close()
+
+				threads = [threading.Thread(target=add_voicemails, args=(w,)) for w in range(4)]
+				for thread in threads:
+					thread.start()
+				for thread in threads:
+					thread.join()
+
+				project = store_class(path).load_projects()[0]
+				self.assertEqual(len(project['voicemails']), 40)
+
+	def test_change_notification(self):
+		paths = [os.path.join(self.test_dir, 'projects.json'), os.path.join(self.test_dir, 'projects.db')]
+		for path, store_class in zip(paths, (JsonProjectStore, SqliteProjectStore)):
+			with self.subTest(store=store_class.__name__):
+				reader = store_class(path)
+				reader.add_project(dict(self.project))
+				reader.changes_since(reader.change_cursor())
+				cursor = reader.change_cursor()
+
+				store_class(path).add_voicemail('p1', {'id': 'vm1', 'timestamp': '2024-03-01T00:00:00'})
+				changes, cursor = reader.changes_since(cursor)
+				self.assertEqual(len(changes), 1)
+				self.assertIn(changes[0]['op'], ('create', 'reload'))
+				self.assertEqual(reader.changes_since(cursor)[0], [])
+				self.assertEqual(len(reader.load_project('p1')['voicemails']), 1)
+
+	def test_own_writes_are_reported_as_changes(self):
+		for store in self.stores():
+			with self.subTest(store=type(store).__name__):
+				store.add_project(dict(self.project))
+				store.changes_since(store.change_cursor())
+				cursor = store.change_cursor()
+				store.add_voicemail('p1', {'id': 'vm1', 'timestamp': '2024-03-01T00:00:00'})
+				store.archive_did('p1', self.project['dids'][0])
+				store.update_voicemails({'vm1': {'isNew': False}, 'missing': {'isNew': False}})
+				changes, cursor = store.changes_since(cursor)
+				self.assertEqual([(c['entity'], c['entity_id'], c['op']) for c in changes], [
+					('voicemail', 'vm1', 'create'), ('did', '+1234567890', 'archive'), ('voicemail', 'vm1', 'update')
+				])
+				self.assertEqual({c['origin'] for c in changes}, {os.getpid()})
+				self.assertEqual(store.changes_since(cursor)[0], [])
+
+	def test_json_change_log_is_shared_between_processes(self):
+		path = os.path.join(self.test_dir, 'projects.json')
+		reader = JsonProjectStore(path)
+		cursor = reader.change_cursor()
+		self.assertEqual(reader.changes_since(cursor), ([], (None, 0)))
+		# A separate store stands in for the queue worker writing the same file
+		writer = JsonProjectStore(path)
+		writer.add_project(dict(self.project))
+		writer.add_voicemail('p1', {'id': 'vm1', 'timestamp': '2024-03-01T00:00:00'})
+		changes, cursor = reader.changes_since(cursor)
+		self.assertEqual([(c['entity'], c['entity_id'], c['op']) for c in changes], [
+			('project', 'p1', 'create'), ('voicemail', 'vm1', 'create')
+		])
+		self.assertEqual(cursor, reader.change_cursor())
+		# A half-written line is left for the next poll
+		with open(writer.changes_path, 'a') as f:
+			f.write('{"project_id": "p1"')
+		self.assertEqual(reader.changes_since(cursor), ([], cursor))
+
+	def test_json_change_log_starts_over_when_full(self):
+		path = os.path.join(self.test_dir, 'projects.json')
+		store = JsonProjectStore(path)
+		store.add_project(dict(self.project))
+		cursor = store.change_cursor()
+		original = project_store.CHANGE_LOG_BYTES
+		project_store.CHANGE_LOG_BYTES = 1
+		self.addCleanup(setattr, project_store, 'CHANGE_LOG_BYTES', original)
+		store.add_voicemail('p1', {'id': 'vm1', 'timestamp': '2024-03-01T00:00:00'})
+		changes, cursor = store.changes_since(cursor)
+		self.assertEqual(changes, [{'op': 'reload'}])
+		self.assertEqual(store.changes_since(cursor)[0], [])
+
+	def test_list_voicemails_pages_and_filters(self):
+		for store in self.stores():
+			with self.subTest(store=type(store).__name__):
+				store.add_project(dict(self.project))
+				for i in range(5):
+					store.add_voicemail('p1', {
+						'id': f'vm{i}',
+						'caller': '+1555' if i % 2 else '+1666',
+						'did': '+1234567890',
+						'timestamp': f'2024-03-0{i + 1}T00:00:00',
+						'isNew': i < 2
+					})
+
+				page, cursor = store.list_voicemails(limit=2)
+				self.assertEqual([vm['id'] for vm in page], ['vm4', 'vm3'])
+				self.assertEqual(page[0]['projectId'], 'p1')
+				page, cursor = store.list_voicemails(limit=2, cursor=cursor)
+				self.assertEqual([vm['id'] for vm in page], ['vm2', 'vm1'])
+				page, cursor = store.list_voicemails(limit=2, cursor=cursor)
+				self.assertEqual([vm['id'] for vm in page], ['vm0'])
+				self.assertIsNone(cursor)
+
+				page, _ = store.list_voicemails({'caller': '+1555'}, descending=False)
+				self.assertEqual([vm['id'] for vm in page], ['vm1', 'vm3'])
+				page, _ = store.list_voicemails({'is_new': True, 'since': '2024-03-02'})
+				self.assertEqual([vm['id'] for vm in page], ['vm1'])
+
+	def test_json_paging_reads_the_file_once_per_change(self):
+		store = JsonProjectStore(os.path.join(self.test_dir, 'projects.json'))
+		store.add_project(dict(self.project, voicemails=[
+			{'id': f'vm{i}', 'timestamp': f'2024-03-0{i + 1}T00:00:00'} for i in range(5)
+		]))
+		loads = []
+		load_projects = store.load_projects
+		store.load_projects = lambda: loads.append(1) or load_projects()
+
+		page, cursor = store.list_voicemails(limit=2)
+		page, cursor = store.list_voicemails(limit=2, cursor=cursor)
+		self.assertEqual([vm['id'] for vm in page], ['vm2', 'vm1'])
+		self.assertEqual(len(loads), 1)
+		# Pages are copies, so callers can't change the cached list
+		store.list_voicemails(limit=1)[0][0]['isNew'] = True
+		self.assertNotIn('isNew', store.list_voicemails(limit=1)[0][0])
+
+		store.add_voicemail('p1', {'id': 'vm9', 'timestamp': '2024-04-01T00:00:00'})
+		self.assertEqual(store.list_voicemails(limit=1)[0][0]['id'], 'vm9')
+		self.assertEqual(len(loads), 3)
+
+	def test_list_voicemails_by_duration(self):
+		for store in self.stores():
+			with self.subTest(store=type(store).__name__):
+				store.add_project(dict(self.project))
+				for i, duration in enumerate([12.5, 3, '0:30', 40, 3]):
+					store.add_voicemail('p1', {'id': f'vm{i}', 'timestamp': f'2024-03-0{i + 1}T00:00:00', 'duration': duration})
+
+				page, cursor = store.list_voicemails(limit=2, sort='duration')
+				self.assertEqual([vm['id'] for vm in page], ['vm3', 'vm0'])
+				page, cursor = store.list_voicemails(limit=2, cursor=cursor, sort='duration')
+				self.assertEqual([vm['id'] for vm in page], ['vm4', 'vm1'])
+				page, cursor = store.list_voicemails(limit=2, cursor=cursor, sort='duration')
+				self.assertEqual([vm['id'] for vm in page], ['vm2'])
+				self.assertIsNone(cursor)
+				with self.assertRaises(ValueError):
+					store.list_voicemails(sort='caller')
+
+	def test_migrate_json_to_sqlite(self):
+		json_path = os.path.join(self.test_dir, 'projects.json')
+		db_path = os.path.join(self.test_dir, 'projects.db')
+		self.project['voicemails'] = [{'id': 'vm1', 'caller': '+1555', 'timestamp': '2024-03-01T00:00:00'}]
+		with open(json_path, 'w') as f:
+			json.dump([self.project], f)
+
+		counts = migrate_json_to_sqlite(json_path, db_path)
+		self.assertEqual(counts['projects'], 1)
+		self.assertEqual(counts['voicemails'], 1)
+
+		store = SqliteProjectStore(db_path)
+		self.addCleanup(store.close)
+		migrated = store.load_projects()
+		self.assertEqual(migrated[0]['name'], 'Test Project')
+		self.assertEqual(migrated[0]['voicemails'][0]['caller'], '+1555')
+
+	def test_format_duration(self):
+		self.assertEqual(format_duration({'duration': 61.6}), '1:02')
+		self.assertEqual(format_duration({'duration': 5}), '0:05')
+		self.assertEqual(format_duration({'duration': '0:30'}), '0:30')
+		self.assertEqual(format_duration({}), 'unknown')
+
+	def test_incomplete_store_cannot_be_created(self):
+		class NoWrites(ProjectStore):
+			def load_projects(self):
+				return []
+		with self.assertRaises(TypeError):
+			NoWrites()
+
+	def test_interrupted_transaction_rolls_back(self):
+		store = SqliteProjectStore(os.path.join(self.test_dir, 'projects.db'))
+		self.addCleanup(store.close)
+		store.add_project(dict(self.project))
+		with self.assertRaises(KeyboardInterrupt):
+			with store._transaction() as conn:
+				conn.execute("DELETE FROM projects")
+				raise KeyboardInterrupt
+		self.assertFalse(store._connect().in_transaction)
+		self.assertEqual(len(store.load_projects()), 1)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+import project_views
+from project_views import (page_size, paginate, project_summary, projects_etag, etag_matches, projects_response,
+	SummaryCache, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+PROJECTS = [{
+	'id': 'p1',
+	'name': 'Spring campaign',
+	'dids': ['+1001'],
+	'archivedDids': [{'number': '+1002'}],
+	'voicemails': [{'id': 'v1', 'isNew': True, 'duration': 61.5}, {'id': 'v2', 'duration': '0:30'}],
+	'notes': [{'text': 'call back'}]
+}]
+
+class TestPaging(unittest.TestCase):
+	def test_limit_bounds(self):
+		self.assertEqual(page_size({}), DEFAULT_PAGE_SIZE)
+		self.assertEqual(page_size({'limit': '0'}), 1)
+		self.assertEqual(page_size({'limit': '-5'}), 1)
+		self.assertEqual(page_size({'limit': '100000'}), MAX_PAGE_SIZE)
+		with self.assertRaises(ValueError):
+			page_size({'limit': 'ten'})
+
+	def test_paginate_walks_the_list(self):
+		items = list(range(5))
+		page, cursor = paginate(items, {'limit': '2'})
+		self.assertEqual((page, cursor), ([0, 1], '2'))
+		page, cursor = paginate(items, {'limit': '2', 'cursor': cursor})
+		self.assertEqual((page, cursor), ([2, 3], '4'))
+		self.assertEqual(paginate(items, {'limit': '2', 'cursor': '4'}), ([4], None))
+		self.assertEqual(paginate(items, {'cursor': '50'}), ([], None))
+		self.assertEqual(paginate([], {'cursor': ''}), ([], None))
+
+	def test_bad_cursor(self):
+		for cursor in ('abc', '-1', '1.5'):
+			with self.assertRaises(ValueError):
+				paginate([1, 2, 3], {'cursor': cursor})
+
+class TestProjectList(unittest.TestCase):
+	def test_summary_leaves_out_collections(self):
+		summary = project_summary(PROJECTS[0])
+		self.assertNotIn('voicemails', summary)
+		self.assertNotIn('notes', summary)
+		self.assertEqual(summary['dids'], ['+1001'])
+		self.assertEqual((summary['activeDidCount'], summary['archivedDidCount']), (1, 1))
+		self.assertEqual((summary['totalMessages'], summary['newMessages'], summary['noteCount']), (2, 1, 1))
+		self.assertEqual(summary['totalDuration'], 61.5)
+
+	def test_etag_follows_the_change_cursor(self):
+		self.assertEqual(projects_etag(5), projects_etag(5))
+		self.assertNotEqual(projects_etag(5), projects_etag(6))
+
+	def test_if_none_match(self):
+		etag = projects_etag(1)
+		self.assertTrue(etag_matches(f'"{etag}"', etag))
+		self.assertTrue(etag_matches(f'W/"{etag}"', etag))
+		self.assertTrue(etag_matches(f'"stale", "{etag}"', etag))
+		self.assertTrue(etag_matches('*', etag))
+		self.assertFalse(etag_matches('"stale"', etag))
+		self.assertFalse(etag_matches('', etag))
+		self.assertFalse(etag_matches(None, etag))
+
+	def test_not_modified_and_cached_body(self):
+		cache = SummaryCache()
+		etag = projects_etag(1)
+		calls = []
+		original = project_views.project_summary
+		project_views.project_summary = lambda project: calls.append(project['id']) or original(project)
+		try:
+			status, body = projects_response(PROJECTS, etag, None, cache)
+			self.assertEqual(status, 200)
+			self.assertEqual(projects_response(PROJECTS, etag, '"other"', cache), (200, body))
+			self.assertEqual(projects_response(PROJECTS, etag, f'"{etag}"', cache), (304, None))
+			self.assertEqual(projects_response(PROJECTS, etag, '*', cache), (304, None))
+			self.assertEqual(calls, ['p1'])
+			# A new tag rebuilds the body
+			projects_response(PROJECTS, projects_etag(2), None, cache)
+			self.assertEqual(calls, ['p1', 'p1'])
+		finally:
+			project_views.project_summary = original
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import os
+import sys
+from flask import Flask
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import security_config
+from security_config import SlidingWindowLimiter, TokenBucket
+from fake_clock import FakeClock
+
+class FakeRedis:
+	# Sorted sets plus a Python version of SLIDING_WINDOW_SCRIPT
+	def __init__(self):
+		self.zsets = {}
+		self.down = False
+		self.calls = 0
+
+	def register_script(self, script):
+		self.script = script
+		return self.run_script
+
+	def run_script(self, keys, args):
+		self.calls += 1
+		if self.down:
+			raise ConnectionError("Connection refused")
+		now, window, limit, member = int(args[0]), int(args[1]), int(args[2]), args[3]
+		hits = [(score, m) for score, m in self.zsets.get(keys[0], []) if score > now - window]
+		if len(hits) >= limit:
+			self.zsets[keys[0]] = hits
+			return [0, len(hits), min(hits)[0] + window - now]
+		hits.append((now, member))
+		self.zsets[keys[0]] = hits
+		return [1, len(hits), 0]
+
+class TestSlidingWindowLimiter(unittest.TestCase):
+	def setUp(self):
+		self.redis = FakeRedis()
+		self.clock = FakeClock(1000.0)
+		self.limiter = SlidingWindowLimiter(lambda: self.redis, limit=3, period=60, clock=self.clock)
+
+	def test_limit_is_enforced_within_window(self):
+		for _ in range(3):
+			self.assertTrue(self.limiter.hit('k')[0])
+		allowed, retry_after = self.limiter.hit('k')
+		self.assertFalse(allowed)
+		self.assertEqual(retry_after, 60)
+
+		# Hits slide out of the window one by one
+		self.clock.now += 60.001
+		self.assertTrue(self.limiter.hit('k')[0])
+		self.assertEqual(self.limiter.stats['limited'], 1)
+
+	def test_keys_are_independent(self):
+		for _ in range(3):
+			self.limiter.hit('a')
+		self.assertTrue(self.limiter.hit('b')[0])
+
+	def test_falls_back_to_local_buckets_when_redis_is_down(self):
+		self.redis.down = True
+		results = [self.limiter.hit('k')[0] for _ in range(4)]
+		self.assertEqual(results, [True, True, True, False])
+		# Redis isn't retried on every request while it's marked down
+		self.assertEqual(self.redis.calls, 1)
+		self.assertEqual(self.limiter.stats['redisErrors'], 1)
+		self.assertEqual(self.limiter.stats['localChecks'], 4)
+
+class TestTokenBucket(unittest.TestCase):
+	def test_refills_over_time(self):
+		clock = FakeClock(1000.0)
+		bucket = TokenBucket(limit=2, period=10, clock=clock)
+		self.assertTrue(bucket.hit('k')[0])
+		self.assertTrue(bucket.hit('k')[0])
+		allowed, retry_after = bucket.hit('k')
+		self.assertFalse(allowed)
+		self.assertAlmostEqual(retry_after, 5)
+		clock.now += 5
+		self.assertTrue(bucket.hit('k')[0])
+
+	def test_key_count_is_bounded(self):
+		bucket = TokenBucket(limit=1, period=10, clock=FakeClock(1000.0), max_keys=2)
+		for key in ('a', 'b', 'c'):
+			bucket.hit(key)
+		self.assertEqual(len(bucket._buckets), 2)
+
+class TestRateLimitDecorator(unittest.TestCase):
+	def setUp(self):
+		self.original = security_config.limiter
+		security_config.limiter = SlidingWindowLimiter(lambda: FakeRedis(), limit=1, period=60)
+		app = Flask(__name__)
+
+		@app.route('/ping')
+		@security_config.rate_limit('ping')
+		def ping():
+			return 'pong'
+		self.client = app.test_client()
+
+	def tearDown(self):
+		security_config.limiter = self.original
+
+	def test_returns_429_with_retry_after(self):
+		self.assertEqual(self.client.get('/ping').status_code, 200)
+		response = self.client.get('/ping')
+		self.assertEqual(response.status_code, 429)
+		self.assertEqual(response.headers['Retry-After'], '60')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from retention import purge_expired, prune_transcripts
+from project_store import JsonProjectStore, SqliteProjectStore
+from search_index import SearchIndex
+from fake_clock import FakeClock
+
+class TestRetention(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.voicemail_dir = os.path.join(self.test_dir, 'voicemails')
+		os.makedirs(os.path.join(self.voicemail_dir, 'transcoded'))
+		self.clock = FakeClock()
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def write(self, name, size):
+		with open(os.path.join(self.voicemail_dir, name), 'wb') as f:
+			f.write(b'\0' * size)
+
+	def stores(self):
+		json_store = JsonProjectStore(os.path.join(self.test_dir, 'projects.json'))
+		sqlite_store = SqliteProjectStore(os.path.join(self.test_dir, 'projects.db'))
+		self.addCleanup(sqlite_store.close)
+		return [json_store, sqlite_store]
+
+	def add_voicemails(self, store, ages):
+		store.add_project({'id': 'p1', 'voicemails': []})
+		for i, age in enumerate(ages):
+			timestamp = (datetime.now() - timedelta(days=age)).isoformat() if age is not None else None
+			store.add_voicemail('p1', {'id': f'vm{i}', 'timestamp': timestamp, 'transcription': 'hello'})
+			self.write(f'vm{i}.wav', 1000)
+			self.write(f'vm{i}.json', 10)
+
+	def purge(self, store, **kwargs):
+		kwargs.setdefault('pause', 0.5)
+		return purge_expired(store, self.voicemail_dir, 30, clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+	def test_expired_voicemails_and_files_are_removed(self):
+		for store in self.stores():
+			with self.subTest(store=type(store).__name__):
+				self.add_voicemails(store, [90, 45, 5, None])
+				self.write('vm0.ogg', 500)
+				self.write('transcoded/vm1.ogg', 200)
+				index = SearchIndex(os.path.join(self.test_dir, f'{type(store).__name__}.db'))
+				self.addCleanup(index.close)
+				for vm in store.load_project('p1')['voicemails']:
+					index.add('p1', vm)
+				forgotten = []
+
+				report = self.purge(store, index=index, on_deleted=forgotten.extend)
+				self.assertEqual((report['voicemails'], report['files'], report['bytes']), (2, 6, 2720))
+				self.assertTrue(report['complete'])
+				self.assertEqual(sorted(forgotten), ['vm0', 'vm1'])
+				# Recent voicemails and ones without a timestamp stay
+				self.assertEqual([vm['id'] for vm in store.load_project('p1')['voicemails']], ['vm2', 'vm3'])
+				self.assertEqual(sorted(os.listdir(self.voicemail_dir)), ['transcoded', 'vm2.json', 'vm2.wav', 'vm3.json', 'vm3.wav'])
+				self.assertEqual(index.count(), 2)
+
+				shutil.rmtree(self.voicemail_dir)
+				os.makedirs(os.path.join(self.voicemail_dir, 'transcoded'))
+
+	def write_transcript(self, key, age_days):
+		path = os.path.join(self.voicemail_dir, 'transcriptions', key[:2], f'{key}.json')
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path, 'w') as f:
+			f.write('{"text": "hello"}')
+		then = time.time() - age_days * 86400
+		os.utime(path, (then, then))
+		return path
+
+	def test_expired_transcripts_are_pruned(self):
+		old = self.write_transcript('ab' + '0' * 62, 45)
+		recent = self.write_transcript('cd' + '0' * 62, 5)
+		store = SqliteProjectStore(os.path.join(self.test_dir, 'projects.db'))
+		self.addCleanup(store.close)
+		self.add_voicemails(store, [90])
+
+		report = self.purge(store)
+		self.assertEqual((report['voicemails'], report['transcripts'], report['files']), (1, 1, 3))
+		self.assertFalse(os.path.exists(old))
+		self.assertTrue(os.path.exists(recent))
+		self.assertEqual(prune_transcripts(self.voicemail_dir, 30), (0, 0))
+		self.assertEqual(prune_transcripts(os.path.join(self.test_dir, 'missing'), 30), (0, 0))
+
+	def test_batches_are_throttled_and_runs_are_bounded(self):
+		store = SqliteProjectStore(os.path.join(self.test_dir, 'projects.db'))
+		self.addCleanup(store.close)
+		self.add_voicemails(store, [40 + i for i in range(7)])
+
+		report = self.purge(store, batch_size=2, max_mb_per_sec=0.001, max_runtime=3)
+		# 2 voicemails (2020 bytes) per batch at ~1KB/s means a ~2s wait after each
+		self.assertEqual(report['batches'], 3)
+		self.assertFalse(report['complete'])
+		self.assertAlmostEqual(self.clock.sleeps[0], 2020 / 1048.576, places=3)
+		# Oldest go first
+		self.assertEqual(sorted(vm['id'] for vm in store.load_project('p1')['voicemails']), ['vm0'])
+
+		report = self.purge(store, batch_size=2)
+		self.assertEqual((report['voicemails'], report['complete']), (1, True))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+from search_index import SearchIndex, build_query, rebuild_index
+from project_store import SqliteProjectStore
+
+class TestSearchIndex(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.index = SearchIndex(os.path.join(self.test_dir, 'search.db'))
+		self.addCleanup(self.index.close)
+		self.index.add('p1', {'id': 'vm1', 'caller': '+1555', 'did': '+1800', 'transcription': 'Please call me back about the invoice'})
+		self.index.add('p1', {'id': 'vm2', 'caller': '+1666', 'did': '+1800', 'transcription': 'Invoice 42 is overdue, invoice attached'})
+		self.index.add('p2', {'id': 'vm3', 'caller': '+1777', 'did': '+1900', 'transcription': 'About the invoice, call me'})
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def ids(self, query, **kwargs):
+		return [hit['voicemailId'] for hit in self.index.search(query, **kwargs)[0]]
+
+	def test_build_query_quotes_terms(self):
+		self.assertEqual(build_query('callback "about invoice"'), '"callback" "about invoice"')
+		self.assertEqual(build_query('inv* OR NEAR('), '"inv"* "OR" "NEAR("')
+		self.assertEqual(build_query('  '), '')
+
+	def test_words_phrases_and_prefixes(self):
+		self.assertEqual(sorted(self.ids('invoice call')), ['vm1', 'vm3'])
+		self.assertEqual(sorted(self.ids('"about the invoice"')), ['vm1', 'vm3'])
+		self.assertEqual(self.ids('"invoice about"'), [])
+		# Porter stemming matches other word forms
+		self.assertEqual(sorted(self.ids('calling')), ['vm1', 'vm3'])
+		self.assertEqual(self.ids('overd*'), ['vm2'])
+
+	def test_ranked_and_paginated(self):
+		# vm2 mentions invoice twice in a short transcription
+		hits, has_more = self.index.search('invoice', limit=2)
+		self.assertEqual(hits[0]['voicemailId'], 'vm2')
+		self.assertIn('[Invoice]', hits[0]['snippet'])
+		self.assertTrue(has_more)
+		hits, has_more = self.index.search('invoice', limit=2, offset=2)
+		self.assertEqual(len(hits), 1)
+		self.assertFalse(has_more)
+
+	def test_filters(self):
+		self.assertEqual(self.ids('invoice', filters={'project_id': 'p2'}), ['vm3'])
+		self.assertEqual(sorted(self.ids('invoice', filters={'did': '+1800'})), ['vm1', 'vm2'])
+
+	def test_reindex_and_remove(self):
+		self.index.add('p1', {'id': 'vm1', 'transcription': 'Wrong number'})
+		self.assertEqual(self.ids('back'), [])
+		self.assertEqual(self.ids('wrong'), ['vm1'])
+		self.index.remove('vm1')
+		self.assertEqual(self.ids('wrong'), [])
+		self.assertEqual(self.index.count(), 2)
+
+	def test_interrupted_write_rolls_back(self):
+		with self.assertRaises(KeyboardInterrupt):
+			with self.index._transaction() as conn:
+				conn.execute("DELETE FROM documents")
+				raise KeyboardInterrupt
+		self.assertFalse(self.index._connect().in_transaction)
+		self.assertEqual(self.index.count(), 3)
+
+	def test_empty_query_is_rejected(self):
+		with self.assertRaises(ValueError):
+			self.index.search('""')
+
+	def test_rebuild_from_store(self):
+		store = SqliteProjectStore(os.path.join(self.test_dir, 'projects.db'))
+		self.addCleanup(store.close)
+		store.add_project({'id': 'p9', 'voicemails': []})
+		store.add_voicemail('p9', {'id': 'vm9', 'transcription': 'Delivery window tomorrow'})
+		self.assertEqual(rebuild_index(store, self.index, batch_size=1), 1)
+		self.assertEqual(self.ids('delivery'), ['vm9'])
+		self.assertEqual(store.get_voicemails(['vm9', 'missing'])['vm9']['projectId'], 'p9')
+
+	def test_query_latency(self):
+		words = ['invoice', 'delivery', 'callback', 'refund', 'appointment', 'order', 'schedule', 'account']
+		self.index.add_many(
+			('p1', {'id': f'bulk{i}', 'transcription': f"{words[i % 8]} {words[i * 7 % 8]} request number {i}"})
+			for i in range(20000)
+		)
+		start = time.monotonic()
+		for _ in range(20):
+			self.index.search('"refund request"', limit=50)
+		self.assertLess((time.monotonic() - start) / 20, 0.05)
+
+if __name__ == '__main__':
+	unittest.main()
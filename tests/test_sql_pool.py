@@ -0,0 +1,96 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sql_pool import ConnectionPool, PoolTimeout, set_pool, get_pool, pool_metrics
+import sql_shim
+
+class TestConnectionPool(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.connect = sql_shim.connector(os.path.join(self.test_dir, 'dnc.db'), sql_shim.SCHEMA)
+		self.opened = []
+
+		def connect():
+			conn = self.connect()
+			self.opened.append(conn)
+			return conn
+		self.pool = ConnectionPool(connect, max_size=2, timeout=0.2)
+
+	def tearDown(self):
+		self.pool.close()
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def test_connections_are_reused(self):
+		for number in ('+15550001', '+15550002', '+15550003'):
+			with self.pool.connection() as conn:
+				cursor = conn.cursor()
+				cursor.execute(
+					"INSERT INTO DNCSoftphone (PhoneNumber, DateAdded, AddedBy) VALUES (%s, GETDATE(), %s)",
+					(number, 'VOICEMAIL_SYSTEM')
+				)
+				conn.commit()
+
+		with self.pool.connection() as conn:
+			cursor = conn.cursor()
+			cursor.execute("SELECT TOP 1 1 FROM DNCSoftphone WHERE PhoneNumber = %s", ('+15550002',))
+			self.assertIsNotNone(cursor.fetchone())
+
+		self.assertEqual(len(self.opened), 1)
+		metrics = self.pool.metrics()
+		self.assertEqual(metrics['created'], 1)
+		self.assertEqual(metrics['reused'], 3)
+		self.assertEqual(metrics['checkouts'], 4)
+		self.assertEqual(metrics['inUse'], 0)
+
+	def test_pool_is_bounded(self):
+		first = self.pool.acquire()
+		second = self.pool.acquire()
+		with self.assertRaises(PoolTimeout):
+			self.pool.acquire()
+		self.assertEqual(self.pool.metrics()['timeouts'], 1)
+
+		# A waiting borrower gets the connection as soon as it's released
+		acquired = []
+		waiter = threading.Thread(target=lambda: acquired.append(self.pool.acquire()))
+		waiter.start()
+		self.pool.release(first)
+		waiter.join(1)
+		self.assertIs(acquired[0], first)
+		self.pool.release(second)
+		self.pool.release(acquired[0])
+
+	def test_broken_connections_are_discarded(self):
+		with self.assertRaises(Exception):
+			with self.pool.connection() as conn:
+				conn.close()
+				conn.cursor()
+		metrics = self.pool.metrics()
+		self.assertEqual(metrics['discarded'], 1)
+		self.assertEqual(metrics['errors'], 1)
+		self.assertEqual(metrics['size'], 0)
+
+	def test_stale_connections_fail_health_check(self):
+		self.pool.ping_after = 0
+		conn = self.pool.acquire()
+		self.pool.release(conn)
+		conn.close()
+
+		with self.pool.connection() as fresh:
+			self.assertIsNot(fresh, conn)
+		self.assertEqual(self.pool.metrics()['discarded'], 1)
+
+	def test_registry_reports_metrics(self):
+		set_pool('dnc', self.pool)
+		self.assertIs(get_pool('dnc'), self.pool)
+		with get_pool('dnc').connection():
+			pass
+		self.assertEqual(pool_metrics()['dnc']['checkouts'], 1)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import os
+import time
+import sys
+import jwt
+from datetime import datetime, timedelta
+from flask import Flask, request, jsonify
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+import security_config
+from security_config import TokenCache, JWT_SECRET_KEY
+
+def make_token(user_id='test_user', expires_in=3600, issued_at=None):
+	return jwt.encode({
+		'id': user_id,
+		'iat': issued_at or time.time(),
+		'exp': datetime.utcnow() + timedelta(seconds=expires_in)
+	}, JWT_SECRET_KEY)
+
+class TestTokenCache(unittest.TestCase):
+	def setUp(self):
+		self.original = security_config.token_cache
+		security_config.token_cache = TokenCache(maxsize=2)
+		app = Flask(__name__)
+
+		@app.route('/me')
+		@security_config.require_auth
+		def me():
+			return jsonify(request.user)
+		self.client = app.test_client()
+
+	def tearDown(self):
+		security_config.token_cache = self.original
+
+	def get(self, token):
+		return self.client.get('/me', headers={'Authorization': f'Bearer {token}'})
+
+	def test_verified_claims_are_cached(self):
+		token = make_token()
+		self.assertEqual(self.get(token).json['id'], 'test_user')
+		self.assertEqual(self.get(token).json['id'], 'test_user')
+		self.assertEqual(security_config.token_cache.stats, {'hits': 1, 'misses': 1})
+
+	def test_bad_tokens_are_rejected(self):
+		self.assertEqual(self.client.get('/me').status_code, 401)
+		self.assertEqual(self.client.get('/me', headers={'Authorization': 'garbage'}).status_code, 401)
+		self.assertEqual(self.get('not.a.token').status_code, 401)
+		forged = jwt.encode({'id': 'x', 'exp': datetime.utcnow() + timedelta(hours=1)}, 'wrong-key')
+		self.assertEqual(self.get(forged).status_code, 401)
+
+	def test_cached_claims_expire_with_token(self):
+		cache = security_config.token_cache
+		token = make_token(expires_in=60)
+		digest = TokenCache.digest(token)
+		cache.put(digest, jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256']))
+		self.assertIsNotNone(cache.get(digest))
+		cache.clock = lambda: time.time() + 61
+		self.assertIsNone(cache.get(digest))
+
+	def test_revoked_token_is_rejected(self):
+		token = make_token()
+		self.assertEqual(self.get(token).status_code, 200)
+		security_config.revoke_token(token)
+		self.assertEqual(self.get(token).json['error'], 'Invalid token')
+
+	def test_revoking_user_keeps_newer_tokens(self):
+		old = make_token(issued_at=time.time() - 60)
+		other_user = make_token('someone_else', issued_at=time.time() - 60)
+		self.assertEqual(self.get(old).status_code, 200)
+		security_config.token_cache.revoke_user('test_user')
+		self.assertEqual(self.get(old).status_code, 401)
+		self.assertEqual(self.get(other_user).status_code, 200)
+		self.assertEqual(self.get(make_token()).status_code, 200)
+
+	def test_cache_is_bounded(self):
+		for user in ('a', 'b', 'c'):
+			self.get(make_token(user))
+		self.assertEqual(len(security_config.token_cache._claims), 2)
+
+if __name__ == '__main__':
+	unittest.main()
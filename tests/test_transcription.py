@@ -0,0 +1,335 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+import wave
+import types
+import sys
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+from transcription import (
+	Transcriber, TranscriptionBackend, TranscriptionService, TranscriptionError, TranscriptionTimeout,
+	TranscriptionBusy, GoogleStreamingBackend, make_backend, open_pcm, pcm_chunks
+)
+import transcription
+
+class FakeBackend(TranscriptionBackend):
+	def __init__(self, delay=0, text='hello world'):
+		self.delay = delay
+		self.text = text
+		self.calls = 0
+		self.running = 0
+		self.max_running = 0
+		self.lock = threading.Lock()
+
+	def cache_id(self):
+		return 'fake'
+
+	def transcribe(self, path, deadline):
+		with self.lock:
+			self.calls += 1
+			self.running += 1
+			self.max_running = max(self.max_running, self.running)
+		try:
+			end = time.monotonic() + self.delay
+			while time.monotonic() < end:
+				if time.monotonic() > deadline:
+					raise TranscriptionTimeout(path)
+				time.sleep(0.01)
+			return self.text
+		finally:
+			with self.lock:
+				self.running -= 1
+
+class FakeRecognizer(TranscriptionBackend):
+	# Records how requests were grouped and blocks until released
+	def __init__(self):
+		self.batches = []
+		self.release = threading.Event()
+		self.started = threading.Event()
+
+	def cache_id(self):
+		return 'recognizer'
+
+	def transcribe(self, path, deadline):
+		return self.transcribe_batch([(path, deadline)])[0]
+
+	def transcribe_batch(self, requests):
+		self.batches.append([os.path.basename(path) for path, _ in requests])
+		self.started.set()
+		self.release.wait(5)
+		return [f"text of {os.path.basename(path)}" for path, _ in requests]
+
+def fake_google_modules():
+	# Just enough of google.cloud.speech and google.api_core.exceptions for GoogleStreamingBackend
+	speech = types.ModuleType('google.cloud.speech')
+	speech.RecognitionConfig = type('RecognitionConfig', (types.SimpleNamespace,), {
+		'AudioEncoding': types.SimpleNamespace(LINEAR16='LINEAR16')
+	})
+	speech.StreamingRecognitionConfig = types.SimpleNamespace
+	speech.StreamingRecognizeRequest = types.SimpleNamespace
+	exceptions = types.ModuleType('google.api_core.exceptions')
+	exceptions.GoogleAPICallError = type('GoogleAPICallError', (Exception,), {})
+	exceptions.DeadlineExceeded = type('DeadlineExceeded', (exceptions.GoogleAPICallError,), {})
+	google = types.ModuleType('google')
+	google.cloud = types.ModuleType('google.cloud')
+	google.cloud.speech = speech
+	google.api_core = types.ModuleType('google.api_core')
+	google.api_core.exceptions = exceptions
+	return {
+		'google': google, 'google.cloud': google.cloud, 'google.cloud.speech': speech,
+		'google.api_core': google.api_core, 'google.api_core.exceptions': exceptions
+	}
+
+class FakeKaldiRecognizer:
+	# Reports how many bytes it heard since the last FinalResult
+	created = []
+
+	def __init__(self, model, rate):
+		self.rate = rate
+		self.received = 0
+		FakeKaldiRecognizer.created.append(self)
+
+	def AcceptWaveform(self, data):
+		self.received += len(data)
+		return False
+
+	def FinalResult(self):
+		text, self.received = f"{self.received} bytes at {self.rate}", 0
+		return f'{{"text": "{text}"}}'
+
+def fake_vosk_module():
+	vosk = types.ModuleType('vosk')
+	vosk.Model = lambda path: object()
+	vosk.KaldiRecognizer = FakeKaldiRecognizer
+	return {'vosk': vosk}
+
+class FakeSpeechClient:
+	# Answers each stream with one final result naming how many bytes of audio it received
+	def __init__(self):
+		self.streams = []
+
+	def streaming_recognize(self, config, requests, timeout):
+		received = sum(len(r.audio_content) for r in requests)
+		self.streams.append(received)
+		alternative = types.SimpleNamespace(transcript=f" {received} bytes ")
+		yield types.SimpleNamespace(results=[types.SimpleNamespace(is_final=True, alternatives=[alternative])])
+
+class TestTranscription(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.cache_dir = os.path.join(self.test_dir, 'transcriptions')
+
+	def tearDown(self):
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def write_wav(self, name, seconds, rate=8000, sampwidth=2, fill=b'\0'):
+		path = os.path.join(self.test_dir, name)
+		with wave.open(path, 'wb') as w:
+			w.setnchannels(1)
+			w.setsampwidth(sampwidth)
+			w.setframerate(rate)
+			w.writeframes(fill * sampwidth * int(seconds * rate))
+		return path
+
+	def write_file(self, name, data):
+		path = os.path.join(self.test_dir, name)
+		with open(path, 'wb') as f:
+			f.write(data)
+		return path
+
+	def test_results_are_cached_by_audio_hash(self):
+		backend = FakeBackend()
+		transcriber = Transcriber(backend, self.cache_dir)
+		first = self.write_wav('a.wav', 1)
+		copy = os.path.join(self.test_dir, 'copy.wav')
+		shutil.copy(first, copy)
+
+		self.assertEqual(transcriber.transcribe(first), 'hello world')
+		self.assertEqual(transcriber.transcribe(copy), 'hello world')
+		self.assertEqual(backend.calls, 1)
+
+		# Different audio misses the cache, and so does a new process with another backend
+		transcriber.transcribe(self.write_wav('b.wav', 1, fill=b'\1'))
+		self.assertEqual(backend.calls, 2)
+		other = FakeBackend(text='other')
+		other.cache_id = lambda: 'other'
+		self.assertEqual(Transcriber(other, self.cache_dir).transcribe(first), 'other')
+		self.assertEqual(transcriber.stats['cacheHits'], 1)
+
+	def test_timeout(self):
+		transcriber = Transcriber(FakeBackend(delay=1), timeout=0.05)
+		with self.assertRaises(TranscriptionTimeout):
+			transcriber.transcribe(self.write_wav('a.wav', 1))
+		self.assertEqual(transcriber.stats['timeouts'], 1)
+
+	def test_concurrency_is_limited(self):
+		backend = FakeBackend(delay=0.1)
+		transcriber = Transcriber(backend, max_concurrent=2)
+		path = self.write_wav('a.wav', 1)
+		threads = [threading.Thread(target=transcriber.transcribe, args=(path,)) for _ in range(5)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join(5)
+		self.assertEqual(backend.calls, 5)
+		self.assertEqual(backend.max_running, 2)
+
+	def test_waiting_for_a_slot_counts_toward_the_timeout(self):
+		transcriber = Transcriber(FakeBackend(delay=0.5), timeout=0.1, max_concurrent=1)
+		path = self.write_wav('a.wav', 1)
+		errors = []
+		def run():
+			try:
+				transcriber.transcribe(path)
+			except TranscriptionTimeout as e:
+				errors.append(e)
+		threads = [threading.Thread(target=run) for _ in range(2)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join(5)
+		self.assertEqual(len(errors), 2)
+
+	def test_pcm_chunks_stop_at_segment_length(self):
+		with open_pcm(self.write_wav('a.wav', 3)) as w:
+			segment = list(pcm_chunks(w, 8000, chunk_bytes=6000))
+			self.assertEqual([len(c) for c in segment], [6000, 6000, 4000])
+			rest = list(pcm_chunks(w, 100000, chunk_bytes=6000))
+			self.assertEqual(sum(len(c) for c in rest), 32000)
+
+	def google_backend(self):
+		backend = GoogleStreamingBackend()
+		backend._client = FakeSpeechClient()
+		patcher = mock.patch.dict(sys.modules, fake_google_modules())
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		return backend
+
+	def test_google_streams_long_recordings_in_segments(self):
+		backend = self.google_backend()
+		patcher = mock.patch.object(transcription, 'STREAM_LIMIT_SECONDS', 1)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		text = backend.transcribe(self.write_wav('a.wav', 2.5), time.monotonic() + 5)
+		self.assertEqual(backend._client.streams, [16000, 16000, 8000])
+		self.assertEqual(text, '16000 bytes 16000 bytes 8000 bytes')
+
+	def test_google_stops_at_the_end_of_a_truncated_wav(self):
+		backend = self.google_backend()
+		path = self.write_wav('a.wav', 2)
+		# The header still claims two seconds, but only half of the audio made it to disk
+		with open(path, 'r+b') as f:
+			f.truncate(44 + 16000)
+		started = time.monotonic()
+		self.assertEqual(backend.transcribe(path, started + 5), '16000 bytes')
+		self.assertEqual(backend._client.streams, [16000])
+		self.assertLess(time.monotonic() - started, 1)
+
+	def test_vosk_batch_shares_one_recognizer_per_rate(self):
+		patcher = mock.patch.dict(sys.modules, fake_vosk_module())
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		FakeKaldiRecognizer.created = []
+		backend = transcription.VoskBackend(model_path=os.path.join(self.test_dir, 'model'))
+		self.assertTrue(backend.supports_batching())
+		paths = [self.write_wav('a.wav', 1), self.write_wav('b.wav', 0.5), self.write_wav('c.wav', 1, rate=16000),
+			self.write_wav('d.wav', 1, sampwidth=1), self.write_wav('e.wav', 0.25)]
+		results = backend.transcribe_batch([(path, time.monotonic() + 5) for path in paths])
+		self.assertEqual(results[:3] + results[4:], ['16000 bytes at 8000', '8000 bytes at 8000', '32000 bytes at 16000', '4000 bytes at 8000'])
+		self.assertIsInstance(results[3], TranscriptionError)
+		self.assertEqual([r.rate for r in FakeKaldiRecognizer.created], [8000, 16000])
+
+	def test_backends_must_implement_transcribe(self):
+		class Incomplete(TranscriptionBackend):
+			def cache_id(self):
+				return 'incomplete'
+		with self.assertRaises(TypeError):
+			Incomplete()
+
+	def test_rejects_non_pcm_audio(self):
+		with self.assertRaises(TranscriptionError):
+			open_pcm(self.write_wav('a.wav', 1, sampwidth=1))
+		with self.assertRaises(TranscriptionError):
+			open_pcm(self.write_file('b.wav', b'not audio'))
+
+	def test_service_batches_queued_requests(self):
+		recognizer = FakeRecognizer()
+		service = TranscriptionService(Transcriber(recognizer), workers=1, batch_size=3, batch_wait=0.2).start()
+		self.addCleanup(service.stop)
+		paths = [self.write_wav(f'{i}.wav', 1, fill=bytes([i])) for i in range(5)]
+		futures = [service.submit(paths[0])]
+		# The worker is busy with the first request while the rest queue up
+		self.assertTrue(recognizer.started.wait(5))
+		futures += [service.submit(path) for path in paths[1:]]
+		self.assertEqual(service.metrics()['queueDepth'], 4)
+		recognizer.release.set()
+
+		self.assertEqual([f.result(5) for f in futures], [f"text of {i}.wav" for i in range(5)])
+		self.assertEqual(recognizer.batches, [['0.wav'], ['1.wav', '2.wav', '3.wav'], ['4.wav']])
+		metrics = service.metrics()
+		self.assertEqual((metrics['batches'], metrics['maxQueueDepth'], metrics['queueDepth']), (3, 4, 0))
+		self.assertEqual(metrics['transcriber']['transcribed'], 5)
+
+	def test_service_only_batches_for_batching_backends(self):
+		self.assertTrue(FakeRecognizer().supports_batching())
+		self.assertFalse(FakeBackend().supports_batching())
+		service = TranscriptionService(Transcriber(FakeBackend(delay=0.1)), workers=2, batch_size=8).start()
+		self.addCleanup(service.stop)
+		self.assertEqual(service.batch_size, 1)
+		paths = [self.write_wav(f'{i}.wav', 1, fill=bytes([i])) for i in range(4)]
+		futures = [service.submit(path) for path in paths]
+		self.assertEqual([f.result(5) for f in futures], ['hello world'] * 4)
+		metrics = service.metrics()
+		self.assertEqual((metrics['batches'], metrics['avgBatchSize']), (4, 1))
+		self.assertEqual(service.transcriber.backend.max_running, 2)
+
+	def test_service_rejects_when_queue_is_full(self):
+		recognizer = FakeRecognizer()
+		service = TranscriptionService(Transcriber(recognizer), workers=1, max_queue=2, batch_size=1).start()
+		self.addCleanup(service.stop)
+		self.addCleanup(recognizer.release.set)
+		path = self.write_wav('a.wav', 1)
+		service.submit(path)
+		self.assertTrue(recognizer.started.wait(5))
+		service.submit(path)
+		service.submit(path)
+		with self.assertRaises(TranscriptionBusy):
+			service.submit(path)
+		self.assertEqual(service.metrics()['rejected'], 1)
+
+	def test_requests_expire_in_the_queue(self):
+		recognizer = FakeRecognizer()
+		service = TranscriptionService(Transcriber(recognizer), workers=1, batch_size=1).start()
+		self.addCleanup(service.stop)
+		path = self.write_wav('a.wav', 1)
+		first = service.submit(path)
+		self.assertTrue(recognizer.started.wait(5))
+		late = service.submit(path, timeout=0.05)
+		time.sleep(0.1)
+		recognizer.release.set()
+		self.assertEqual(first.result(5), 'text of a.wav')
+		with self.assertRaises(TranscriptionTimeout):
+			late.result(5)
+		self.assertEqual(service.metrics()['expired'], 1)
+		self.assertEqual(len(recognizer.batches), 1)
+
+	def test_duplicate_audio_in_a_batch_is_recognized_once(self):
+		recognizer = FakeRecognizer()
+		recognizer.release.set()
+		path = self.write_wav('a.wav', 1)
+		copy = os.path.join(self.test_dir, 'b.wav')
+		shutil.copy(path, copy)
+		results = Transcriber(recognizer).transcribe_batch([(path, time.monotonic() + 5), (copy, time.monotonic() + 5)])
+		self.assertEqual(results, ['text of a.wav', 'text of a.wav'])
+		self.assertEqual(recognizer.batches, [['a.wav']])
+
+	def test_unknown_backend(self):
+		with self.assertRaises(ValueError):
+			make_backend('whisper')
+
+if __name__ == '__main__':
+	unittest.main()
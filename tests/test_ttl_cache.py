@@ -0,0 +1,76 @@
+import unittest
+import os
+import threading
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ttl_cache import TTLCache
+from fake_clock import FakeClock
+
+class TestTTLCache(unittest.TestCase):
+	def setUp(self):
+		self.clock = FakeClock()
+		self.cache = TTLCache(maxsize=2, ttl=10, clock=self.clock)
+
+	def test_entries_expire(self):
+		self.cache.set('dnc', True)
+		self.cache.set('history', [], ttl=1)
+		self.clock.now = 5
+		self.assertTrue(self.cache.get('dnc'))
+		self.assertIsNone(self.cache.get('history'))
+		self.clock.now = 11
+		self.assertIsNone(self.cache.get('dnc'))
+		self.assertEqual(self.cache.stats()['expirations'], 2)
+
+	def test_least_recently_used_is_evicted(self):
+		self.cache.set('a', 1)
+		self.cache.set('b', 2)
+		self.cache.get('a')
+		self.cache.set('c', 3)
+		self.assertEqual(self.cache.get('a'), 1)
+		self.assertIsNone(self.cache.get('b'))
+		self.assertEqual(self.cache.stats()['evictions'], 1)
+
+	def test_get_or_load_caches_and_invalidates(self):
+		calls = []
+		loader = lambda: calls.append(1) or len(calls)
+		self.assertEqual(self.cache.get_or_load('dnc', loader), 1)
+		self.assertEqual(self.cache.get_or_load('dnc', loader), 1)
+		self.cache.invalidate('dnc')
+		self.assertEqual(self.cache.get_or_load('dnc', loader), 2)
+
+		stats = self.cache.stats()
+		self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+	def test_concurrent_misses_share_one_load(self):
+		started = threading.Event()
+		release = threading.Event()
+		calls = []
+
+		def loader():
+			calls.append(1)
+			started.set()
+			release.wait(5)
+			return 'value'
+
+		results = []
+		threads = [threading.Thread(target=lambda: results.append(self.cache.get_or_load('k', loader))) for _ in range(4)]
+		for thread in threads:
+			thread.start()
+		self.assertTrue(started.wait(5))
+		release.set()
+		for thread in threads:
+			thread.join(5)
+		self.assertEqual(results, ['value'] * 4)
+		self.assertEqual(len(calls), 1)
+
+	def test_load_racing_with_invalidation_is_not_cached(self):
+		def loader():
+			self.cache.invalidate('dnc')
+			return False
+		self.assertFalse(self.cache.get_or_load('dnc', loader))
+		self.assertIsNone(self.cache.get('dnc'))
+
+if __name__ == '__main__':
+	unittest.main()
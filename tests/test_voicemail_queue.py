@@ -0,0 +1,66 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'python'))
+import voicemail_queue
+from voicemail_queue import VoicemailQueue, run_workers
+
+class TestVoicemailQueue(unittest.TestCase):
+	def setUp(self):
+		self.test_dir = tempfile.mkdtemp()
+		self.queue = VoicemailQueue(os.path.join(self.test_dir, 'queue.db'))
+
+	def tearDown(self):
+		self.queue.close()
+		shutil.rmtree(self.test_dir, ignore_errors=True)
+
+	def test_enqueue_is_idempotent(self):
+		self.queue.enqueue('vm1', '+1555', '+1234567890')
+		self.queue.enqueue('vm1', '+1555', '+1234567890')
+		self.assertEqual(self.queue.stats()['pending'], 1)
+
+		job = self.queue.claim()
+		self.assertEqual(job['voicemail_id'], 'vm1')
+		self.assertEqual(job['attempts'], 1)
+		self.assertIsNone(self.queue.claim())
+
+	def test_retry_with_backoff_then_fail(self):
+		self.queue.enqueue('vm1', '+1555', 'catch-all')
+		job = self.queue.claim()
+		self.assertEqual(self.queue.fail(job, 'timeout', {}), 'pending')
+		# Backed off, so not due yet
+		self.assertIsNone(self.queue.claim())
+
+		job['attempts'] = voicemail_queue.MAX_ATTEMPTS
+		self.assertEqual(self.queue.fail(job, 'timeout', {}), 'failed')
+		self.assertEqual(self.queue.stats()['failed'], 1)
+
+	def test_workers_drain_queue(self):
+		processed = []
+		done = threading.Event()
+
+		def handler(job, timings):
+			timings['transcribe'] = 0.0
+			processed.append(job['voicemail_id'])
+			if len(processed) == 3:
+				done.set()
+
+		for i in range(3):
+			self.queue.enqueue(f'vm{i}', '+1555', '+1234567890')
+
+		stop_event = threading.Event()
+		threads = run_workers(self.queue, workers=2, stop_event=stop_event, handler=handler)
+		self.assertTrue(done.wait(5))
+		stop_event.set()
+		for thread in threads:
+			thread.join(5)
+
+		self.assertEqual(sorted(processed), ['vm0', 'vm1', 'vm2'])
+		self.assertEqual(self.queue.stats()['done'], 3)
+
+if __name__ == '__main__':
+	unittest.main()